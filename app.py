@@ -20,7 +20,7 @@ from spacestatus import SpaceStatusWidget
 from page_system import SystemPage
 from reloadable_json import JsonObserver
 from datetime_display import DateTimeDisplay
-from screenshot import screenshot_window
+from screenshot import ScreenshotOptions, ScreenshotWriter
 
 from kivy import Logger
 from kivy.config import Config
@@ -57,7 +57,9 @@ class TabbedPanelApp(App):
         self.config_obs = None
         self.amqp_widget = None
         self.influxdb_widget = None
+        self.system_page = None
         self.presence_tray = None
+        self.screenshot_writer = ScreenshotWriter()
 
         self.bind(conf_path=self._on_conf_path)
         self.bind(conf=self._on_conf)
@@ -93,6 +95,12 @@ class TabbedPanelApp(App):
             self.amqp_widget.conf = conf.get("amqp", None) if conf else None
         if self.influxdb_widget:
             self.influxdb_widget.conf = conf.get("influxdb", None) if conf else None
+        try:
+            self.screenshot_writer.options = ScreenshotOptions.from_json_cfg(
+                conf.get("screenshot", None) if conf else None)
+        except ValueError as e:
+            Logger.warning("App: Invalid screenshot configuration, using defaults: %s", e)
+            self.screenshot_writer.options = ScreenshotOptions()
 
     def _on_mqttc(self, _instance, mqttc) -> None:
         if self.ca:
@@ -101,6 +109,7 @@ class TabbedPanelApp(App):
     def build(self):
         home_page = HomePage()
         system_page = SystemPage()
+        self.system_page = system_page
         system_page.conf_lambda = lambda conf: conf.get("system", dict())
         gtd_page = GtdPage()
         gtd_page.conf_lambda = lambda conf: conf.get("gtd", dict())
@@ -119,7 +128,7 @@ class TabbedPanelApp(App):
         self.amqp_widget = amqp.AmqpWidget()
         self.amqp_widget.conf = self.conf.get("amqp", None) if self.conf else None
         self.amqp_widget.add_command_handler("test", command_log)
-        self.amqp_widget.add_command_handler("screenshot", command_screenshot)
+        self.amqp_widget.add_command_handler("screenshot", self._command_screenshot)
         self.amqp_widget.add_command_handler("show page", self._schedule_show_page)
         ca.register_tray_item(self.amqp_widget)
 
@@ -161,6 +170,9 @@ class TabbedPanelApp(App):
             self.amqp_widget.teardown()
         if self.influxdb_widget is not None:
             self.influxdb_widget.teardown()
+        if self.system_page is not None:
+            self.system_page.teardown()
+        self.screenshot_writer.teardown()
 
     def select(self, index):
         Clock.schedule_once(lambda dt: self.ca.set_page(index))
@@ -175,6 +187,15 @@ class TabbedPanelApp(App):
                                                           go_back_if_current=go_back_if_current,
                                                           block_input=block_input))
 
+    def _command_screenshot(self, _cmd, args):
+        try:
+            options = self.screenshot_writer.options.replace(fmt=args.get("format", None),
+                                                             quality=args.get("quality", None))
+        except ValueError as e:
+            Logger.warning("App: Invalid screenshot arguments: %s", e)
+            return
+        self.screenshot_writer.request(options=options)
+
     def schedule_update_configuration(self, conf):
         Clock.schedule_once(lambda dt: self.setter('conf')(self, conf))
 
@@ -183,10 +204,6 @@ def command_log(cmd, args):
     Logger.info("App: Received command %s with args %s.", cmd, args)
 
 
-def command_screenshot(_cmd, _args):
-    screenshot_window()
-
-
 async def main():
     signal.signal(signal.SIGINT, sigint_handler)
 
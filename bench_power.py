@@ -0,0 +1,202 @@
+""" Benchmarks and regression check for the power pipeline
+
+Run with ``python bench_power.py``.  The scenarios mirror the power history
+graph on the 800 px panel: Shelly plugs reporting cumulative watt-minutes
+every 1 s, 10 s or 60 s, displayed over 1 h, 24 h or 7 d with one minute
+bars, scaled up to one pixel per bar where needed.
+
+Every pipeline stage is timed on its own (best of several runs) and its peak
+memory is measured with :mod:`tracemalloc` in a separate run:
+
+``parse``
+    Flux CSV response to time and value arrays.
+``segments``
+    Cumulative readings to energy segments.
+``bars``
+    Energy segments to average watts per bar.
+``layout``
+    Duration parsing and bar layout.
+``vertices``
+    Bar values to mesh vertices.
+``query``
+    Flux query string.
+
+Save the results with ``--save-baseline FILE`` and compare later runs with
+``--baseline FILE``; the exit status is 1 if a stage got slower or needs
+more memory than *threshold* times the baseline.
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+import timeit
+import tracemalloc
+
+from power import (parse_flux_csv_series, compute_energy_segments, compute_bar_values,
+                   build_power_flux_query, build_bar_vertices, BarLayout)
+
+RESOLUTIONS = [1, 10, 60]
+WINDOWS = [("1 h", 3600), ("24 h", 24 * 3600), ("7 d", 7 * 24 * 3600)]
+STAGES = ["parse", "segments", "bars", "layout", "vertices", "query"]
+
+PANEL_WIDTH_PX = 800
+GRAPH_HEIGHT_PX = 120
+NOW = 1_714_561_200.0
+
+# Scenarios with more samples are skipped by --quick
+QUICK_MAX_POINTS = 10_000
+
+THRESHOLD_DEFAULT = 1.5
+# Timing differences below this are treated as noise
+MIN_SECONDS_DEFAULT = 50e-6
+
+
+def scenarios(quick=False):
+    """Return ``(label, interval_s, duration_s)`` for every benchmark scenario."""
+    result = []
+    for window_label, duration_s in WINDOWS:
+        for interval_s in RESOLUTIONS:
+            if quick and duration_s // interval_s > QUICK_MAX_POINTS:
+                continue
+            result.append((f"{interval_s} s samples, {window_label}", interval_s, duration_s))
+    return result
+
+
+def synthetic_points(interval_s, duration_s, now=NOW, watts=150.0):
+    """Return (timestamp, cumulative Wmin) pairs of a constant load."""
+    n = int(duration_s // interval_s) + 1
+    start = now - (n - 1) * interval_s
+    return [(start + i * interval_s, i * interval_s * watts / 60) for i in range(n)]
+
+
+def synthetic_csv(points):
+    """Return an annotated Flux CSV response holding *points*."""
+    out = io.StringIO()
+    out.write("#datatype,string,long,dateTime:RFC3339,double,string,string\r\n"
+              "#group,false,false,false,false,true,true\r\n"
+              "#default,_result,,,,,\r\n"
+              ",result,table,_time,_value,_field,_measurement\r\n")
+    for t, v in points:
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t))
+        out.write(f",,0,{stamp}Z,{v!r},energy,plug\r\n")
+    return out.getvalue()
+
+
+def _measure(fn, repeat, number=None):
+    """Return the best seconds per call and the peak traced bytes of *fn*.
+
+    Without *number*, the calls per timing run are chosen to take at least
+    0.2 s, see :meth:`timeit.Timer.autorange`.
+    """
+    timer = timeit.Timer(fn)
+    if number is None:
+        number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_scenario(interval_s, duration_s, repeat=3, number=None):
+    """Benchmark all stages of one scenario.
+
+    :return: Dict mapping stage name to ``{"seconds": ..., "peak_bytes": ...}``.
+    """
+    conf = {"display_duration": duration_s, "bar_duration": "PT1M"}
+    text = synthetic_csv(synthetic_points(interval_s, duration_s))
+    times, values = parse_flux_csv_series(csv.reader(io.StringIO(text)))
+    segments = compute_energy_segments(zip(times, values))
+    layout = BarLayout.compile(PANEL_WIDTH_PX, conf)
+    bar_watts = compute_bar_values(segments, layout.n_bars, layout.bar_duration, NOW)
+    max_watts = max(bar_watts) or 1.0
+    bars = [w / max_watts for w in bar_watts]
+
+    stages = {
+        "parse": lambda: parse_flux_csv_series(csv.reader(io.StringIO(text))),
+        "segments": lambda: compute_energy_segments(zip(times, values)),
+        "bars": lambda: compute_bar_values(segments, layout.n_bars, layout.bar_duration, NOW),
+        "layout": lambda: BarLayout.compile(PANEL_WIDTH_PX, conf),
+        "vertices": lambda: build_bar_vertices(bars, layout.slot_w, layout.bar_w,
+                                               GRAPH_HEIGHT_PX, 1, 2),
+        "query": lambda: build_power_flux_query("power", "plug", "energy",
+                                                layout.n_bars, layout.bar_duration, 2),
+    }
+
+    results = {}
+    for name in STAGES:
+        seconds, peak = _measure(stages[name], repeat, number)
+        results[name] = {"seconds": seconds, "peak_bytes": peak}
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD_DEFAULT, min_seconds=MIN_SECONDS_DEFAULT):
+    """Compare benchmark results with a baseline.
+
+    A stage regresses if its time or peak memory exceeds *threshold* times the
+    baseline.  Time differences below *min_seconds* are ignored.  Scenarios or
+    stages missing in either set are skipped.
+
+    :return: List of human readable regression descriptions.
+    """
+    regressions = []
+    for label, stages in results.items():
+        for name, current in stages.items():
+            base = baseline.get(label, {}).get(name, None)
+            if base is None:
+                continue
+            if current["seconds"] > base["seconds"] * threshold \
+                    and current["seconds"] - base["seconds"] > min_seconds:
+                regressions.append(f"{label} / {name}: {current['seconds'] * 1000:.3f} ms, "
+                                   f"baseline {base['seconds'] * 1000:.3f} ms")
+            if current["peak_bytes"] > base["peak_bytes"] * threshold:
+                regressions.append(f"{label} / {name}: peak {current['peak_bytes']} bytes, "
+                                   f"baseline {base['peak_bytes']} bytes")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the power pipeline")
+    parser.add_argument("--quick", action="store_true",
+                        help=f"skip scenarios with more than {QUICK_MAX_POINTS} samples")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per stage")
+    parser.add_argument("--number", type=int,
+                        help="calls per timing run (default: automatic)")
+    parser.add_argument("--baseline", help="JSON file with results to compare against")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD_DEFAULT,
+                        help="allowed factor over the baseline (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for label, interval_s, duration_s in scenarios(args.quick):
+        results[label] = run_scenario(interval_s, duration_s, args.repeat, args.number)
+        for name in STAGES:
+            stage = results[label][name]
+            print(f"{label:<22} {name:<9} {stage['seconds'] * 1000:10.3f} ms "
+                  f"{stage['peak_bytes'] / 1024:10.1f} KiB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,6 +17,8 @@ from kivy.uix.button import Button
 from kivy.animation import Animation
 from kivy.graphics import Color, Rectangle, RoundedRectangle, Line, InstructionGroup
 
+from screenshot import ThumbnailCache
+
 
 def _parse_nav_ttl(value) -> float:
     """Parse a navigation TTL value to seconds.
@@ -198,6 +200,10 @@ class PageRouter(EventDispatcher):
 
 
 class ContentPage(RelativeLayout):
+    __events__ = ('on_dirty',)
+
+    DIRTY_DELAY = 5  # [s]
+
     conf_lambda = ObjectProperty(None)
     """ If this lambda is set, the conf property is determined (by a calling party, i.e. the
         GlobalContentArea) to determine the configuration from a global configuration. 
@@ -233,10 +239,27 @@ class ContentPage(RelativeLayout):
             value.active = self.active
 
     def __init__(self, **kwargs):
+        # Before the KV rules are applied, which may already mark the page dirty
+        self._dirty_trigger = Clock.create_trigger(self._dispatch_dirty, ContentPage.DIRTY_DELAY)
         super(RelativeLayout, self).__init__(**kwargs)
 
         self._btn = None
 
+    def mark_dirty(self):
+        """Signal that the displayed content has changed, e.g. to renew its thumbnail.
+
+        The changes of :attr:`DIRTY_DELAY` seconds are dispatched as one
+        ``on_dirty`` event, so that pages with live data are not captured
+        over and over again.
+        """
+        self._dirty_trigger()
+
+    def _dispatch_dirty(self, _dt):
+        self.dispatch('on_dirty')
+
+    def on_dirty(self):
+        """Default handler for the ``on_dirty`` event (no-op)."""
+
     def create_context_button(self, length):
         """Create a :class:`ContextButton` for this page.
 
@@ -727,6 +750,13 @@ class GlobalContentArea(AnchorLayout):
     defaults to [77/256, 177/256, 76/256, 1].
     """
 
+    # Page thumbnails: 1/5 of the 800x480 display, at most 1 MiB of textures,
+    # renewed after a minute for pages that do not mark themselves dirty
+    THUMBNAIL_WIDTH = 160
+    THUMBNAIL_HEIGHT = 96
+    THUMBNAIL_CACHE_BYTES = 1 << 20
+    THUMBNAIL_MAX_AGE = 60
+
     _current_page = ObjectProperty(None)
 
     def get_current_page(self):
@@ -779,6 +809,9 @@ class GlobalContentArea(AnchorLayout):
         nav_back._switch_callback = self._router.switch_to_label
         self._router._go_back_callback = nav_back.go_back
 
+        # Created on first use, see thumbnails
+        self._thumbnails = None
+
         self.bind(conf=self._on_conf)
         self.bind(mqttc=self._on_mqttc)
         self.bind(screensaver=self._on_screensaver)
@@ -787,6 +820,24 @@ class GlobalContentArea(AnchorLayout):
         # Blocks the event if the screen saver is active, so that the user is not poking in the dark (literally)
         Window.bind(on_touch_down=lambda i, e: self.ids.screensaver.wake_up())
 
+    def _on_before_page_switch(self, _instance, old_page, _new_page):
+        self._thumbnails.page_deactivated(old_page)
+
+    @property
+    def thumbnails(self) -> ThumbnailCache:
+        """Thumbnails of the registered pages, by page label.
+
+        The cache is created on first access; pages are only captured from
+        then on, when they are left.
+        """
+        if self._thumbnails is None:
+            self._thumbnails = ThumbnailCache(self.THUMBNAIL_WIDTH, self.THUMBNAIL_HEIGHT,
+                                              self.THUMBNAIL_CACHE_BYTES, self.THUMBNAIL_MAX_AGE)
+            for page in self._pages:
+                self._thumbnails.watch(page)
+            self._router.bind(on_before_page_switch=self._on_before_page_switch)
+        return self._thumbnails
+
     def _wake_screensaver(self) -> None:
         if self.screensaver:
             self.screensaver.wake_up()
@@ -856,6 +907,8 @@ class GlobalContentArea(AnchorLayout):
         # set mqttc property
         page.mqttc = self.mqttc
 
+        if self._thumbnails is not None:
+            self._thumbnails.watch(page)
         self._router.add_page(page)
 
     def register_border_button(self, widget, page=None):
@@ -869,6 +922,8 @@ class GlobalContentArea(AnchorLayout):
             self._pages.append(page)
             self._page_conf(page)
             page.mqttc = self.mqttc
+            if self._thumbnails is not None:
+                self._thumbnails.watch(page)
 
         self._router.register_border_button(widget, page)
 
@@ -1,7 +1,7 @@
 """InfluxDB connection widget"""
 
 import threading
-from typing import Optional, Callable
+from typing import Any, Callable, Iterator, List, Optional
 
 from influxdb_client import InfluxDBClient
 from influxdb_client.client.exceptions import InfluxDBError
@@ -125,16 +125,40 @@ class InfluxDbConnector(object):
         :param callback: Called on the Kivy main thread with a list of FluxTable results.
         :param error_callback: Optional callback called on the Kivy main thread with the exception.
         """
+        self._execute(
+            lambda query_api: query_api.query(flux_query, org=self._cfg.org()),
+            callback, error_callback)
+
+    def query_csv(self, flux_query: str, parser: Callable[[Iterator[List[str]]], Any],
+                  callback: Callable[[Any], None],
+                  error_callback: Optional[Callable[[Exception], None]] = None) -> None:
+        """Execute a Flux query in a background thread and stream the raw CSV response.
+
+        Instead of materializing FluxTable/FluxRecord objects, the annotated CSV
+        response is handed row by row to *parser* while it is still being
+        received.  The parser runs on the background thread; only its return
+        value is passed on to the main thread.
+
+        :param flux_query: Flux query string to execute.
+        :param parser: Called on the background thread with an iterator over the
+            CSV rows (lists of strings, annotation rows included).
+        :param callback: Called on the Kivy main thread with the parser result.
+        :param error_callback: Optional callback called on the Kivy main thread with the exception.
+        """
+        self._execute(
+            lambda query_api: parser(query_api.query_csv(flux_query, org=self._cfg.org())),
+            callback, error_callback)
+
+    def _execute(self, fetch, callback, error_callback):
         if self._client is None:
             Logger.warning("InfluxDB: Cannot query, client is not connected.")
             return
 
         def _run():
             try:
-                query_api = self._client.query_api()
-                tables = query_api.query(flux_query, org=self._cfg.org())
+                result = fetch(self._client.query_api())
                 self._schedule_icon_color(_Colors.COLOR_GREEN)
-                Clock.schedule_once(lambda dt: callback(tables))
+                Clock.schedule_once(lambda dt: callback(result))
             except InfluxDBError as e:
                 Logger.error("InfluxDB: Query error: %s", str(e))
                 self._schedule_icon_color(_Colors.COLOR_RED)
@@ -206,6 +230,24 @@ class InfluxDbWidget(TrayIcon):
             return
         self._connector.query(flux_query, callback, error_callback)
 
+    def query_csv(self, flux_query: str, parser: Callable[[Iterator[List[str]]], Any],
+                  callback: Callable[[Any], None],
+                  error_callback: Optional[Callable[[Exception], None]] = None) -> None:
+        """Execute a Flux query and stream the annotated CSV response through *parser*.
+
+        See :meth:`InfluxDbConnector.query_csv`.  As with :meth:`query`, the
+        query is skipped with a warning if no connector is available.
+
+        :param flux_query: Flux query string.
+        :param parser: Consumes the CSV row iterator on the background thread.
+        :param callback: Called with the parser result on the main thread.
+        :param error_callback: Optional; called with the exception on the main thread.
+        """
+        if self._connector is None:
+            Logger.warning("InfluxDB: No active connector, query skipped.")
+            return
+        self._connector.query_csv(flux_query, parser, callback, error_callback)
+
     def teardown(self):
         """Stop the InfluxDB connector if active"""
         if self._connector is not None:
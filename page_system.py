@@ -28,7 +28,12 @@ Builder.load_string("""
             min_priority: root.conf.get('syslog_min_priority', 'error') if root.conf else 'error'
             acknowledge_after: root.conf.get('syslog_acknowledge_after', 3600) if root.conf else 3600
             max_entries: root.conf.get('syslog_max_entries', 50) if root.conf else 50
+            journal_file: root.conf.get('syslog_journal_file', '') if root.conf else ''
+            journal_slots: root.conf.get('syslog_journal_slots', 1024) if root.conf else 1024
+            storm_factor: root.conf.get('syslog_storm_factor', 5) if root.conf else 5
+            storm_min_rate: root.conf.get('syslog_storm_min_rate', 30) if root.conf else 30
             message_callback: root.on_syslog_message
+            storm_callback: root.on_syslog_storm
 
         BoxLayout:
             orientation: 'vertical'
@@ -47,11 +52,14 @@ Builder.load_string("""
                 PowerHistoryGraph:
                     conf: root.conf.get("power", {}).get("graph", {}) if root.conf else {}
                     influxdb_widget: root.influxdb_widget
+                    live_power: power.raw_power
+                    on__bars: root.mark_dirty()
 
                 PowerWidget:
                     id: power
                     conf: root.conf.get("power", {}) if root.conf else {}
                     mqttc: root.mqttc
+                    on_power: root.mark_dirty()
 
             # Spacer pushes the temperature panel to the bottom of the column
             Widget:
@@ -68,6 +76,7 @@ Builder.load_string("""
                     id: temperatures
                     conf: root.conf.get("temperatures", {}) if root.conf else {}
                     mqttc: root.mqttc
+                    on_update: root.mark_dirty()
 """)
 
 
@@ -75,14 +84,24 @@ class SystemPage(globalcontent.ContentPage):
     amqp_widget = ObjectProperty(None, allownone=True)
     influxdb_widget = ObjectProperty(None, allownone=True)
 
+    def teardown(self):
+        """Close the syslog journal"""
+        self.ids.syslog_panel.teardown()
+
     def on_syslog_message(self, msg):
         """Update the tab notification badge when a new syslog message arrives."""
-        if not self.active:
+        self.mark_dirty()
+        if not self.active and self.notification != "Alert":
             if msg.is_critical():
                 self.notification = "Critical"
             elif msg.priority in ('error', 'err') and self.notification == "None":
                 self.notification = "Warning"
 
+    def on_syslog_storm(self, _host):
+        """Flash the tab notification badge when a host floods the syslog."""
+        if not self.active:
+            self.notification = "Alert"
+
     def on_active(self, _instance, active):
         # ContentPage.on_active updates the tab button's active state;
         # call super() to preserve that behaviour before clearing the notification.
@@ -1,12 +1,23 @@
 """ Module for power display """
 
+import bisect
+import calendar
+import json
+import math
+import os
+import struct
+import sys
+import threading
 import time as _time
+from array import array
+from collections import deque
+from typing import Optional
 
 import isodate
 
 from kivy import Logger
 from kivy.clock import Clock
-from kivy.graphics import Color, Line, Rectangle
+from kivy.graphics import Color, Line, Mesh
 from kivy.lang import Builder
 from kivy.properties import ObjectProperty, DictProperty, NumericProperty, ListProperty
 from kivy.uix.label import Label
@@ -43,6 +54,88 @@ def parse_duration_seconds(value) -> float:
         raise ValueError(f"Cannot parse duration value: {value!r}") from e
 
 
+def parse_rfc3339_timestamp(text: str) -> float:
+    """Convert an RFC 3339 timestamp as returned by InfluxDB to a Unix timestamp.
+
+    The UTC form InfluxDB emits (``2024-05-01T12:00:00.123456789Z``) is
+    decoded directly by slicing, including nanosecond fractions.  Any other
+    form falls back to :func:`isodate.parse_datetime`.
+
+    :raises ValueError: if the value cannot be parsed.
+    """
+    if len(text) >= 20 and text[-1] == 'Z' and text[10] == 'T':
+        seconds = calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                                   int(text[11:13]), int(text[14:16]), int(text[17:19]),
+                                   0, 0, 0))
+        fraction = text[20:-1] if text[19] == '.' else ''
+        if fraction:
+            return seconds + int(fraction) / 10 ** len(fraction)
+        return float(seconds)
+    try:
+        return isodate.parse_datetime(text).timestamp()
+    except isodate.isoerror.ISO8601Error as e:
+        raise ValueError(f"Cannot parse timestamp: {text!r}") from e
+
+
+def parse_flux_csv_series(rows):
+    """Parse ``_time`` and ``_value`` from an annotated Flux CSV response.
+
+    Only the two required columns are decoded; all other columns are skipped
+    without conversion.  Annotation rows (``#datatype``, ``#group``,
+    ``#default``) announce a new table, whose header row is read to locate the
+    columns.  Rows with an empty or unparseable time or value are skipped.
+
+    The result is sorted by time, even if the response holds several tables.
+
+    :param rows: Iterable of CSV rows (lists of strings), e.g. the iterator
+        returned by :meth:`influxdb.InfluxDbConnector.query_csv`.
+    :return: Tuple ``(times, values)`` of ``array('d')`` holding Unix
+        timestamps and the corresponding field values.
+    """
+    times = array('d')
+    values = array('d')
+
+    expect_header = True
+    time_idx = value_idx = None
+    for row in rows:
+        if not row:
+            expect_header = True
+            continue
+        if row[0].startswith('#'):
+            expect_header = True
+            continue
+        if expect_header:
+            expect_header = False
+            try:
+                time_idx = row.index('_time')
+                value_idx = row.index('_value')
+            except ValueError:
+                # e.g. an error table – ignore rows until the next header
+                time_idx = value_idx = None
+            continue
+        if time_idx is None:
+            continue
+
+        try:
+            t = row[time_idx]
+            v = row[value_idx]
+            if not t or not v:
+                continue
+            t = parse_rfc3339_timestamp(t)
+            v = float(v)
+        except (IndexError, ValueError):
+            continue
+        times.append(t)
+        values.append(v)
+
+    if any(times[i] < times[i - 1] for i in range(1, len(times))):
+        order = sorted(range(len(times)), key=times.__getitem__)
+        times = array('d', (times[i] for i in order))
+        values = array('d', (values[i] for i in order))
+
+    return times, values
+
+
 def compute_energy_segments(points):
     """Convert sorted (timestamp, cumulative_energy_wmin) pairs to energy segments.
 
@@ -50,21 +143,25 @@ def compute_energy_segments(points):
     energy consumed in each interval.  Intervals where the cumulative energy
     value decreases (wrap-around or device reset) are skipped.
 
-    :param points: Sorted list of (unix_timestamp, cumulative_wmin) pairs.
+    :param points: Sorted iterable of (unix_timestamp, cumulative_wmin) pairs,
+        e.g. ``zip(times, values)`` from :func:`parse_flux_csv_series`.
     :return: List of (t_start, t_end, delta_wmin) tuples.
     """
     segments = []
-    for i in range(1, len(points)):
-        t0, e0 = points[i - 1]
-        t1, e1 = points[i]
+    it = iter(points)
+    first = next(it, None)
+    if first is None:
+        return segments
+
+    t0, e0 = first
+    for t1, e1 in it:
         dt = t1 - t0
-        if dt <= 0:
-            continue
         de = e1 - e0
-        if de < 0:
-            # wrap-around or device reset – skip this interval
-            continue
-        segments.append((t0, t1, de))
+        # dt <= 0: out-of-order timestamps
+        # de < 0: wrap-around or device reset
+        if dt > 0 and de >= 0:
+            segments.append((t0, t1, de))
+        t0, e0 = t1, e1
     return segments
 
 
@@ -79,6 +176,9 @@ def compute_bar_values(segments, n_bars, bar_duration, now=None):
 
     bars[0] is the oldest (leftmost), bars[n_bars-1] is the newest (rightmost).
 
+    Bars and segments are combined in a single sweep, so the cost grows with
+    ``n_bars + len(segments)`` instead of their product.
+
     :param segments: List of (t_start, t_end, delta_wmin) from
         :func:`compute_energy_segments`.
     :param n_bars: Number of bars to compute.
@@ -89,23 +189,27 @@ def compute_bar_values(segments, n_bars, bar_duration, now=None):
     if now is None:
         now = _time.time()
 
-    bars = []
-    for i in range(n_bars):
-        bar_end = now - (n_bars - 1 - i) * bar_duration
-        bar_start = bar_end - bar_duration
-
-        energy = 0.0
-        for seg_start, seg_end, seg_energy in segments:
-            overlap_start = max(bar_start, seg_start)
-            overlap_end = min(bar_end, seg_end)
+    # Bar boundaries, computed exactly as bar-by-bar evaluation would do so
+    # that the result does not depend on the evaluation order.
+    bar_ends = [now - (n_bars - 1 - i) * bar_duration for i in range(n_bars)]
+    bar_starts = [bar_end - bar_duration for bar_end in bar_ends]
+    energy = [0.0] * n_bars
+
+    # Sweep: both bar lists are sorted, so each segment only visits the bars
+    # it overlaps.  The first candidate is the first bar ending after the
+    # segment start; the walk stops at the first bar starting after its end.
+    for seg_start, seg_end, seg_energy in segments:
+        i = bisect.bisect_right(bar_ends, seg_start)
+        while i < n_bars and bar_starts[i] < seg_end:
+            overlap_start = max(bar_starts[i], seg_start)
+            overlap_end = min(bar_ends[i], seg_end)
             if overlap_end > overlap_start:
                 seg_dur = seg_end - seg_start
                 overlap_dur = overlap_end - overlap_start
-                energy += seg_energy * (overlap_dur / seg_dur)
-
-        bars.append(energy * 60 / bar_duration)
+                energy[i] += seg_energy * (overlap_dur / seg_dur)
+            i += 1
 
-    return bars
+    return [e * 60 / bar_duration for e in energy]
 
 
 Builder.load_string("""
@@ -144,19 +248,117 @@ Builder.load_string("""
 """)
 
 
+class PowerSmoother(object):
+    """Smooth a stream of power readings.
+
+    ``"ema"`` is an exponential moving average with the span *window*
+    (``alpha = 2 / (window + 1)``), ``"median"`` the median of the last
+    *window* readings.  Without a method the latest reading is passed on.
+    """
+
+    METHODS = (None, "ema", "median")
+    WINDOW_DEFAULT = 5
+
+    @staticmethod
+    def from_json_cfg(config: Optional[dict]):
+        if config is None:
+            return PowerSmoother()
+
+        return PowerSmoother(
+            method=config.get("smoothing", None),
+            window=int(config.get("smoothing_window", PowerSmoother.WINDOW_DEFAULT))
+        )
+
+    def __init__(self, method=None, window=WINDOW_DEFAULT):
+        if method not in PowerSmoother.METHODS:
+            raise ValueError("Unknown smoothing method: {}".format(method))
+        if window < 1:
+            raise ValueError("Smoothing window must be at least 1: {}".format(window))
+
+        self._method = method
+        self._alpha = 2 / (window + 1)
+        self._window = deque(maxlen=window)
+        self._value = None
+
+    @property
+    def value(self):
+        """The smoothed value, ``None`` before the first reading."""
+        return self._value
+
+    def add(self, value):
+        """Add a reading and return the smoothed value."""
+        if self._method == "ema" and self._value is not None:
+            self._value += self._alpha * (value - self._value)
+        elif self._method == "median":
+            self._window.append(value)
+            ordered = sorted(self._window)
+            mid = len(ordered) // 2
+            self._value = ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+        else:
+            self._value = value
+        return self._value
+
+    def reset(self):
+        self._window.clear()
+        self._value = None
+
+
 class PowerWidget(RelativeLayout):
+    """Display the current power reading from an MQTT topic.
+
+    Configuration keys (``conf`` dict) besides ``topic``:
+
+    ``display_rate``
+        Maximum number of label updates per second.  Readings in between are
+        aggregated and the latest smoothed value is shown after the interval.
+        Omit or set to 0 to show every reading.
+    ``smoothing``
+        ``"ema"`` or ``"median"`` to smooth the displayed value (default none).
+    ``smoothing_window``
+        Number of readings of the smoothing window (default 5).
+
+    :attr:`power` holds the displayed value, :attr:`raw_power` every reading
+    as it arrives.
+    """
+
     mqttc = ObjectProperty(None)
     conf = DictProperty()
 
     power = NumericProperty(None, allownone=True)
+    raw_power = NumericProperty(None, allownone=True)
     value_error = ObjectProperty(None, allownone=True)
 
     def __init__(self, **kwargs):
+        self._smoother = PowerSmoother()
+        self._min_display_interval = 0.0
+        self._last_display = None
+        self._display_event = None
         super().__init__(**kwargs)
 
     def on_conf(self, _instance, _conf: list) -> None:
+        self._configure_display()
         self._update_mqtt()
 
+    def _configure_display(self):
+        try:
+            self._smoother = PowerSmoother.from_json_cfg(self.conf)
+        except ValueError as e:
+            Logger.warning("Power: Invalid smoothing configuration, disabled: %s", e)
+            self._smoother = PowerSmoother()
+
+        rate = (self.conf or {}).get("display_rate", None)
+        try:
+            rate = float(rate) if rate else 0.0
+        except ValueError:
+            Logger.warning("Power: Invalid display_rate %r, ignored", rate)
+            rate = 0.0
+        self._min_display_interval = 1 / rate if rate > 0 else 0.0
+
+        if self._display_event is not None:
+            self._display_event.cancel()
+            self._display_event = None
+        self._last_display = None
+
     def on_mqttc(self, _instance, _mqttc) -> None:
         self._update_mqtt()
 
@@ -173,12 +375,36 @@ class PowerWidget(RelativeLayout):
 
     def _update_power(self, payload):
         try:
-            self.value_error = None
-            self.power = float(payload)
+            value = float(payload)
         except ValueError as e:
             Logger.error(e)
+            if self._display_event is not None:
+                self._display_event.cancel()
+                self._display_event = None
+            self._smoother.reset()
             self.value_error = e
+            self.raw_power = None
             self.power = None
+            return
+
+        self.value_error = None
+        self.raw_power = value
+        self._smoother.add(value)
+
+        # Rate limit: show at most one value per interval, the latest one wins
+        if self._display_event is not None:
+            return
+        now = _time.monotonic()
+        if self._last_display is None or now - self._last_display >= self._min_display_interval:
+            self._show_power()
+        else:
+            self._display_event = Clock.schedule_once(
+                self._show_power, self._last_display + self._min_display_interval - now)
+
+    def _show_power(self, *_args):
+        self._display_event = None
+        self._last_display = _time.monotonic()
+        self.power = self._smoother.value
 
 
 def compute_bar_layout(available_px, display_duration_s=None, bar_duration_s=300.0,
@@ -226,8 +452,186 @@ def compute_bar_layout(available_px, display_duration_s=None, bar_duration_s=300
     return n_bars, float(bar_duration_s), slot_w, bar_w
 
 
+class BarLayout(object):
+    """Bar layout for one widget width and graph configuration.
+
+    Compiled once by :class:`BarLayoutCache` and shared by query building,
+    bar computation and rendering.
+    """
+
+    def __init__(self, n_bars, bar_duration, slot_w, bar_w):
+        self.n_bars = n_bars
+        self.bar_duration = bar_duration
+        self.slot_w = slot_w
+        self.bar_w = bar_w
+
+    @staticmethod
+    def compile(available_px, conf, fallback_bar_width=8):
+        """Resolve the durations in *conf* and compute the layout.
+
+        :param available_px: Available pixel width.
+        :param conf: Graph configuration dict (``bar_duration`` and
+            ``display_duration`` are used), may be ``None``.
+        :param fallback_bar_width: See :func:`compute_bar_layout`.
+        :return: The compiled :class:`BarLayout`.
+        """
+        conf = conf or {}
+
+        bar_dur_raw = conf.get("bar_duration", "PT5M")
+        try:
+            bar_dur = parse_duration_seconds(bar_dur_raw)
+        except ValueError:
+            Logger.warning("PowerGraph: Invalid bar_duration %r, using 300 s", bar_dur_raw)
+            bar_dur = 300.0
+
+        display_dur = None
+        display_dur_raw = conf.get("display_duration", None)
+        if display_dur_raw is not None:
+            try:
+                display_dur = parse_duration_seconds(display_dur_raw)
+            except ValueError:
+                Logger.warning("PowerGraph: Invalid display_duration %r, ignored",
+                               display_dur_raw)
+
+        return BarLayout(*compute_bar_layout(available_px, display_dur, bar_dur,
+                                             fallback_bar_width))
+
+
+class BarLayoutCache(object):
+    """Keep the compiled :class:`BarLayout` until width or durations change.
+
+    The counters show how often the layout had to be compiled and how often
+    the cached layout was reused.
+    """
+
+    def __init__(self, fallback_bar_width=8):
+        self._fallback_bar_width = fallback_bar_width
+        self._key = None
+        self._layout = None
+        self.compiles = 0
+        self.hits = 0
+        self.compile_seconds = 0.0
+        self.last_compile_seconds = 0.0
+
+    def get(self, available_px, conf):
+        """Return the layout for *available_px* and *conf*, compiling it if needed."""
+        conf = conf or {}
+        key = (available_px, conf.get("bar_duration", None), conf.get("display_duration", None))
+        if key == self._key:
+            self.hits += 1
+            return self._layout
+
+        start = _time.perf_counter()
+        self._layout = BarLayout.compile(available_px, conf, self._fallback_bar_width)
+        self.last_compile_seconds = _time.perf_counter() - start
+        self.compile_seconds += self.last_compile_seconds
+        self.compiles += 1
+        self._key = key
+        return self._layout
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+        calls = self.compiles + self.hits
+        return {
+            "compiles": self.compiles,
+            "hits": self.hits,
+            "compile_seconds": self.compile_seconds,
+            "last_compile_seconds": self.last_compile_seconds,
+            "mean_compile_seconds": self.compile_seconds / self.compiles if self.compiles else 0.0,
+            "hit_ratio": self.hits / calls if calls else 0.0,
+        }
+
+
+def quad_indices(n_quads):
+    """Return triangle indices for *n_quads* quads of four vertices each.
+
+    Each quad ``(v0, v1, v2, v3)`` (counter-clockwise, starting bottom-left)
+    is split into the triangles ``(v0, v1, v2)`` and ``(v2, v3, v0)``.
+    """
+    indices = []
+    for q in range(n_quads):
+        v = 4 * q
+        indices.extend((v, v + 1, v + 2, v + 2, v + 3, v))
+    return indices
+
+
+def build_bar_vertices(bars, slot_w, bar_w, height, border, highlight_h):
+    """Compute mesh vertices for the bar bodies and their highlight strips.
+
+    Every bar contributes exactly one quad to each of the two vertex lists, so
+    the vertex count only depends on the number of bars.  A bar too low for a
+    body yields a zero-height (invisible) body quad.
+
+    :param bars: Normalized bar heights (0..1), oldest first.
+    :param slot_w: Horizontal distance between bar origins in px.
+    :param bar_w: Drawable bar width in px.
+    :param height: Widget height in px.
+    :param border: Frame border width in px; bars start right of / above it.
+    :param highlight_h: Height of the highlight strip on top of each bar in px.
+    :return: Tuple ``(body_vertices, highlight_vertices)`` of flat float lists
+        in the Kivy mesh format ``x, y, u, v``.
+    """
+    b = float(border)
+    body = []
+    highlight = []
+    for i, normalized in enumerate(bars):
+        bar_h = max(b, normalized * (height - b))
+        # Float x-position for visually even distribution across the
+        # full widget width — each bar occupies exactly slot_w pixels.
+        x0 = b + i * slot_w
+        x1 = x0 + bar_w
+
+        # Body: everything below the highlight strip
+        body_top = b + max(0.0, bar_h - highlight_h)
+        body.extend((x0, b, 0, 0, x1, b, 0, 0,
+                     x1, body_top, 0, 0, x0, body_top, 0, 0))
+
+        # Highlight strip: top highlight_h px of each bar
+        top = body_top + min(float(highlight_h), bar_h)
+        highlight.extend((x0, body_top, 0, 0, x1, body_top, 0, 0,
+                          x1, top, 0, 0, x0, top, 0, 0))
+    return body, highlight
+
+
+def parse_resolution_levels(entries):
+    """Parse the ``downsampled`` graph configuration.
+
+    :param entries: List of dicts with the keys ``bucket`` and ``resolution``
+        (ISO 8601 duration or seconds) and the optional keys ``measurement``
+        and ``field`` if they differ from the raw series.
+    :return: List of ``(resolution_s, bucket, measurement, field)`` tuples,
+        sorted from the finest to the coarsest resolution.  *measurement* and
+        *field* are ``None`` when not configured.
+    :raises ValueError: If an entry lacks a bucket or has an invalid resolution.
+    """
+    levels = []
+    for entry in entries or []:
+        bucket = entry.get("bucket", None)
+        if not bucket:
+            raise ValueError("Downsampled level without bucket: {}".format(entry))
+        resolution = parse_duration_seconds(entry.get("resolution", None))
+        if resolution < 1:
+            raise ValueError("Downsampled resolution must be at least 1 s: {}".format(entry))
+        levels.append((int(resolution), bucket,
+                       entry.get("measurement", None), entry.get("field", None)))
+    levels.sort(key=lambda level: level[0])
+    return levels
+
+
+def select_resolution_level(levels, bar_duration_s):
+    """Choose the coarsest downsampled level that still has a sample per bar.
+
+    :param levels: Levels as returned by :func:`parse_resolution_levels`.
+    :param bar_duration_s: Time covered by each bar in seconds.
+    :return: The selected level tuple, or ``None`` if the raw series has to
+        be queried.
+    """
+    i = bisect.bisect_right([level[0] for level in levels], bar_duration_s)
+    return levels[i - 1] if i > 0 else None
+
+
 def build_power_flux_query(bucket, measurement, field, n_bars, bar_duration,
-                           n_buffer):
+                           n_buffer, since_s=None, every_s=None):
     """Build the Flux query string for power history data.
 
     :param bucket: InfluxDB bucket name.
@@ -236,19 +640,276 @@ def build_power_flux_query(bucket, measurement, field, n_bars, bar_duration,
     :param n_bars: Number of bars to cover.
     :param bar_duration: Duration of each bar in seconds (int or numeric string).
     :param n_buffer: Extra bars to fetch beyond *n_bars* for boundary accuracy.
+    :param since_s: Optional; only fetch the last *since_s* seconds (rounded
+        up) for an incremental refresh.  Never exceeds the full range.
+    :param every_s: Optional; thin the series out server-side to the last
+        value of every *every_s* seconds.  As the field is a cumulative
+        counter, the energy between the remaining samples stays exact.
     :return: Flux query string.
     """
     time_range = (n_bars + n_buffer) * int(bar_duration)
+    if since_s is not None:
+        time_range = min(time_range, max(1, math.ceil(since_s)))
     lines = [
         f'from(bucket: "{bucket}")',
         f'  |> range(start: -{time_range}s)',
         f'  |> filter(fn: (r) => r._measurement == "{measurement}")',
         f'  |> filter(fn: (r) => r._field == "{field}")',
-        f'  |> sort(columns: ["_time"])',
     ]
+    if every_s:
+        lines.append(f'  |> aggregateWindow(every: {int(every_s)}s, fn: last, createEmpty: false)')
+    lines.append(f'  |> sort(columns: ["_time"])')
     return '\n'.join(lines)
 
 
+def merge_series(old, new, t_min):
+    """Merge an incremental query result into a cached time series.
+
+    Cached points at or after the first new timestamp are replaced by the new
+    points; points older than *t_min* are dropped.
+
+    :param old: Cached ``(times, values)`` arrays, sorted by time.
+    :param new: Newly fetched ``(times, values)`` arrays, sorted by time.
+    :param t_min: Oldest timestamp to keep.
+    :return: Merged ``(times, values)`` tuple of ``array('d')``.
+    """
+    old_times, old_values = old
+    new_times, new_values = new
+
+    end = len(old_times)
+    if len(new_times):
+        end = bisect.bisect_left(old_times, new_times[0])
+    start = bisect.bisect_left(old_times, t_min, 0, end)
+
+    times = array('d', old_times[start:end])
+    values = array('d', old_values[start:end])
+    first_new = bisect.bisect_left(new_times, t_min)
+    times.extend(new_times[first_new:])
+    values.extend(new_values[first_new:])
+    return times, values
+
+
+_CACHE_MAGIC = b'PHGC'
+_CACHE_VERSION = 1
+_CACHE_PREAMBLE = struct.Struct('<4sHI')  # magic, version, header length
+
+
+def save_graph_cache(path, header, series, bar_watts):
+    """Write the graph data to a compact binary cache file.
+
+    The file holds a short preamble, a JSON *header* and the raw float arrays
+    of the series and the bar values.  It is written to a temporary file
+    first and then renamed, so readers never see a partial file.
+
+    :param path: Cache file path.
+    :param header: JSON-serializable dict describing the data (e.g. the
+        configuration it was computed for).
+    :param series: ``(times, values)`` arrays.
+    :param bar_watts: Sequence of bar values in watts.
+    """
+    times, values = series
+    meta = dict(header)
+    meta.update(byteorder=sys.byteorder, n_points=len(times), n_bars=len(bar_watts))
+    meta_raw = json.dumps(meta).encode('utf-8')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_CACHE_PREAMBLE.pack(_CACHE_MAGIC, _CACHE_VERSION, len(meta_raw)))
+        f.write(meta_raw)
+        f.write(array('d', times).tobytes())
+        f.write(array('d', values).tobytes())
+        f.write(array('d', bar_watts).tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_graph_cache(path):
+    """Read a cache file written by :func:`save_graph_cache`.
+
+    :param path: Cache file path.
+    :return: Tuple ``(header, (times, values), bar_watts)``, or ``None`` if the
+        file does not exist or is not a valid cache file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        Logger.warning("PowerGraph: Cannot read cache file %s: %s", path, e)
+        return None
+
+    try:
+        magic, version, meta_len = _CACHE_PREAMBLE.unpack_from(raw)
+        if magic != _CACHE_MAGIC or version != _CACHE_VERSION:
+            return None
+        offset = _CACHE_PREAMBLE.size
+        header = json.loads(raw[offset:offset + meta_len].decode('utf-8'))
+        offset += meta_len
+
+        arrays = []
+        for count in (header['n_points'], header['n_points'], header['n_bars']):
+            a = array('d')
+            a.frombytes(raw[offset:offset + count * a.itemsize])
+            if len(a) != count:
+                return None
+            if header['byteorder'] != sys.byteorder:
+                a.byteswap()
+            arrays.append(a)
+            offset += count * a.itemsize
+    except (struct.error, ValueError, KeyError, TypeError) as e:
+        Logger.warning("PowerGraph: Ignoring invalid cache file %s: %s", path, e)
+        return None
+
+    times, values, bar_watts = arrays
+    return header, (times, values), list(bar_watts)
+
+
+def shift_cached_bars(bar_watts, anchor, bar_duration, now):
+    """Move cached bars on by the bars completed since they were saved.
+
+    :param bar_watts: Cached bar values, oldest first.
+    :param anchor: End timestamp of the newest cached bar.
+    :param bar_duration: Bar duration in seconds.
+    :param now: Current Unix timestamp.
+    :return: Tuple ``(bar_watts, anchor)`` with the bars after the cached
+        data left empty, or ``None`` if no cached bar is in the window ending
+        at *now*.
+    """
+    shift = max(0, math.floor((now - anchor) / bar_duration))
+    if shift >= len(bar_watts):
+        return None
+    return bar_watts[shift:] + [0.0] * shift, anchor + shift * bar_duration
+
+
+class GraphCacheWriter(object):
+    """Writes graph cache files with :func:`save_graph_cache` on one worker thread.
+
+    Saves of a file requested while the worker is busy replace each other,
+    only the newest data is written.
+    """
+
+    def __init__(self):
+        self._pending = dict()  # path -> (header, series, bar_watts)
+        self._cond = threading.Condition()
+        self._worker = None
+
+    def save(self, path, header, series, bar_watts) -> None:
+        """Write the data to *path* soon, see :func:`save_graph_cache`."""
+        with self._cond:
+            self._pending[path] = (header, series, bar_watts)
+            self._cond.notify()
+        self._start_worker()
+
+    def _start_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="PowerGraphCache", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            self._write_pending()
+
+    def _write_pending(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    return
+                path = next(iter(self._pending))
+                header, series, bar_watts = self._pending.pop(path)
+            try:
+                save_graph_cache(path, header, series, bar_watts)
+            except OSError as e:
+                Logger.warning("PowerGraph: Cannot write cache file %s: %s", path, e)
+
+
+_cache_writer = GraphCacheWriter()
+
+
+class LivePowerTail(object):
+    """Integrates live power samples into the newest bar between history refreshes.
+
+    The history bars end at an *anchor* timestamp (the time of the last
+    InfluxDB query).  Live samples after the anchor are integrated with a
+    zero-order hold, i.e. each reading is assumed to hold until the next one.
+    Whenever a full bar duration has been integrated, a completed bar is
+    returned by :meth:`add_sample` and the anchor moves on by one bar.
+
+    Between completed bars, :meth:`current_watts` provides the average power
+    over the newest bar duration ending at the last sample, blending the live
+    energy with the newest completed bar for the part not yet covered.
+    """
+
+    def __init__(self):
+        self._bar_duration = None
+        self._anchor = None
+        self._energy_ws = 0.0
+        self._last_t = None
+        self._last_watts = None
+
+    @property
+    def anchor(self):
+        """End timestamp of the newest completed bar, or ``None`` before :meth:`reset`."""
+        return self._anchor
+
+    def reset(self, anchor, bar_duration):
+        """Restart integration after the history has been refreshed up to *anchor*.
+
+        The most recent reading is kept and continues to be held from *anchor* on.
+        """
+        self._anchor = anchor
+        self._bar_duration = bar_duration
+        self._energy_ws = 0.0
+        if self._last_t is not None:
+            self._last_t = max(self._last_t, anchor)
+
+    def add_sample(self, t, watts):
+        """Add a power reading and return the average watts of all completed bars.
+
+        :param t: Unix timestamp of the reading.
+        :param watts: Instantaneous power in watts, or ``None`` if unknown.
+            Unknown periods do not contribute any energy.
+        :return: List of completed bar values (oldest first), usually empty.
+        """
+        completed = []
+        if self._anchor is None or not self._bar_duration or self._bar_duration <= 0:
+            self._last_t, self._last_watts = t, watts
+            return completed
+
+        # Only the time after the anchor is not yet covered by the history
+        t_prev = self._anchor if self._last_t is None else max(self._last_t, self._anchor)
+        while True:
+            bar_end = self._anchor + self._bar_duration
+            seg_end = min(t, bar_end)
+            if seg_end > t_prev and self._last_watts is not None:
+                self._energy_ws += self._last_watts * (seg_end - t_prev)
+            t_prev = max(t_prev, seg_end)
+            if t < bar_end:
+                break
+            completed.append(self._energy_ws / self._bar_duration)
+            self._energy_ws = 0.0
+            self._anchor = bar_end
+
+        self._last_t = max(t, t_prev)
+        self._last_watts = watts
+        return completed
+
+    def current_watts(self, newest_bar_watts):
+        """Average power over the newest bar duration ending at the last sample.
+
+        :param newest_bar_watts: Average watts of the newest completed bar,
+            used for the part of the window that precedes the anchor.
+        :return: Blended average watts, or *newest_bar_watts* without live data.
+        """
+        if self._anchor is None or self._last_t is None or not self._bar_duration:
+            return newest_bar_watts
+        elapsed = min(max(0.0, self._last_t - self._anchor), self._bar_duration)
+        return (newest_bar_watts * (self._bar_duration - elapsed) + self._energy_ws) \
+            / self._bar_duration
+
+
 class PowerHistoryGraph(RelativeLayout):
     """Bar chart showing power consumption history from InfluxDB.
 
@@ -273,9 +934,32 @@ class PowerHistoryGraph(RelativeLayout):
         Time covered by each bar as an ISO 8601 duration string (e.g. ``"PT5M"``)
         or seconds (default ``"PT5M"`` = 300 s).  If the resulting number of bars
         does not fit on screen, the duration is increased automatically.
+    ``cache_file``
+        Optional path of a local cache file.  The fetched series and bars are
+        written there after each update and loaded when the configuration is
+        applied, so the graph is painted immediately after a restart, even if
+        InfluxDB is unreachable.  Subsequent queries only fetch newer data.
     ``update_interval``
         Query/redraw interval as an ISO 8601 duration string or seconds
-        (default ``"PT1M"`` = 60 s).
+        (default ``"PT1M"`` = 60 s).  When :attr:`live_power` is bound, the
+        newest bar is kept current from the live readings, so this interval
+        can be much longer than the bar duration.
+    ``downsampled``
+        Optional list of downsampled copies of the series, each a dict with
+        ``bucket``, ``resolution`` (ISO 8601 duration or seconds) and optionally
+        ``measurement`` and ``field``.  The coarsest level that still provides
+        one sample per bar is queried instead of the raw series, so the query
+        cost depends on the number of bars rather than on the displayed time
+        span.  As the field is a cumulative counter, the levels only need the
+        last value of each window, e.g. maintained by an InfluxDB task with
+        ``aggregateWindow(every: 15m, fn: last)`` and ``to(bucket: ...)``.
+
+    Bind :attr:`live_power` to the instantaneous power reading (e.g. the
+    ``raw_power`` property of a :class:`PowerWidget`) to accumulate live
+    samples into the rightmost bar between InfluxDB refreshes (see
+    :class:`LivePowerTail`).  The reading is also sampled every
+    :attr:`LIVE_TICK_INTERVAL` seconds, so that the bars move on under a
+    constant load, when the property does not change.
     """
 
     BAR_WIDTH = 8               # fallback px per bar (used when display_duration is not set)
@@ -283,18 +967,44 @@ class PowerHistoryGraph(RelativeLayout):
     FRAME_BORDER = 1            # px width of structural frame lines
     # Extra bar slots fetched beyond n_bars to cover boundary conditions
     _QUERY_BUFFER_BARS = 2
+    LIVE_TICK_INTERVAL = 5      # seconds between samples of an unchanged live_power
+
+    _CANVAS_GROUP = 'phg_frame'
 
     conf = DictProperty(None, allownone=True)
     influxdb_widget = ObjectProperty(None, allownone=True)
+    live_power = NumericProperty(None, allownone=True)
 
     _bars = ListProperty([])
     _max_value = NumericProperty(None, allownone=True)
 
     def __init__(self, **kwargs):
         self._update_event = None
+        self._live_event = None
         self._max_label = None
+        self._mesh_quads = 0
+        self._bar_watts = []
+        self._series = (array('d'), array('d'))
+        self._queried = False
+        self._cache_path = None
+        self._series_source = None
+        self._series_step = 0
+        self._levels = []
+        self._layout_cache = BarLayoutCache(self.BAR_WIDTH)
+        self._live_tail = LivePowerTail()
         super().__init__(**kwargs)
 
+        # Persistent drawing instructions, updated in place by _redraw.
+        # They are appended to canvas.before after the PushMatrix/Translate
+        # instructions of the RelativeLayout.
+        with self.canvas.before:
+            Color(*Colors.COLOR_GREY, group=self._CANVAS_GROUP)
+            self._x_axis = Line(points=[], width=self.FRAME_BORDER, group=self._CANVAS_GROUP)
+            self._y_axis = Line(points=[], width=self.FRAME_BORDER, group=self._CANVAS_GROUP)
+            self._body_mesh = Mesh(mode='triangles', group=self._CANVAS_GROUP)
+            Color(*Colors.COLOR_YELLOW, group=self._CANVAS_GROUP)
+            self._highlight_mesh = Mesh(mode='triangles', group=self._CANVAS_GROUP)
+
         self._max_label = Label(
             text='',
             font_size=12,
@@ -312,20 +1022,39 @@ class PowerHistoryGraph(RelativeLayout):
         self.bind(influxdb_widget=self._on_settings_change)
         self.bind(size=self._on_size)
         self.bind(_bars=self._redraw)
+        self.bind(live_power=self._on_live_power)
         self.bind(_max_value=self._update_max_label)
 
     def _on_settings_change(self, *args):
         self._stop_updates()
+        try:
+            self._levels = parse_resolution_levels((self.conf or {}).get("downsampled", None))
+        except ValueError as e:
+            Logger.warning("PowerGraph: Invalid downsampled configuration, ignored: %s", e)
+            self._levels = []
+        source = self._cache_header()
+        if source != self._series_source:
+            # Kept data belongs to a different series
+            self._series_source = source
+            self._series = (array('d'), array('d'))
+            self._series_step = 0
+            self._bar_watts = []
+            self._cache_path = None
+            self._update_bars()
+        self._load_cache()
         if self.conf and self.influxdb_widget:
             self._start_updates()
 
     def _on_size(self, *args):
+        # Bars are recomputed from the kept series when the layout changes
+        if len(self._series[0]) and len(self._bar_watts) != self._n_bars():
+            self._recompute_bars()
         self._redraw()
         self._position_max_label()
         # Trigger the initial query once the widget has valid dimensions.
         # This handles the case where _start_updates fired before layout
         # assigned a non-zero width.
-        if self._update_event is not None and not self._bars and self._n_bars() > 0:
+        if self._update_event is not None and not self._queried and self._n_bars() > 0:
             self._query_influx()
 
     def _start_updates(self):
@@ -337,6 +1066,7 @@ class PowerHistoryGraph(RelativeLayout):
             interval = 60.0
         self._update_event = Clock.schedule_interval(
             lambda dt: self._query_influx(), interval)
+        self._live_event = Clock.schedule_interval(self._tick_live, self.LIVE_TICK_INTERVAL)
         # Only fire immediately if the widget already has a valid width;
         # otherwise _on_size will trigger the first query once layout is done.
         if self._n_bars() > 0:
@@ -346,85 +1076,182 @@ class PowerHistoryGraph(RelativeLayout):
         if self._update_event is not None:
             self._update_event.cancel()
             self._update_event = None
+        if self._live_event is not None:
+            self._live_event.cancel()
+            self._live_event = None
+        self._queried = False
 
-    def _bar_params(self):
-        """Return ``(n_bars, bar_dur_s, slot_w_px, bar_w_px)`` for the current config and size.
+    def _layout(self):
+        """Return the :class:`BarLayout` for the current config and size.
 
-        Delegates to :func:`compute_bar_layout` after resolving ISO 8601 durations
-        from ``self.conf``.
+        The layout is only compiled again when the width or the durations
+        change, see :attr:`layout_stats`.
         """
         available = max(0, int(self.width) - self.FRAME_BORDER)
-        conf = self.conf or {}
+        return self._layout_cache.get(available, self.conf)
 
-        bar_dur_raw = conf.get("bar_duration", "PT5M")
-        try:
-            bar_dur = parse_duration_seconds(bar_dur_raw)
-        except ValueError:
-            Logger.warning("PowerGraph: Invalid bar_duration %r, using 300 s", bar_dur_raw)
-            bar_dur = 300.0
-
-        display_dur = None
-        display_dur_raw = conf.get("display_duration", None)
-        if display_dur_raw is not None:
-            try:
-                display_dur = parse_duration_seconds(display_dur_raw)
-            except ValueError:
-                Logger.warning("PowerGraph: Invalid display_duration %r, ignored",
-                               display_dur_raw)
-
-        return compute_bar_layout(available, display_dur, bar_dur, self.BAR_WIDTH)
+    @property
+    def layout_stats(self):
+        """Counters of the bar layout cache, see :meth:`BarLayoutCache.stats`."""
+        return self._layout_cache.stats()
 
     def _n_bars(self):
         """Return how many bars fit in the current widget width."""
-        return self._bar_params()[0]
+        return self._layout().n_bars
 
-    def _query_influx(self):
-        if not self.conf or not self.influxdb_widget:
-            return
+    def _query_source(self, bar_duration):
+        """Return ``(bucket, measurement, field, step_s)`` to query for *bar_duration*.
 
+        *step_s* is the sample spacing requested from InfluxDB, a multiple of
+        the selected downsampled resolution, or 0 for the raw series.
+        """
         bucket = self.conf.get("bucket", None)
         measurement = self.conf.get("measurement", None)
         field = self.conf.get("field", None)
+
+        level = select_resolution_level(self._levels, bar_duration)
+        if level is None:
+            return bucket, measurement, field, 0
+        resolution, level_bucket, level_measurement, level_field = level
+        step = max(1, int(bar_duration // resolution)) * resolution
+        return level_bucket, level_measurement or measurement, level_field or field, step
+
+    def _query_influx(self):
+        if not self.conf or not self.influxdb_widget:
+            return
+
+        layout = self._layout()
+        n, bar_duration = layout.n_bars, layout.bar_duration
+        bucket, measurement, field, step = self._query_source(bar_duration)
         if not bucket or not measurement or not field:
             Logger.warning("PowerGraph: 'bucket', 'measurement' and 'field' must be configured")
             return
-
-        n, bar_duration, _, _ = self._bar_params()
         if n <= 0:
             return
 
+        # Incremental refresh: only fetch what is newer than the kept series.
+        # The last kept point is fetched again to join both parts.  A kept
+        # series that is coarser than required is replaced completely.
+        times = self._series[0]
+        since_s = None
+        incremental = False
+        if len(times) >= 2 and self._series_step <= step:
+            since_s = _time.time() - times[-1] + 1
+            incremental = since_s < (n + self._QUERY_BUFFER_BARS) * bar_duration
+
         flux_query = build_power_flux_query(
-            bucket, measurement, field, n, bar_duration, self._QUERY_BUFFER_BARS)
+            bucket, measurement, field, n, bar_duration, self._QUERY_BUFFER_BARS,
+            since_s=since_s if incremental else None, every_s=step or None)
+
+        self._queried = True
+        self.influxdb_widget.query_csv(
+            flux_query, parse_flux_csv_series,
+            lambda series: self._on_data(series, incremental, step), self._on_query_error)
+
+    def _on_data(self, series, incremental=False, step=0):
+        layout = self._layout()
+        n, bar_duration = layout.n_bars, layout.bar_duration
+        t_min = _time.time() - (n + self._QUERY_BUFFER_BARS) * bar_duration
+        if incremental:
+            self._series = merge_series(self._series, series, t_min)
+            self._series_step = max(self._series_step, step)
+        else:
+            self._series = series
+            self._series_step = step
 
-        self.influxdb_widget.query(
-            flux_query, self._on_data, self._on_query_error)
+        self._recompute_bars()
+        self._save_cache()
 
-    def _on_data(self, tables):
-        points = []
-        for table in tables:
-            for record in table.records:
-                t = record.get_time()
-                v = record.get_value()
-                if t is not None and v is not None:
-                    points.append((t.timestamp(), float(v)))
+    def _recompute_bars(self):
+        """Compute the bar values from the kept series for the current layout."""
+        times, values = self._series
+        segments = compute_energy_segments(zip(times, values)) if len(times) >= 2 else []
+        if not segments:
+            self._bar_watts = []
+            self._update_bars()
+            return
 
-        points.sort(key=lambda p: p[0])
+        layout = self._layout()
+        n, bar_duration = layout.n_bars, layout.bar_duration
+        now = _time.time()
 
-        if len(points) < 2:
-            self._bars = []
-            self._max_value = None
+        self._bar_watts = compute_bar_values(segments, n, bar_duration, now)
+        self._live_tail.reset(now, bar_duration)
+        self._update_bars()
+
+    def _cache_header(self):
+        """Identify the data source the series is computed for."""
+        conf = self.conf or {}
+        return {
+            "bucket": conf.get("bucket", None),
+            "measurement": conf.get("measurement", None),
+            "field": conf.get("field", None),
+        }
+
+    def _load_cache(self):
+        """Restore series and bars from the cache file configured in ``cache_file``.
+
+        Runs synchronously so that the graph can be painted in the first
+        frame.  The cache is ignored if it was written for a different source.
+        """
+        path = (self.conf or {}).get("cache_file", None)
+        if not path or path == self._cache_path:
             return
+        self._cache_path = path
 
-        segments = compute_energy_segments(points)
-        if not segments:
-            self._bars = []
-            self._max_value = None
+        cached = load_graph_cache(path)
+        if cached is None:
+            return
+        header, series, bar_watts = cached
+        if any(header.get(k) != v for k, v in self._cache_header().items()):
+            Logger.info("PowerGraph: Cache file %s is for a different series, ignored", path)
             return
 
-        n, bar_duration, _, _ = self._bar_params()
-        now = _time.time()
+        self._series = series
+        self._series_step = header.get("step", 0)
+        layout = self._layout()
+        n, bar_duration = layout.n_bars, layout.bar_duration
+        anchor = header.get("anchor", None)
+        shifted = None
+        if anchor and len(bar_watts) == n and header.get("bar_duration") == bar_duration:
+            # Same layout: paint the cached bars, moved on by the time since the save
+            shifted = shift_cached_bars(bar_watts, anchor, bar_duration, _time.time())
+        if shifted is not None:
+            self._bar_watts, anchor = shifted
+            self._live_tail.reset(anchor, bar_duration)
+            self._update_bars()
+        else:
+            self._recompute_bars()
+
+    def _save_cache(self):
+        path = (self.conf or {}).get("cache_file", None)
+        if not path:
+            return
+
+        header = self._cache_header()
+        header.update(anchor=self._live_tail.anchor,
+                      bar_duration=self._layout().bar_duration,
+                      step=self._series_step)
+        _cache_writer.save(path, header, self._series, list(self._bar_watts))
+
+    def _tick_live(self, _dt):
+        # The held reading still counts while it does not change
+        self._on_live_power(self, self.live_power)
 
-        bar_watts = compute_bar_values(segments, n, bar_duration, now)
+    def _on_live_power(self, _instance, watts):
+        completed = self._live_tail.add_sample(_time.time(), watts)
+        if not self._bar_watts:
+            return
+        if completed:
+            n = len(self._bar_watts)
+            self._bar_watts = (self._bar_watts + completed)[-n:]
+        self._update_bars()
+
+    def _update_bars(self):
+        """Normalize the bar values, with the live tail applied to the newest bar."""
+        bar_watts = list(self._bar_watts)
+        if bar_watts:
+            bar_watts[-1] = self._live_tail.current_watts(bar_watts[-1])
 
         max_val = max(bar_watts) if bar_watts else 0.0
         if max_val <= 0:
@@ -438,51 +1265,39 @@ class PowerHistoryGraph(RelativeLayout):
     def _on_query_error(self, e):
         Logger.error("PowerGraph: InfluxDB query error: %s", str(e))
 
-    _CANVAS_GROUP = 'phg_frame'
-
     def _redraw(self, *args):
-        # Use remove_group instead of canvas.before.clear() to avoid removing
-        # the PushMatrix/Translate instructions that RelativeLayout places in
-        # canvas.before (clearing those while PopMatrix remains in canvas.after
-        # causes an unbalanced RenderContext pop_state → IndexError).
-        self.canvas.before.remove_group(self._CANVAS_GROUP)
-
         w = self.width
         h = self.height
         if w <= 0 or h <= 0:
+            self._x_axis.points = []
+            self._y_axis.points = []
+            self._set_bar_vertices([], [])
             return
 
-        with self.canvas.before:
-            # Axis lines: bottom baseline and left y-axis only
-            b = self.FRAME_BORDER
-            Color(*Colors.COLOR_GREY, group=self._CANVAS_GROUP)
-            Line(points=[0, 0, w, 0], width=b, group=self._CANVAS_GROUP)
-            Line(points=[0, 0, 0, h], width=b, group=self._CANVAS_GROUP)
+        # Axis lines: bottom baseline and left y-axis only
+        self._x_axis.points = [0, 0, w, 0]
+        self._y_axis.points = [0, 0, 0, h]
 
-            if self._bars:
-                n, _, slot_w, bar_w = self._bar_params()
-                if n <= 0:
-                    return
+        layout = self._layout()
+        n, slot_w, bar_w = layout.n_bars, layout.slot_w, layout.bar_w
+        if not self._bars or n <= 0:
+            self._set_bar_vertices([], [])
+            return
 
-                for i, normalized in enumerate(self._bars[:n]):
-                    bar_h = max(float(b), normalized * (h - b))
-                    # Float x-position for visually even distribution across the
-                    # full widget width — each bar occupies exactly slot_w pixels.
-                    x = float(b) + i * slot_w
-
-                    # Grey body — everything below the yellow top accent
-                    grey_h = max(0.0, bar_h - self.BAR_HIGHLIGHT_HEIGHT)
-                    if grey_h > 0:
-                        Color(*Colors.COLOR_GREY, group=self._CANVAS_GROUP)
-                        Rectangle(pos=(x, float(b)), size=(bar_w, grey_h),
-                                  group=self._CANVAS_GROUP)
-
-                    # Yellow accent strip — top 2 px of each bar
-                    top_h = min(float(self.BAR_HIGHLIGHT_HEIGHT), bar_h)
-                    top_y = float(b) + max(0.0, bar_h - self.BAR_HIGHLIGHT_HEIGHT)
-                    Color(*Colors.COLOR_YELLOW, group=self._CANVAS_GROUP)
-                    Rectangle(pos=(x, top_y), size=(bar_w, top_h),
-                              group=self._CANVAS_GROUP)
+        body, highlight = build_bar_vertices(
+            self._bars[:n], slot_w, bar_w, h, self.FRAME_BORDER, self.BAR_HIGHLIGHT_HEIGHT)
+        self._set_bar_vertices(body, highlight)
+
+    def _set_bar_vertices(self, body, highlight):
+        """Upload new vertex data; indices are only replaced when the bar count changes."""
+        quads = len(body) // 16
+        if quads != self._mesh_quads:
+            indices = quad_indices(quads)
+            self._body_mesh.indices = indices
+            self._highlight_mesh.indices = indices
+            self._mesh_quads = quads
+        self._body_mesh.vertices = body
+        self._highlight_mesh.vertices = highlight
 
     def _update_max_label(self, *args):
         if self._max_label is None:
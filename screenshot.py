@@ -1,23 +1,208 @@
 """ Module for application screenshots: window captures and widget thumbnails """
 
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from datetime import datetime
+from typing import Optional
 
 from kivy import Logger
 from kivy.core.window import Window
+from kivy.graphics import Fbo, Rectangle
 from kivy.graphics.texture import Texture
 
+try:
+    import numpy as np
+except ImportError:
+    np = None  # SalientScaleStrategy falls back to pure Python
 
-def screenshot_window(name=None):
-    """Take a screenshot of the entire application window and save to a file.
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None  # Screenshots can only be written as PNG
 
-    :param name: Optional file name.  When ``None`` a timestamped default is
-        used (``Screenshot <datetime>.png``).
-    :returns: The file path written by Kivy, or ``None`` on failure.
+
+class ScreenshotOptions(object):
+    """Where and how :class:`ScreenshotWriter` stores window screenshots.
+
+    *quality* (1 to 95) applies to JPEG only; PNG is lossless.  JPEG needs
+    Pillow.
+    """
+
+    FORMATS = ('png', 'jpeg')
+    QUALITY_DEFAULT = 90
+
+    @staticmethod
+    def from_json_cfg(config: Optional[dict]):
+        if config is None:
+            return ScreenshotOptions()
+
+        return ScreenshotOptions(
+            directory=config.get("directory", "."),
+            fmt=config.get("format", "png"),
+            quality=config.get("quality", ScreenshotOptions.QUALITY_DEFAULT)
+        )
+
+    def __init__(self, directory=".", fmt="png", quality=QUALITY_DEFAULT):
+        fmt = str(fmt).lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in ScreenshotOptions.FORMATS:
+            raise ValueError("Unknown screenshot format: {}".format(fmt))
+        if fmt == 'jpeg' and PILImage is None:
+            raise ValueError("Screenshot format jpeg needs Pillow")
+        try:
+            quality = int(quality)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid screenshot quality: {!r}".format(quality))
+        if not 1 <= quality <= 95:
+            raise ValueError("Screenshot quality must be between 1 and 95: {}".format(quality))
+
+        self.directory = directory
+        self.fmt = fmt
+        self.quality = quality
+
+    @property
+    def extension(self):
+        return 'jpg' if self.fmt == 'jpeg' else 'png'
+
+    def replace(self, fmt=None, quality=None):
+        """Return a copy with *fmt* and *quality* replaced, where given."""
+        return ScreenshotOptions(self.directory,
+                                 self.fmt if fmt is None else fmt,
+                                 self.quality if quality is None else quality)
+
+
+def _read_window_pixels():
+    """Read the displayed window image back from the GPU.
+
+    Must be called on the Kivy main (GL) thread.
+
+    :return: Tuple ``(rgba, width, height)``, rows bottom up.
     """
-    if name is None:
-        name = "Screenshot {}.png".format(datetime.now())
-    Logger.info("Screenshot: Taking a screenshot to %s", name)
-    return Window.screenshot(name=name)
+    from kivy.graphics.opengl import glReadPixels, GL_RGBA, GL_UNSIGNED_BYTE
+    width, height = Window.size
+    return glReadPixels(0, 0, width, height, GL_RGBA, GL_UNSIGNED_BYTE), width, height
+
+
+def _rgba_to_rgb(rgba, width, height):
+    """Drop the alpha channel and flip the bottom-up rows of a GL readback."""
+    rgb = bytearray(width * height * 3)
+    for channel in range(3):
+        rgb[channel::3] = rgba[channel::4]
+    stride = width * 3
+    return b''.join(rgb[y * stride:(y + 1) * stride] for y in range(height - 1, -1, -1))
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def _encode_png(rgb, width, height):
+    """Encode top-down RGB rows as PNG."""
+    stride = width * 3
+    # Filter type 0 (none) for every row
+    raw = b''.join(b'\x00' + rgb[y * stride:(y + 1) * stride] for y in range(height))
+    return (b'\x89PNG\r\n\x1a\n'
+            + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + _png_chunk(b'IDAT', zlib.compress(raw, 6))
+            + _png_chunk(b'IEND', b''))
+
+
+class ScreenshotWriter(object):
+    """Window screenshots, encoded and written on a worker thread.
+
+    :meth:`request` reads the pixels back on the calling (GL) thread, which
+    takes a few milliseconds; encoding and writing to the SD card happen on
+    a worker thread, so that rendering goes on meanwhile.  Requests are
+    dropped until the pending screenshot has been written.
+    """
+
+    def __init__(self, options: Optional[ScreenshotOptions] = None):
+        self.options = options or ScreenshotOptions()
+        self._queue = queue.Queue(maxsize=1)
+        self._pending = threading.Event()
+        self._worker = None
+
+    def request(self, name=None, options: Optional[ScreenshotOptions] = None) -> bool:
+        """Take a screenshot of the window.
+
+        Must be called on the Kivy main thread.
+
+        :param name: Optional file name in the configured directory.  When
+            ``None`` a timestamped default is used (``Screenshot <datetime>.png``).
+        :param options: Options for this screenshot instead of :attr:`options`.
+        :return: ``False`` if the request was dropped because another one is pending.
+        """
+        if self._pending.is_set():
+            Logger.warning("Screenshot: Previous screenshot still pending, request dropped")
+            return False
+
+        options = options or self.options
+        if name is None:
+            name = "Screenshot {}.{}".format(datetime.now(), options.extension)
+        path = os.path.join(options.directory, name)
+
+        rgba, width, height = _read_window_pixels()
+        self._pending.set()
+        self._queue.put_nowait((path, rgba, width, height, options))
+        Logger.info("Screenshot: Taking a screenshot to %s", path)
+        self._start_worker()
+        return True
+
+    def teardown(self):
+        """Finish the pending screenshot and stop the worker thread"""
+        if self._worker is not None:
+            # Waits for the pending screenshot to be taken from the queue
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _start_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="Screenshot", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._handle(item)
+
+    def _handle(self, item):
+        path, rgba, width, height, options = item
+        try:
+            ScreenshotWriter._write(path, _rgba_to_rgb(rgba, width, height), width, height,
+                                    options)
+        except Exception as e:
+            # Keep the worker alive for the next screenshot, whatever failed
+            Logger.error("Screenshot: Cannot write %s: %s", path, str(e))
+        finally:
+            self._pending.clear()
+
+    @staticmethod
+    def _write(path, rgb, width, height, options):
+        # Write to a temporary file first, so that no partial image is left behind
+        tmp_path = path + ".part"
+        try:
+            if options.fmt == 'jpeg':
+                image = PILImage.frombytes('RGB', (width, height), rgb)
+                image.save(tmp_path, 'JPEG', quality=options.quality)
+            else:
+                with open(tmp_path, 'wb') as f:
+                    f.write(_encode_png(rgb, width, height))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
 
 
 class ScaleStrategy:
@@ -63,6 +248,96 @@ class AspectFitStrategy(ScaleStrategy):
             return None
 
 
+def _fit_size(src_w, src_h, max_width, max_height):
+    """Return the largest size with the aspect ratio of *src_w* × *src_h* that
+    fits within *max_width* × *max_height*, at least one pixel on each axis."""
+    if src_w * max_height > src_h * max_width:
+        out_w = int(max_width)
+        out_h = max(1, int(out_w * src_h / src_w))
+    else:
+        out_h = int(max_height)
+        out_w = max(1, int(out_h * src_w / src_h))
+    return out_w, out_h
+
+
+def _pool_bounds(src_len, out_len):
+    """Return the ``(start, end)`` source ranges of the *out_len* pooling blocks.
+
+    The block size is fractional; every block holds at least one pixel.
+    """
+    block = src_len / out_len
+    bounds = []
+    for o in range(out_len):
+        s0 = int(o * block)
+        bounds.append((s0, max(s0 + 1, min(int((o + 1) * block), src_len))))
+    return bounds
+
+
+def _max_luminance_pool(data, src_w, src_h, out_w, out_h):
+    """Max-luminance pooling of RGBA *data* in pure Python.
+
+    Each output pixel is the first pixel with the highest ``max(R, G, B)`` in
+    its block, in row order.
+
+    :return: RGBA bytes of the *out_w* × *out_h* image.
+    """
+    x_bounds = _pool_bounds(src_w, out_w)
+    out_data = bytearray(out_w * out_h * 4)
+    for oy, (sy0, sy1) in enumerate(_pool_bounds(src_h, out_h)):
+        for ox, (sx0, sx1) in enumerate(x_bounds):
+            best_lum = None
+            br = bg = bb = ba = 0
+            for sy in range(sy0, sy1):
+                row_base = sy * src_w * 4
+                for sx in range(sx0, sx1):
+                    off = row_base + sx * 4
+                    r = data[off]
+                    g = data[off + 1]
+                    b = data[off + 2]
+                    a = data[off + 3]
+                    lum = max(r, g, b)
+                    if best_lum is None or lum > best_lum:
+                        best_lum = lum
+                        br, bg, bb, ba = r, g, b, a
+            dst_off = (oy * out_w + ox) * 4
+            out_data[dst_off] = br
+            out_data[dst_off + 1] = bg
+            out_data[dst_off + 2] = bb
+            out_data[dst_off + 3] = ba
+    return bytes(out_data)
+
+
+def _pool_index(bounds):
+    """Return an index array ``(n_blocks, max_block)`` of the source pixels per block.
+
+    Shorter blocks repeat their last pixel; the repetitions come after the
+    original, so they never win a tie in an argmax.
+    """
+    starts = np.array([s0 for s0, _ in bounds])
+    ends = np.array([s1 for _, s1 in bounds])
+    size = int((ends - starts).max())
+    return np.minimum(starts[:, None] + np.arange(size), ends[:, None] - 1)
+
+
+def _max_luminance_pool_numpy(data, src_w, src_h, out_w, out_h):
+    """Vectorized :func:`_max_luminance_pool`, with the same result."""
+    # A read-only view of the texture bytes, not a copy
+    img = np.frombuffer(data, dtype=np.uint8).reshape(src_h, src_w, 4)
+    lum = img[:, :, :3].max(axis=2)
+
+    ys = _pool_index(_pool_bounds(src_h, out_h))  # (out_h, bh)
+    xs = _pool_index(_pool_bounds(src_w, out_w))  # (out_w, bw)
+    bh, bw = ys.shape[1], xs.shape[1]
+    # (out_h, bh, out_w, bw) -> (out_h, out_w, bh * bw), row order within a block
+    blocks = lum[ys[:, :, None, None], xs[None, None, :, :]]
+    blocks = blocks.transpose(0, 2, 1, 3).reshape(out_h, out_w, bh * bw)
+    ky, kx = np.divmod(blocks.argmax(axis=2), bw)
+
+    sy = np.take_along_axis(ys, ky, axis=1)
+    sx = np.take_along_axis(xs, kx.T, axis=1).T
+    return img[sy, sx].tobytes()
+
+
 class SalientScaleStrategy(ScaleStrategy):
     """Downscales while preserving spatial layout and highlighting salient colours.
 
@@ -85,6 +360,9 @@ class SalientScaleStrategy(ScaleStrategy):
     Luminance is approximated as ``max(R, G, B)`` — the maximum channel value.
     This is faster than perceptual weights and equally effective for the purpose
     of selecting the brightest pixel in each block.
+
+    The pooling is vectorized with NumPy if it is installed, and falls back to
+    pure Python (several seconds per page on a Raspberry Pi) otherwise.
     """
 
     def capture(self, widget, max_width, max_height):
@@ -99,55 +377,112 @@ class SalientScaleStrategy(ScaleStrategy):
             data = src_tex.pixels  # RGBA bytes
 
             # Output size: fit within bounding box preserving aspect ratio.
-            if src_w * max_height > src_h * max_width:
-                out_w = int(max_width)
-                out_h = max(1, int(out_w * src_h / src_w))
-            else:
-                out_h = int(max_height)
-                out_w = max(1, int(out_h * src_w / src_h))
+            out_w, out_h = _fit_size(src_w, src_h, max_width, max_height)
 
             # Max-luminance pooling: each output pixel = brightest source pixel
             # in the corresponding input block.
-            # block_w / block_h are floats: fractional block sizes are handled by
-            # the int() truncation in the inner loop boundary calculations.
-            block_w = src_w / out_w
-            block_h = src_h / out_h
-
-            out_data = bytearray(out_w * out_h * 4)
-            for oy in range(out_h):
-                sy0 = int(oy * block_h)
-                sy1 = max(sy0 + 1, min(int((oy + 1) * block_h), src_h))
-                for ox in range(out_w):
-                    sx0 = int(ox * block_w)
-                    sx1 = max(sx0 + 1, min(int((ox + 1) * block_w), src_w))
-                    best_lum = None
-                    br = bg = bb = ba = 0
-                    for sy in range(sy0, sy1):
-                        row_base = sy * src_w * 4
-                        for sx in range(sx0, sx1):
-                            off = row_base + sx * 4
-                            r = data[off]
-                            g = data[off + 1]
-                            b = data[off + 2]
-                            a = data[off + 3]
-                            lum = max(r, g, b)
-                            if best_lum is None or lum > best_lum:
-                                best_lum = lum
-                                br, bg, bb, ba = r, g, b, a
-                    dst_off = (oy * out_w + ox) * 4
-                    out_data[dst_off] = br
-                    out_data[dst_off + 1] = bg
-                    out_data[dst_off + 2] = bb
-                    out_data[dst_off + 3] = ba
+            pool = _max_luminance_pool if np is None else _max_luminance_pool_numpy
+            out_data = pool(data, src_w, src_h, out_w, out_h)
 
             out_tex = Texture.create(size=(out_w, out_h), colorfmt='rgba')
-            out_tex.blit_buffer(bytes(out_data), colorfmt='rgba', bufferfmt='ubyte')
+            out_tex.blit_buffer(out_data, colorfmt='rgba', bufferfmt='ubyte')
             return out_tex
         except Exception as e:
             Logger.warning("Screenshot: SalientScaleStrategy: %s", e)
             return None
 
 
+# One pass of separable max-luminance pooling: every output pixel is the
+# brightest source pixel of its block along *axis*; ties go to the first.
+# The loop bound must be constant in GLSL ES 2.0.
+_POOL_MAX_BLOCK = 32
+_POOL_FS = """
+$HEADER$
+uniform vec2 src_size;
+uniform vec2 out_size;
+uniform vec2 axis;
+
+void main(void) {
+    float n_src = dot(src_size, axis);
+    float block = n_src / dot(out_size, axis);
+    float o = floor(dot(tex_coord0 * out_size, axis));
+    float s0 = floor(o * block);
+    float s1 = max(s0 + 1.0, min(floor((o + 1.0) * block), n_src));
+    vec2 across = tex_coord0 * (vec2(1.0) - axis);
+
+    vec4 best = vec4(0.0);
+    float best_lum = -1.0;
+    for (int i = 0; i < %d; i++) {
+        float s = s0 + float(i);
+        if (s >= s1) {
+            break;
+        }
+        vec4 c = texture2D(texture0, across + axis * (s + 0.5) / n_src);
+        float lum = max(c.r, max(c.g, c.b));
+        if (lum > best_lum) {
+            best_lum = lum;
+            best = c;
+        }
+    }
+    gl_FragColor = best;
+}
+""" % _POOL_MAX_BLOCK
+
+
+def _pool_pass(texture, out_size, axis):
+    """Render *texture* max-pooled along *axis* into a new texture of *out_size*.
+
+    :return: The texture, or ``None`` if the shader does not compile.
+    """
+    fbo = Fbo(size=out_size)
+    fbo.shader.fs = _POOL_FS
+    if not fbo.shader.success:
+        return None
+    fbo['src_size'] = (float(texture.width), float(texture.height))
+    fbo['out_size'] = (float(out_size[0]), float(out_size[1]))
+    fbo['axis'] = axis
+    with fbo:
+        Rectangle(texture=texture, pos=(0, 0), size=out_size)
+    fbo.draw()
+    return fbo.texture
+
+
+class GpuSalientScaleStrategy(ScaleStrategy):
+    """Max-luminance pooling like :class:`SalientScaleStrategy`, on the GPU.
+
+    The widget is rendered into a texture, which is pooled by a fragment
+    shader in two passes, first along the rows and then along the columns;
+    the brightest pixel of a block is the brightest of the row maxima.  No
+    pixels are read back to the CPU: the thumbnail stays a GPU texture.
+
+    A pass pools at most ``_POOL_MAX_BLOCK`` pixels per output pixel, so
+    larger widgets are rendered at a reduced scale first.  If the shader is
+    not supported, the capture falls back to :class:`SalientScaleStrategy`.
+    """
+
+    def capture(self, widget, max_width, max_height):
+        if widget is None or widget.width <= 0 or widget.height <= 0:
+            return None
+        try:
+            out_w, out_h = _fit_size(widget.width, widget.height, max_width, max_height)
+            scale = min(1.0, _POOL_MAX_BLOCK * out_w / widget.width,
+                        _POOL_MAX_BLOCK * out_h / widget.height)
+            src_tex = widget.export_as_image(scale=scale).texture
+            if src_tex.width <= 0 or src_tex.height <= 0:
+                return None
+
+            rows = _pool_pass(src_tex, (out_w, src_tex.height), (1.0, 0.0))
+            out_tex = rows and _pool_pass(rows, (out_w, out_h), (0.0, 1.0))
+            if out_tex is None:
+                Logger.warning("Screenshot: GpuSalientScaleStrategy: "
+                               "Pooling shader not available, pooling on the CPU")
+                return SalientScaleStrategy().capture(widget, max_width, max_height)
+            return out_tex
+        except Exception as e:
+            Logger.warning("Screenshot: GpuSalientScaleStrategy: %s", e)
+            return None
+
+
 def capture_widget_texture(widget, max_width, max_height, strategy=None):
     """Capture a widget's rendered content as a thumbnail texture.
 
@@ -164,3 +499,97 @@ def capture_widget_texture(widget, max_width, max_height, strategy=None):
     if strategy is None:
         strategy = AspectFitStrategy()
     return strategy.capture(widget, max_width, max_height)
+
+
+class ThumbnailCache(object):
+    """Page thumbnails by page handle, captured when a page is left.
+
+    A page is captured in :meth:`page_deactivated`, i.e. while it is still in
+    the widget tree, unless its thumbnail is still current.  A thumbnail is
+    current until the page dispatches ``on_dirty`` (see
+    :meth:`globalcontent.ContentPage.mark_dirty`) or, for pages that do not
+    signal their changes, until it is older than *max_age* seconds.
+    :meth:`get` only returns current thumbnails; hidden pages are not
+    rendered again, they are captured when they are left the next time.
+
+    The thumbnails are kept in least recently used order; the oldest are
+    evicted when their texture memory (4 bytes per pixel) exceeds
+    *max_bytes*.
+    """
+
+    def __init__(self, max_width, max_height, max_bytes=1 << 20, max_age=None, strategy=None):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._strategy = strategy or AspectFitStrategy()
+        # handle -> (texture, bytes, capture time), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'captures': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        """Texture memory of the cached thumbnails."""
+        return self._bytes
+
+    def stats(self):
+        """Return the hit, miss, capture and eviction counters as a dict."""
+        return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+    def get(self, handle):
+        """Return the current thumbnail texture of page *handle*, or ``None``."""
+        if not self._is_current(handle):
+            self.invalidate(handle)
+            self._stats['misses'] += 1
+            return None
+        self._entries.move_to_end(handle)
+        self._stats['hits'] += 1
+        return self._entries[handle][0]
+
+    def watch(self, page):
+        """Drop the thumbnail of *page* whenever it dispatches ``on_dirty``."""
+        page.bind(on_dirty=self._on_dirty)
+
+    def page_deactivated(self, page):
+        """Capture *page*, unless its thumbnail is still current.
+
+        Must be called while the page is still in the widget tree, e.g. from
+        :class:`globalcontent.PageRouter`'s ``on_before_page_switch`` event.
+        """
+        if self._is_current(page.label) or page.parent is None:
+            return
+        texture = capture_widget_texture(page, self.max_width, self.max_height, self._strategy)
+        if texture is not None:
+            self._stats['captures'] += 1
+            self._store(page.label, texture)
+
+    def invalidate(self, handle):
+        """Drop the thumbnail of page *handle*."""
+        entry = self._entries.pop(handle, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _is_current(self, handle):
+        entry = self._entries.get(handle, None)
+        if entry is None:
+            return False
+        return self.max_age is None or time.monotonic() - entry[2] <= self.max_age
+
+    def _on_dirty(self, page):
+        self.invalidate(page.label)
+
+    def _store(self, handle, texture):
+        size = texture.width * texture.height * 4
+        self.invalidate(handle)
+        if size > self.max_bytes:
+            return
+        self._entries[handle] = (texture, size, time.monotonic())
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+            self._stats['evictions'] += 1
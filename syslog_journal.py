@@ -0,0 +1,292 @@
+""" Persistent ring journal for syslog messages
+
+The journal is a file of fixed size, mapped into memory: a header followed by
+``n_slots`` slots of ``slot_size`` bytes.  Record *n* (counting from 0 since
+the file was created) is stored in slot ``n % n_slots``, so the oldest records
+are overwritten and the disk usage is bounded.
+
+Header (little endian)::
+
+    magic "SLJ1", version u16, reserved u16, slot_size u32, n_slots u32,
+    next_seq u64, crc32 u32 of the preceding fields
+
+Record::
+
+    seq u64, crc32 u32 of all other record bytes, received_at f64 (Unix time),
+    lengths of priority, facility, host, program u8, message u16, date u8,
+    followed by the UTF-8 encoded fields
+
+A record is written completely before ``next_seq`` in the header is advanced,
+so a crash in between leaves a journal that simply ends before the record.
+Records are copied into the mapping on the caller's thread; a worker thread
+flushes them to disk and then advances the header, at most once per
+:attr:`SyslogJournal.SYNC_INTERVAL`.
+On restore, only the slots of the requested number of newest records are
+read; a record whose sequence number or checksum does not match ends the
+restore.
+"""
+
+import datetime
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from kivy import Logger
+
+_MAGIC = b'SLJ1'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHHIIQI')
+_HEADER_SIZE = 64  # room for future fields
+_RECORD = struct.Struct('<QIdBBBBHB')
+_CRC_OFFSET = 8  # the crc field follows the sequence number
+
+
+class JournalRecord(object):
+    """A syslog message restored from the journal."""
+
+    __slots__ = ('received_at', 'priority', 'facility', 'host', 'program', 'message',
+                 'date_str')
+
+    def __init__(self, received_at, priority, facility, host, program, message, date_str):
+        self.received_at = received_at
+        self.priority = priority
+        self.facility = facility
+        self.host = host
+        self.program = program
+        self.message = message
+        self.date_str = date_str
+
+
+def _encode(text, limit):
+    """UTF-8 encode *text*, truncated to *limit* bytes."""
+    return _truncate(text.encode('utf-8'), limit)
+
+
+def _truncate(data, limit):
+    """Cut UTF-8 *data* to at most *limit* bytes without splitting a character."""
+    if len(data) <= limit:
+        return data
+    return data[:limit].decode('utf-8', errors='ignore').encode('utf-8')
+
+
+class SyslogJournal(object):
+    """Fixed-size, memory-mapped ring journal of syslog messages."""
+
+    SLOTS_DEFAULT = 1024
+    SLOT_SIZE_DEFAULT = 512
+    SYNC_INTERVAL = 1.0  # seconds
+
+    def __init__(self, path, n_slots=SLOTS_DEFAULT, slot_size=SLOT_SIZE_DEFAULT):
+        if slot_size < _RECORD.size + 16:
+            raise ValueError("Journal slot size too small: {}".format(slot_size))
+        if n_slots < 1:
+            raise ValueError("Journal needs at least one slot: {}".format(n_slots))
+
+        self._path = path
+        self._n_slots = int(n_slots)
+        self._slot_size = int(slot_size)
+        self._mm = None
+        self._next_seq = 0
+        # Written records not yet flushed, as (start, end) of the mapping
+        self._dirty = None
+        self._synced_seq = 0
+        self._lock = threading.Lock()
+        self._sync_wanted = threading.Event()
+        self._stopping = threading.Event()
+        self._worker = None
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def next_seq(self):
+        """Sequence number of the next record, i.e. the number of records written."""
+        return self._next_seq
+
+    def setup(self) -> None:
+        """Open or create the journal file and map it into memory.
+
+        A journal with a different layout or a damaged header is started anew.
+
+        :raises OSError: If the file cannot be created or mapped.
+        """
+        size = _HEADER_SIZE + self._n_slots * self._slot_size
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        if not self._read_header():
+            Logger.info("SyslogJournal: Starting new journal %s", self._path)
+            self._next_seq = 0
+            self._write_header(0)
+        self._synced_seq = self._next_seq
+
+    def teardown(self) -> None:
+        """Write the pending records to disk and unmap the journal."""
+        if self._worker is not None:
+            self._stopping.set()
+            self._sync_wanted.set()
+            self._worker.join()
+            self._worker = None
+            self._stopping.clear()
+        if self._mm is not None:
+            self.sync()
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+
+    def _read_header(self) -> bool:
+        fields = _HEADER.unpack_from(self._mm, 0)
+        magic, version, _, slot_size, n_slots, next_seq, crc = fields
+        if magic != _MAGIC or version != _VERSION:
+            return False
+        if crc != zlib.crc32(self._mm[:_HEADER.size - 4]):
+            Logger.warning("SyslogJournal: Damaged header in %s", self._path)
+            return False
+        if slot_size != self._slot_size or n_slots != self._n_slots:
+            Logger.info("SyslogJournal: Layout of %s changed", self._path)
+            return False
+        self._next_seq = next_seq
+        return True
+
+    def _write_header(self, next_seq):
+        header = _HEADER.pack(_MAGIC, _VERSION, 0, self._slot_size, self._n_slots,
+                              next_seq, 0)
+        crc = zlib.crc32(header[:-4])
+        self._mm[:_HEADER.size] = header[:-4] + struct.pack('<I', crc)
+
+    def _slot_offset(self, seq):
+        return _HEADER_SIZE + (seq % self._n_slots) * self._slot_size
+
+    def _write_record(self, seq, msg):
+        """Write *msg* as record *seq* into its slot; returns the slot offset."""
+        fields = {
+            'priority': _encode(msg.priority, 255),
+            'facility': _encode(msg.facility, 255),
+            'host': _encode(msg.host, 255),
+            'program': _encode(msg.program, 255),
+            'message': _encode(msg.message, 0xffff),
+            'date_str': _encode(msg.date_str, 255),
+        }
+        # Shorten the fields until the record fits its slot, the message first
+        excess = _RECORD.size + sum(len(v) for v in fields.values()) - self._slot_size
+        for name in ('message', 'program', 'host', 'date_str', 'facility', 'priority'):
+            if excess <= 0:
+                break
+            value = fields[name]
+            fields[name] = _truncate(value, max(0, len(value) - excess))
+            excess -= len(value) - len(fields[name])
+        priority, facility, host, program, message, date_str = fields.values()
+
+        record = bytearray(_RECORD.pack(
+            seq, 0, msg.received_at.timestamp(),
+            len(priority), len(facility), len(host), len(program), len(message), len(date_str)))
+        record += priority + facility + host + program + message + date_str
+        crc = zlib.crc32(record[:_CRC_OFFSET] + record[_CRC_OFFSET + 4:])
+        struct.pack_into('<I', record, _CRC_OFFSET, crc)
+
+        offset = self._slot_offset(seq)
+        self._mm[offset:offset + len(record)] = record
+        return offset
+
+    def append_many(self, msgs) -> None:
+        """Append messages, oldest first.
+
+        *msgs* need the attributes of :class:`syslog_messages.SyslogMessage`.
+        The records are only copied into the mapping here; the worker thread
+        flushes them to disk before the header announces them.
+        """
+        if self._mm is None or not msgs:
+            return
+
+        # Only the newest n_slots records would survive anyway
+        msgs = msgs[-self._n_slots:]
+        seq = self._next_seq
+        lo = hi = None
+        for msg in msgs:
+            offset = self._write_record(seq, msg)
+            lo = offset if lo is None else min(lo, offset)
+            hi = offset + self._slot_size if hi is None else max(hi, offset + self._slot_size)
+            seq += 1
+
+        with self._lock:
+            if self._dirty is not None:
+                lo, hi = min(lo, self._dirty[0]), max(hi, self._dirty[1])
+            self._dirty = (lo, hi)
+            self._next_seq = seq
+        self._sync_wanted.set()
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="SyslogJournal", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._sync_wanted.wait()
+            self._sync_wanted.clear()
+            try:
+                self.sync()
+            except (OSError, ValueError) as e:
+                Logger.error("SyslogJournal: Cannot write %s: %s", self._path, str(e))
+            # Appends in the meantime are synced together
+            self._stopping.wait(self.SYNC_INTERVAL)
+
+    def sync(self) -> None:
+        """Flush the appended records to disk and advance the header over them."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, None
+            next_seq = self._next_seq
+        if dirty is not None:
+            lo, hi = dirty
+            # flush() needs a page aligned offset
+            start = lo - lo % mmap.ALLOCATIONGRANULARITY
+            self._mm.flush(start, hi - start)
+        if next_seq != self._synced_seq:
+            self._write_header(next_seq)
+            self._synced_seq = next_seq
+
+    def read_last(self, count):
+        """Return up to *count* of the newest records, oldest first.
+
+        :return: List of :class:`JournalRecord`.
+        """
+        if self._mm is None:
+            return []
+
+        records = []
+        first = max(0, self._next_seq - min(count, self._n_slots))
+        for seq in range(self._next_seq - 1, first - 1, -1):
+            record = self._read_record(seq)
+            if record is None:
+                Logger.warning("SyslogJournal: Record %d in %s is damaged, restore stops there",
+                               seq, self._path)
+                break
+            records.append(record)
+        records.reverse()
+        return records
+
+    def _read_record(self, seq):
+        offset = self._slot_offset(seq)
+        fields = _RECORD.unpack_from(self._mm, offset)
+        rec_seq, crc, received_at, *lengths = fields
+        end = offset + _RECORD.size + sum(lengths)
+        if rec_seq != seq or end > offset + self._slot_size:
+            return None
+        if crc != zlib.crc32(self._mm[offset:offset + _CRC_OFFSET]
+                             + self._mm[offset + _CRC_OFFSET + 4:end]):
+            return None
+
+        texts = []
+        pos = offset + _RECORD.size
+        for length in lengths:
+            texts.append(self._mm[pos:pos + length].decode('utf-8', errors='ignore'))
+            pos += length
+        priority, facility, host, program, message, date_str = texts
+        return JournalRecord(datetime.datetime.fromtimestamp(received_at),
+                             priority, facility, host, program, message, date_str)
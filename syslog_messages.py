@@ -1,16 +1,24 @@
 """ Module for syslog message display """
 
+import bisect
 import datetime
 import functools
+import heapq
+import time
+from collections import deque
 from typing import Optional
 
 from kivy import Logger
 from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
 from kivy.lang import Builder
-from kivy.properties import StringProperty, ListProperty, ColorProperty, NumericProperty, ObjectProperty
+from kivy.properties import StringProperty, ColorProperty, NumericProperty, ObjectProperty
 from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 
 from scrollable_list import ScrollableList  # noqa: F401 - ScrollableList used in KV
+from syslog_journal import SyslogJournal
+from syslog_rates import SyslogRateStats
 
 
 class Colors:
@@ -53,24 +61,48 @@ _ENTRY_PADDING_V = 4      # total vertical padding per entry (top=0, bottom=4)
 _ENTRY_META_HEIGHT = 14   # height of the single metadata row
 _ENTRY_SPACING = 2        # vertical spacing between metadata and message
 _ENTRY_LINE_HEIGHT = 16   # height per wrapped message line (12 pt font)
-_ENTRY_CHARS_PER_LINE = 50  # rough estimate for word-wrap at ~50 % panel width
+_ENTRY_TEXT_FONT_SIZE = 12
+_ENTRY_PADDING_H = 16     # total horizontal padding per entry (left=8, right=8)
+_ENTRY_CHARS_PER_LINE = 50  # rough estimate for word-wrap while the width is unknown
+_ENTRY_LAYOUT_CACHE_SIZE = 1024  # measured messages kept by _measured_lines
 
 # Minimum (1-line message) entry height — used as default in KV
 _ENTRY_MIN_HEIGHT = (_ENTRY_PADDING_V + _ENTRY_META_HEIGHT
                      + _ENTRY_SPACING + _ENTRY_LINE_HEIGHT)
 
 
-def _msg_lines(text):
-    """Estimate wrapped line count for a message."""
+@functools.lru_cache(maxsize=_ENTRY_LAYOUT_CACHE_SIZE)
+def _measured_lines(text, width, font_size):
+    """Wrapped line count of *text* at *width* pixels, from the font metrics.
+
+    The text is laid out without rendering a texture; the laid out height is
+    a multiple of the line height of the font.  Results are cached, so each
+    unique message is measured once per width.
+    """
+    label = CoreLabel(text=text, font_size=font_size, text_size=(width, None))
+    _, height = label.render(real=False)
+    line_height = label.get_extents(' ')[1]
+    if not height or not line_height:
+        return 1
+    return max(1, round(height / line_height))
+
+
+def _msg_lines(text, width=None):
+    """Wrapped line count for a message.
+
+    Measured at the text *width* in pixels if known; estimated otherwise.
+    """
     if not text:
         return 1
+    if width:
+        return _measured_lines(text, int(width), _ENTRY_TEXT_FONT_SIZE)
     return max(1, -(-len(text) // _ENTRY_CHARS_PER_LINE))
 
 
-def _entry_height(text):
-    """Total pixel height for an entry given its message text."""
+def _entry_height(text, width=None):
+    """Total pixel height for an entry given its message text and text width."""
     return (_ENTRY_PADDING_V + _ENTRY_META_HEIGHT
-            + _ENTRY_SPACING + _msg_lines(text) * _ENTRY_LINE_HEIGHT)
+            + _ENTRY_SPACING + _msg_lines(text, width) * _ENTRY_LINE_HEIGHT)
 
 
 class SyslogMessage(object):
@@ -82,8 +114,17 @@ class SyslogMessage(object):
     Relevant headers (from syslog-ng):
         DATE, FACILITY, HOST, HOST_FROM, MESSAGE, PID, PRIORITY, PROGRAM,
         SOURCE, SOURCEIP, TAGS, TRANSPORT
+
+    A message from AMQP keeps a reference to the headers and converts only
+    the priority right away; the other fields and the receive time as
+    ``datetime`` are converted on first access.  Messages discarded by the
+    priority filter are thus never converted completely.
     """
 
+    __slots__ = ('_priority', '_facility', '_host', '_program', '_message', '_date_str',
+                 '_headers', '_routing_key', '_received_ts', '_received_at',
+                 '_acknowledged', '_seq', '_repeat_count', '_last_seen')
+
     @staticmethod
     def from_amqp(method, properties) -> Optional['SyslogMessage']:
         """Create a SyslogMessage from pika AMQP method and properties.
@@ -96,37 +137,33 @@ class SyslogMessage(object):
             return None
 
         headers = getattr(properties, 'headers', None) or {}
-
-        priority = str(headers.get('PRIORITY', '')).lower()
-        facility = str(headers.get('FACILITY', ''))
-        host = str(headers.get('HOST', headers.get('HOST_FROM', '')))
-        program = str(headers.get('PROGRAM', ''))
-        message = str(headers.get('MESSAGE', ''))
-        date_str = str(headers.get('DATE', ''))
-
-        # Fall back to routing key for host if not present in headers
-        if not host and method:
-            routing_key = getattr(method, 'routing_key', '') or ''
-            host = routing_key.split('.')[-1] if routing_key else ''
-
-        return SyslogMessage(
-            priority=priority,
-            facility=facility,
-            host=host,
-            program=program,
-            message=message,
-            date_str=date_str,
-        )
-
-    def __init__(self, priority, facility, host, program, message, date_str):
+        msg = SyslogMessage(str(headers.get('PRIORITY', '')).lower(),
+                            None, None, None, None, None)
+        msg._headers = headers
+        if method:
+            msg._routing_key = getattr(method, 'routing_key', '') or ''
+        return msg
+
+    def __init__(self, priority, facility, host, program, message, date_str, received_at=None):
         self._priority = priority
+        # None for fields still to be read from _headers
         self._facility = facility
         self._host = host
         self._program = program
         self._message = message
         self._date_str = date_str
-        self._received_at = datetime.datetime.now()
+        self._headers = None
+        self._routing_key = ''
+        self._received_ts = time.time() if received_at is None else received_at.timestamp()
+        self._received_at = received_at
         self._acknowledged = False
+        # Sequence number assigned by the SyslogEntryModel that stores the message
+        self._seq = None
+        self._repeat_count = 1
+        self._last_seen = None  # None while no repeat has been folded in
+
+    def _header(self, name):
+        return str(self._headers.get(name, '')) if self._headers else ''
 
     @property
     def priority(self):
@@ -134,34 +171,69 @@ class SyslogMessage(object):
 
     @property
     def facility(self):
+        if self._facility is None:
+            self._facility = self._header('FACILITY')
         return self._facility
 
     @property
     def host(self):
+        if self._host is None:
+            host = self._header('HOST') or self._header('HOST_FROM')
+            # Fall back to routing key for host if not present in headers
+            if not host and self._routing_key:
+                host = self._routing_key.split('.')[-1]
+            self._host = host
         return self._host
 
     @property
     def program(self):
+        if self._program is None:
+            self._program = self._header('PROGRAM')
         return self._program
 
     @property
     def message(self):
+        if self._message is None:
+            self._message = self._header('MESSAGE')
         return self._message
 
     @property
     def date_str(self):
         """The DATE string as reported by syslog-ng (e.g. 'Apr 30 19:37:03')"""
+        if self._date_str is None:
+            self._date_str = self._header('DATE')
         return self._date_str
 
     @property
     def received_at(self):
         """datetime when this message was received by DesktopPanel"""
+        if self._received_at is None:
+            self._received_at = datetime.datetime.fromtimestamp(self._received_ts)
         return self._received_at
 
     def is_critical(self):
         """True if the syslog priority is critical severity or higher."""
         return self._priority in _SEVERITY_CRITICAL
 
+    @property
+    def repeat_count(self):
+        """Number of identical messages folded into this one (1 if none)."""
+        return self._repeat_count
+
+    @property
+    def last_seen(self):
+        """datetime when the last identical message was received"""
+        return self._last_seen or self.received_at
+
+    def fold_key(self):
+        """Key identifying repeats: host, program and whitespace-normalized text."""
+        return self.host, self.program, ' '.join(self.message.split())
+
+    def fold(self, other: 'SyslogMessage'):
+        """Count *other* as a repeat of this message."""
+        self._repeat_count += other._repeat_count
+        self._last_seen = max(self.last_seen, other.last_seen)
+
     def acknowledge(self):
         """Mark the message as acknowledged; it will be displayed in grey."""
         self._acknowledged = True
@@ -199,14 +271,353 @@ class SyslogMessage(object):
         Returns HH:MM for messages received today, or DD.MM HH:MM for older ones.
         """
         now = datetime.datetime.now()
-        if self._received_at.date() == now.date():
-            return self._received_at.strftime("%H:%M")
-        return self._received_at.strftime("%d.%m %H:%M")
+        received_at = self.received_at
+        if received_at.date() == now.date():
+            return received_at.strftime("%H:%M")
+        return received_at.strftime("%d.%m %H:%M")
+
+    def formatted_repeats(self):
+        """Return the repeat count and last-seen time for display, or '' if not repeated."""
+        if self._repeat_count <= 1:
+            return ''
+        return "%d\u00d7 %s" % (self._repeat_count, self.last_seen.strftime("%H:%M"))
+
+
+def _replace_rows(data, rows):
+    """Replace the contents of the RecycleView *data* with *rows*."""
+    # The RecycleView cannot compute the change of a [:] slice assignment
+    del data[0:len(data)]
+    data.extend(rows)
+
+
+def _message_seq(msg):
+    return msg._seq
+
+
+def _severity(priority):
+    return _SEVERITY_ORDER.get(priority, _SEVERITY_UNKNOWN)
+
+
+class SyslogFilter(object):
+    """Display filter on the stored syslog messages.
+
+    Criteria left at ``None`` match everything.  *priority* matches messages
+    at or above that level, like :attr:`SyslogMessagePanel.min_priority`;
+    *text* is a case-insensitive substring of the message text.
+    """
+
+    def __init__(self, host=None, program=None, priority=None, text=None):
+        self.host = host
+        self.program = program
+        self.priority = priority.lower() if priority else None
+        self.text = text.casefold() if text else None
+
+    def is_empty(self) -> bool:
+        return self.host is None and self.program is None \
+            and self.priority is None and self.text is None
+
+    def matches(self, msg: SyslogMessage) -> bool:
+        if self.host is not None and msg.host != self.host:
+            return False
+        if self.program is not None and msg.program != self.program:
+            return False
+        if self.priority is not None and not _passes_filter(msg.priority, self.priority):
+            return False
+        if self.text is not None and self.text not in msg.message.casefold():
+            return False
+        return True
+
+
+class SyslogEntryModel(object):
+    """Keep the stored messages and the RecycleView rows in step.
+
+    The row dicts are built once per message and edited in place in *data*
+    (the ``data`` list of the RecycleView), so that the view only has to
+    lay out the inserted, removed or modified rows.  Messages and rows are
+    stored newest first; the messages in a deque, so that inserting and
+    evicting do not copy the store.  Each message gets a sequence number,
+    from which its row index is computed.
+
+    A new message that repeats a stored, unacknowledged message (see
+    :meth:`SyslogMessage.fold_key`) is folded into it instead of adding a
+    row; the stored row keeps its place and shows the repeat count.  A hash
+    index on the fold key keeps the lookup O(1).
+
+    With a :class:`SyslogFilter` set, only the matching messages have rows.
+    Per host, per program and per severity, the stored messages are indexed
+    in arrival order, so that a new filter only looks at the messages of the
+    smallest matching index.  The shown messages are kept in a list ordered
+    by sequence number, in which the row of a message is found by bisection.
+    """
+
+    def __init__(self, data, tap_callback):
+        """
+        :param data: List to keep the row dicts in, e.g. ``RecycleView.data``.
+        :param tap_callback: Callable ``(SyslogMessage) -> None`` for taps on a row.
+        """
+        self._data = data
+        self._tap_callback = tap_callback
+        self._messages = deque()
+        self._next_seq = 0
+        self._fold_index = dict()  # fold key -> stored message
+        self._unacknowledged = deque()  # in arrival order, may hold outdated entries
+        # Stored messages by host, program and severity level, oldest first
+        self._by_host = dict()
+        self._by_program = dict()
+        self._by_severity = dict()
+        self._filter = SyslogFilter()
+        self._visible = None  # shown messages, oldest first; None if not filtered
+        self._visible_seqs = None  # their sequence numbers, for bisection
+        self._text_width = None
+        self._rows_date = datetime.date.today()
+
+    @property
+    def messages(self):
+        """The stored messages, newest first."""
+        return self._messages
+
+    @property
+    def rows(self):
+        """The row dicts, newest first."""
+        return self._data
+
+    def attach(self, data) -> None:
+        """Keep the rows in *data* from now on, e.g. once the RecycleView exists."""
+        _replace_rows(data, self._data)
+        self._data = data
+
+    def __len__(self):
+        return len(self._messages)
+
+    @property
+    def display_filter(self) -> SyslogFilter:
+        return self._filter
+
+    def hosts(self):
+        """The hosts of the stored messages, sorted."""
+        return sorted(self._by_host)
+
+    def programs(self):
+        """The programs of the stored messages, sorted."""
+        return sorted(self._by_program)
+
+    def set_filter(self, msg_filter: SyslogFilter) -> None:
+        """Show only the stored messages matching *msg_filter*."""
+        self._filter = msg_filter
+        if msg_filter.is_empty():
+            self._visible = self._visible_seqs = None
+            shown = self._messages
+        else:
+            self._visible = [msg for msg in self._candidates() if msg_filter.matches(msg)]
+            self._visible_seqs = [msg._seq for msg in self._visible]
+            shown = reversed(self._visible)
+        _replace_rows(self._data, [self._row(msg) for msg in shown])
+
+    def _candidates(self):
+        """The stored messages of the smallest index the filter selects, oldest first."""
+        f = self._filter
+        best, best_size = None, len(self._messages)
+        for index, key in ((self._by_host, f.host), (self._by_program, f.program)):
+            if key is not None:
+                queue = index.get(key, ())
+                if len(queue) < best_size:
+                    best, best_size = queue, len(queue)
+        if f.priority is not None:
+            threshold = _severity(f.priority)
+            queues = [q for level, q in self._by_severity.items() if level <= threshold]
+            if sum(len(q) for q in queues) < best_size:
+                return heapq.merge(*queues, key=_message_seq)
+        return reversed(self._messages) if best is None else best
+
+    def _shown(self):
+        """The messages that have rows, newest first."""
+        return self._messages if self._visible is None else reversed(self._visible)
+
+    def _index_add(self, msg: SyslogMessage) -> None:
+        for index, key in ((self._by_host, msg.host), (self._by_program, msg.program),
+                           (self._by_severity, _severity(msg.priority))):
+            queue = index.get(key, None)
+            if queue is None:
+                queue = index[key] = deque()
+            queue.append(msg)
+
+    def _index_remove(self, msg: SyslogMessage) -> None:
+        # Evicted messages are always the oldest of their index entries
+        for index, key in ((self._by_host, msg.host), (self._by_program, msg.program),
+                           (self._by_severity, _severity(msg.priority))):
+            queue = index[key]
+            queue.popleft()
+            if not queue:
+                del index[key]
+
+    def add(self, msg: SyslogMessage, limit: int) -> None:
+        """Insert *msg* as the newest row and drop the oldest beyond *limit*."""
+        self.add_many([msg], limit)
+
+    def add_many(self, msgs, limit: int):
+        """Insert *msgs* (oldest first) and drop the oldest beyond *limit*.
+
+        Repeats are folded into stored messages or into their first occurrence
+        within *msgs*.  Messages that would be evicted right away are not
+        inserted at all.
+
+        :return: Tuple ``(folded, skipped)`` with the number of messages that
+            were folded and that were skipped this way.
+        """
+        folded = 0
+        touched = dict()  # stored messages that got repeats, by identity
+        new = dict()  # fold key -> first new message, in order of arrival
+        for msg in msgs:
+            key = msg.fold_key()
+            target = self._fold_index.get(key, None)
+            if target is not None and self._is_foldable(target):
+                target.fold(msg)
+                touched[id(target)] = target
+            elif key in new:
+                new[key].fold(msg)
+            else:
+                new[key] = msg
+                continue
+            folded += 1
+
+        new = list(new.values())
+        skipped = max(0, len(new) - limit)
+        for msg in new[skipped:]:
+            msg._seq = self._next_seq
+            self._next_seq += 1
+            self._messages.appendleft(msg)
+            self._index_add(msg)
+            if self._visible is None:
+                self._data.insert(0, self._row(msg))
+            elif self._filter.matches(msg):
+                self._visible.append(msg)
+                self._visible_seqs.append(msg._seq)
+                self._data.insert(0, self._row(msg))
+            self._fold_index[msg.fold_key()] = msg
+            self._unacknowledged.append(msg)
+        self.trim(limit)
+
+        for msg in touched.values():
+            self.update(msg)
+        return folded, skipped
+
+    def _is_foldable(self, msg: SyslogMessage) -> bool:
+        return msg._seq is not None and not msg.is_acknowledged
+
+    def trim(self, limit: int) -> None:
+        """Drop the oldest messages beyond *limit*."""
+        if len(self._messages) > limit:
+            if self._visible is not None:
+                # The evicted messages are the oldest, i.e. the head of the shown list
+                kept = bisect.bisect_left(self._visible_seqs, self._next_seq - limit)
+                del self._visible[:kept]
+                del self._visible_seqs[:kept]
+            for _ in range(len(self._messages) - limit):
+                msg = self._messages.pop()
+                msg._seq = None
+                self._index_remove(msg)
+                key = msg.fold_key()
+                if self._fold_index.get(key, None) is msg:
+                    del self._fold_index[key]
+            shown = limit if self._visible is None else len(self._visible)
+            # The RecycleView needs slices with explicit bounds
+            del self._data[shown:len(self._data)]
+
+    def index(self, msg: SyslogMessage) -> Optional[int]:
+        """Return the row index of *msg*, or ``None`` if it is not stored."""
+        if msg._seq is None:
+            return None
+        if self._visible is None:
+            i = self._next_seq - 1 - msg._seq
+            return i if i < len(self._messages) else None
+        j = bisect.bisect_left(self._visible_seqs, msg._seq)
+        if j < len(self._visible) and self._visible[j] is msg:
+            return len(self._visible) - 1 - j
+        return None
+
+    def update(self, msg: SyslogMessage) -> None:
+        """Rebuild the row of *msg*, e.g. after it has been acknowledged."""
+        i = self.index(msg)
+        if i is not None:
+            self._data[i] = self._row(msg)
+
+    def oldest_unacknowledged(self) -> Optional[SyslogMessage]:
+        """Return the oldest stored message that is not acknowledged yet."""
+        queue = self._unacknowledged
+        # Messages acknowledged by tap or evicted are skipped here
+        while queue and not self._is_foldable(queue[0]):
+            queue.popleft()
+        return queue[0] if queue else None
+
+    def acknowledge_before(self, cutoff: datetime.datetime) -> int:
+        """Acknowledge all messages received before *cutoff*.
+
+        Only the rows of the newly acknowledged messages are updated.
+
+        :return: Number of newly acknowledged messages.
+        """
+        count = 0
+        while True:
+            msg = self.oldest_unacknowledged()
+            if msg is None or msg.received_at >= cutoff:
+                break
+            self._unacknowledged.popleft()
+            msg.acknowledge()
+            self.update(msg)
+            count += 1
+        return count
+
+    def refresh_times(self) -> None:
+        """Update the time column after midnight, when the date has to be shown."""
+        today = datetime.date.today()
+        if today == self._rows_date:
+            return
+        previous, self._rows_date = self._rows_date, today
+        for i, msg in enumerate(self._shown()):
+            if msg.received_at.date() == previous:
+                self._data[i] = self._row(msg)
+
+    def set_text_width(self, width) -> None:
+        """Set the width available for the message text and update the row heights."""
+        width = int(width) if width and width > 0 else None
+        if width == self._text_width:
+            return
+        self._text_width = width
+        for i, msg in enumerate(self._shown()):
+            if self._data[i]['height'] != _entry_height(msg.message, width):
+                self._data[i] = self._row(msg)
+
+    def _row(self, msg: SyslogMessage) -> dict:
+        lines = _msg_lines(msg.message, self._text_width)
+        # Only what the layout needs; the texts are formatted by SyslogEntry
+        # when the row is displayed
+        return {
+            'size_hint': [1, None],
+            'height': (_ENTRY_PADDING_V + _ENTRY_META_HEIGHT
+                       + _ENTRY_SPACING + lines * _ENTRY_LINE_HEIGHT),
+            'msg_text_height': lines * _ENTRY_LINE_HEIGHT,
+            'msg': msg,
+            'tap_callback': functools.partial(self._tap_callback, msg),
+        }
+
+
+def _entry_attrs(msg: SyslogMessage) -> dict:
+    """Return the display attributes of :class:`SyslogEntry` for *msg*."""
+    return {
+        'msg_time': msg.formatted_time(),
+        'msg_host': msg.host,
+        'msg_facility': msg.facility,
+        'msg_program': msg.program,
+        'msg_text': msg.message,
+        'msg_repeat': msg.formatted_repeats(),
+        'entry_color': msg.display_color(),
+    }
 
 
 Builder.load_string("""
 #:import _ENTRY_MIN_HEIGHT syslog_messages._ENTRY_MIN_HEIGHT
 #:import _ENTRY_LINE_HEIGHT syslog_messages._ENTRY_LINE_HEIGHT
+#:import _ENTRY_TEXT_FONT_SIZE syslog_messages._ENTRY_TEXT_FONT_SIZE
 #:import ScrollableList scrollable_list.ScrollableList
 <SyslogEntry>:
     orientation: 'vertical'
@@ -238,6 +649,16 @@ Builder.load_string("""
             size_hint_x: None
             width: 82
 
+        Label:
+            text: root.msg_repeat
+            font_size: 10
+            font_name: 'assets/FiraMono-Regular.ttf'
+            color: root.entry_color
+            halign: 'left'
+            valign: 'center'
+            size_hint_x: None
+            width: self.texture_size[0] if root.msg_repeat else 0
+
         Label:
             text: root.msg_host
             font_size: 10
@@ -265,7 +686,7 @@ Builder.load_string("""
 
     Label:
         text: root.msg_text
-        font_size: 12
+        font_size: _ENTRY_TEXT_FONT_SIZE
         color: root.entry_color
         halign: 'left'
         valign: 'top'
@@ -294,7 +715,6 @@ Builder.load_string("""
 
         RecycleView:
             id: rv
-            data: root.entries
             viewclass: 'SyslogEntry'
             size_hint: 1, 1
             bar_width: 0
@@ -308,16 +728,25 @@ Builder.load_string("""
 """)
 
 
-class SyslogEntry(BoxLayout):
+class SyslogEntry(RecycleDataViewBehavior, BoxLayout):
+    """Row of the syslog list, formatted from its message when displayed."""
+
+    msg = ObjectProperty(None, allownone=True)
     msg_time = StringProperty('')
     msg_host = StringProperty('')
     msg_facility = StringProperty('')
     msg_program = StringProperty('')
     msg_text = StringProperty('')
+    msg_repeat = StringProperty('')
     msg_text_height = NumericProperty(_ENTRY_LINE_HEIGHT)
     entry_color = ColorProperty(Colors.COLOR_WHITE)
     tap_callback = ObjectProperty(None, allownone=True)
 
+    def refresh_view_attrs(self, rv, index, data):
+        super().refresh_view_attrs(rv, index, data)
+        for name, value in _entry_attrs(data['msg']).items():
+            setattr(self, name, value)
+
     def on_touch_down(self, touch):
         if self.collide_point(*touch.pos) and self.tap_callback:
             self.tap_callback()
@@ -350,9 +779,24 @@ class SyslogMessagePanel(BoxLayout):
     Set :attr:`message_callback` to a callable ``(SyslogMessage) -> None`` to
     be notified of each newly received message (e.g. to update tab notifications
     in the host page).
+
+    Messages received from AMQP are buffered and added once per frame, so that
+    a message storm causes one update of the list per frame instead of one per
+    message.  :attr:`ingest_stats` counts what happened to them.
+
+    Set :attr:`journal_file` to keep the displayed messages in a
+    :class:`syslog_journal.SyslogJournal` with :attr:`journal_slots` records;
+    the newest :attr:`max_entries` messages are restored from it at startup.
+
+    All received messages, including those below :attr:`min_priority`, are
+    counted per host and priority in :attr:`rate_stats`.  When a host sends
+    at least :attr:`storm_min_rate` messages per minute and :attr:`storm_factor`
+    times its usual rate, :attr:`storm_callback` is called with the host.
+
+    :meth:`set_filter` narrows the list to one host or program, a priority or
+    a search text without discarding the other messages.
     """
 
-    entries = ListProperty()
     border_color = ColorProperty(Colors.COLOR_GREY)
     min_priority = StringProperty('error')
     acknowledge_after = NumericProperty(3600)  # seconds; 0 = never auto-acknowledge
@@ -362,21 +806,94 @@ class SyslogMessagePanel(BoxLayout):
     amqp_queue = StringProperty('')
     message_callback = ObjectProperty(None, allownone=True)
 
+    storm_callback = ObjectProperty(None, allownone=True)
+    storm_factor = NumericProperty(SyslogRateStats.FACTOR_DEFAULT)
+    storm_min_rate = NumericProperty(SyslogRateStats.MIN_RATE_DEFAULT)  # messages per minute
+
+    journal_file = StringProperty('')
+    journal_slots = NumericProperty(SyslogJournal.SLOTS_DEFAULT)
+
     def __init__(self, **kwargs):
+        # Set up before the KV rules are applied, as they already set the
+        # properties.  The rows move into the RecycleView data in on_kv_post.
+        self._model = SyslogEntryModel([], self._acknowledge_message)
+        self._indicator_trigger = Clock.create_trigger(self._update_indicators)
+        # Messages from the AMQP thread, added to the list once per frame
+        self._ingest = deque()
+        self._ingest_trigger = Clock.create_trigger(self._flush_ingest)
+        self._ingest_stats = SyslogMessagePanel._empty_ingest_stats()
+        self._rate_stats = SyslogRateStats(self.storm_factor, self.storm_min_rate)
+        self._journal = None
+        self._journal_trigger = Clock.create_trigger(self._open_journal)
+        # Single pending deadline for the oldest unacknowledged message
+        self._acknowledge_event = None
+        # The time column shows the date for messages received before midnight
+        self._midnight_event = None
+        self._schedule_midnight()
+
         super().__init__(**kwargs)
 
-        self._messages = []
-        self._refresh_clock = Clock.schedule_interval(
-            lambda dt: self._refresh_entries(), 30
-        )
+    @staticmethod
+    def _empty_ingest_stats():
+        return {
+            'received': 0,   # messages passed to add_message(s)
+            'filtered': 0,   # discarded by min_priority
+            'folded': 0,     # counted as repeat of another message
+            'coalesced': 0,  # passed the filter, but evicted within their batch
+            'batches': 0,
+            'largest_batch': 0,
+        }
+
+    @property
+    def ingest_stats(self):
+        """Counters of the received messages and batches, as a dict."""
+        return dict(self._ingest_stats)
+
+    @property
+    def rate_stats(self) -> SyslogRateStats:
+        """Message rates per host and priority, see :class:`syslog_rates.SyslogRateStats`.
+
+        The rates are kept on the :func:`time.monotonic` clock.
+        """
+        return self._rate_stats
+
+    def on_storm_factor(self, _instance, value):
+        self._rate_stats.factor = value
+
+    def on_storm_min_rate(self, _instance, value):
+        self._rate_stats.min_rate = value
+
+    @property
+    def entries(self):
+        """The RecycleView row dicts, newest first."""
+        return self._model.rows
+
+    def teardown(self):
+        """Close the journal and cancel the scheduled Clock events"""
+        self._journal_trigger.cancel()
+        for event in (self._acknowledge_event, self._midnight_event):
+            if event:
+                event.cancel()
+        self._acknowledge_event = None
+        self._midnight_event = None
+        if self._journal is not None:
+            self._journal.teardown()
+            self._journal = None
 
     def __del__(self):
-        if self._refresh_clock:
-            self._refresh_clock.cancel()
+        self.teardown()
 
     def on_kv_post(self, base_widget):
         """Bind scroll-position tracking after KV rules are applied."""
+        # Rows are edited in place in the RecycleView data from now on
+        self._model.attach(self.ids.rv.data)
         self.ids.scroll_list.bind_scroll_view(self.ids.rv)
+        self.ids.rv.bind(width=self._on_rv_width)
+
+    def _on_rv_width(self, _instance, width):
+        """Lay out the message texts for the actual entry width."""
+        self._model.set_text_width(width - _ENTRY_PADDING_H)
+        self._indicator_trigger()
 
     def on_amqp_widget(self, _instance, _value):
         """Subscribe to the AMQP queue when the widget becomes available."""
@@ -404,26 +921,84 @@ class SyslogMessagePanel(BoxLayout):
         try:
             msg = SyslogMessage.from_amqp(method, properties)
             if msg:
-                Clock.schedule_once(lambda dt: self.add_message(msg))
+                self._ingest.append(msg)
+                self._ingest_trigger()
             channel.basic_ack(delivery_tag=method.delivery_tag)
         except Exception as e:
             Logger.error("Syslog: Error processing AMQP message: %s", str(e))
             channel.basic_ack(delivery_tag=method.delivery_tag)
 
-    def on_min_priority(self, _instance, _value):
-        """Re-render when the severity filter changes."""
-        self._refresh_entries()
-
     def on_acknowledge_after(self, _instance, _value):
-        """Re-render when the auto-acknowledge timeout changes."""
-        self._refresh_entries()
+        """Apply a changed auto-acknowledge timeout to the stored messages."""
+        self._acknowledge_expired()
+
+    def on_journal_file(self, _instance, _value):
+        """Open the journal and restore the messages kept in it."""
+        self._journal_trigger()
+
+    def on_journal_slots(self, _instance, _value):
+        """Reopen the journal with the new size; a resized journal starts empty."""
+        self._journal_trigger()
+
+    def _open_journal(self, *_args):
+        # Deferred by a frame, so that the filter and limits from KV are set
+        # before the restored messages pass them
+        if self._journal is not None:
+            self._journal.teardown()
+            self._journal = None
+        if not self.journal_file:
+            return
+
+        journal = SyslogJournal(self.journal_file, int(self.journal_slots))
+        try:
+            journal.setup()
+        except (OSError, ValueError) as e:
+            Logger.error("Syslog: Cannot open journal %s: %s", self.journal_file, str(e))
+            return
+        self._journal = journal
+
+        # Restore only into an empty list, so that nothing is shown twice
+        if len(self._model):
+            return
+        restored = [
+            SyslogMessage(priority=r.priority, facility=r.facility, host=r.host,
+                          program=r.program, message=r.message, date_str=r.date_str,
+                          received_at=r.received_at)
+            for r in journal.read_last(int(self.max_entries))
+        ]
+        restored = [msg for msg in restored if _passes_filter(msg.priority, self.min_priority)]
+        if restored:
+            Logger.info("Syslog: Restored %d messages from %s", len(restored), self.journal_file)
+            self._model.add_many(restored, int(self.max_entries))
+            self._indicator_trigger()
+            self._schedule_acknowledge()
+
+    @property
+    def display_filter(self) -> SyslogFilter:
+        """The filter set with :meth:`set_filter`."""
+        return self._model.display_filter
+
+    def set_filter(self, host=None, program=None, priority=None, text=None):
+        """Show only the messages of *host* and *program*, at or above *priority*
+        and containing *text*; call without arguments to show all messages.
+
+        Unlike :attr:`min_priority`, the filter only hides messages: they are
+        still stored and shown again when the filter is changed.
+        """
+        self._model.set_filter(SyslogFilter(host, program, priority, text))
+        self._indicator_trigger()
+
+    def filter_choices(self):
+        """Return the hosts and programs of the stored messages, e.g. for a picker.
+
+        :return: Tuple ``(hosts, programs)`` of sorted lists.
+        """
+        return self._model.hosts(), self._model.programs()
 
     def on_max_entries(self, _instance, value):
-        """Trim the message store and re-render when the limit is reduced."""
-        limit = int(value)
-        if len(self._messages) > limit:
-            self._messages = self._messages[:limit]
-        self._refresh_entries()
+        """Trim the message store when the limit is reduced."""
+        self._model.trim(int(value))
+        self._indicator_trigger()
 
     def add_message(self, msg: SyslogMessage):
         """Add a new syslog message to the internal buffer and update the display.
@@ -437,51 +1012,114 @@ class SyslogMessagePanel(BoxLayout):
 
         Must be called on the Kivy main thread.
         """
-        if not _passes_filter(msg.priority, self.min_priority):
+        self.add_messages([msg])
+
+    def add_messages(self, msgs):
+        """Add a batch of syslog messages, oldest first, in one pass.
+
+        Filtering and trimming work as in :meth:`add_message`.  Messages that
+        would be evicted within the batch are not shown at all, but still
+        passed to the :attr:`message_callback`.
+
+        Must be called on the Kivy main thread.
+        """
+        self._count_rates(msgs)
+        passed = [msg for msg in msgs if _passes_filter(msg.priority, self.min_priority)]
+
+        stats = self._ingest_stats
+        stats['received'] += len(msgs)
+        stats['filtered'] += len(msgs) - len(passed)
+        stats['batches'] += 1
+        stats['largest_batch'] = max(stats['largest_batch'], len(msgs))
+        if not passed:
             return
-        self._messages.insert(0, msg)
-        limit = int(self.max_entries)
-        if len(self._messages) > limit:
-            self._messages = self._messages[:limit]
-        self._refresh_entries()
+
+        folded, coalesced = self._model.add_many(passed, int(self.max_entries))
+        if self._journal is not None:
+            # Only messages that got a row, so that repeats cannot crowd the
+            # other messages out of the journal
+            self._journal.append_many([msg for msg in passed if msg._seq is not None])
+        stats['folded'] += folded
+        stats['coalesced'] += coalesced
+        if coalesced:
+            Logger.debug("Syslog: %d of %d messages not shown, list limit reached within a frame",
+                         coalesced, len(msgs))
+        self._indicator_trigger()
+        if self._acknowledge_event is None:
+            self._schedule_acknowledge()
 
         if self.message_callback:
-            self.message_callback(msg)
+            for msg in passed:
+                self.message_callback(msg)
+
+    def _count_rates(self, msgs):
+        """Count *msgs* in the rate statistics and report hosts that start storming."""
+        if not msgs:
+            return
+        now = time.monotonic()
+        rates = self._rate_stats
+        for msg in msgs:
+            rates.add(msg.host, msg.priority, now)
+        for host in rates.update_storms({msg.host for msg in msgs}, now):
+            Logger.warning("Syslog: Message storm from %s, %.0f messages per minute",
+                           host, rates.host_rates(now)[host][0])
+            if self.storm_callback:
+                self.storm_callback(host)
+
+    def _flush_ingest(self, *_args):
+        """Add the messages received from AMQP since the last frame."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._ingest.popleft())
+            except IndexError:
+                break
+        if batch:
+            self.add_messages(batch)
 
     def _acknowledge_message(self, msg: SyslogMessage):
-        """Acknowledge a message and refresh the display."""
+        """Acknowledge a message and update its row."""
+        if msg.is_acknowledged:
+            return
         msg.acknowledge()
-        self._refresh_entries()
+        self._model.update(msg)
 
-    def _refresh_entries(self):
-        """Rebuild the RecycleView data list from stored messages."""
+    def _acknowledge_expired(self, *_args):
+        """Acknowledge expired messages and wait for the next one to expire."""
+        self._acknowledge_event = None
         if self.acknowledge_after > 0:
             cutoff = datetime.datetime.now() - datetime.timedelta(
                 seconds=self.acknowledge_after
             )
-            for msg in self._messages:
-                if msg.received_at < cutoff:
-                    msg.acknowledge()
-
-        self.entries = [
-            {
-                'size_hint': [1, None],
-                'height': _entry_height(msg.message),
-                'msg_time': msg.formatted_time(),
-                'msg_host': msg.host,
-                'msg_facility': msg.facility,
-                'msg_program': msg.program,
-                'msg_text': msg.message,
-                'msg_text_height': _msg_lines(msg.message) * _ENTRY_LINE_HEIGHT,
-                'entry_color': msg.display_color(),
-                'tap_callback': functools.partial(self._acknowledge_message, msg),
-            }
-            for msg in self._messages
-        ]
-        Clock.schedule_once(lambda dt: self._do_post_refresh())
+            self._model.acknowledge_before(cutoff)
+        self._schedule_acknowledge()
+
+    def _schedule_acknowledge(self):
+        """Schedule the auto-acknowledge for the oldest unacknowledged message."""
+        if self._acknowledge_event is not None:
+            self._acknowledge_event.cancel()
+            self._acknowledge_event = None
+        if self.acknowledge_after <= 0:
+            return
+        msg = self._model.oldest_unacknowledged()
+        if msg is None:
+            return
+        due = msg.received_at + datetime.timedelta(seconds=self.acknowledge_after)
+        delay = (due - datetime.datetime.now()).total_seconds()
+        self._acknowledge_event = Clock.schedule_once(self._acknowledge_expired, max(0.0, delay))
 
-    def _do_post_refresh(self):
-        """Refresh the RecycleView data and update scroll indicators."""
-        rv = self.ids.rv
-        rv.refresh_from_data()
-        self.ids.scroll_list.update_indicators(rv)
+    def _schedule_midnight(self):
+        now = datetime.datetime.now()
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1),
+                                             datetime.time.min)
+        # A little later, so that the date has certainly changed
+        delay = (midnight - now).total_seconds() + 1
+        self._midnight_event = Clock.schedule_once(self._on_midnight, delay)
+
+    def _on_midnight(self, *_args):
+        self._model.refresh_times()
+        self._schedule_midnight()
+
+    def _update_indicators(self, *_args):
+        """Update the scroll indicators once the rows have been laid out."""
+        self.ids.scroll_list.update_indicators(self.ids.rv)
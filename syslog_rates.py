@@ -0,0 +1,175 @@
+""" Message rate statistics for syslog
+
+Messages are counted per host and per priority in two sliding windows, the
+last minute and the last 15 minutes.  A host is *storming* when its rate in
+the last minute exceeds its baseline, the rate in the whole minutes before.
+"""
+
+import math
+from array import array
+
+
+class RateCounter(object):
+    """Event count in a sliding time window of fixed-size buckets.
+
+    The *window* (seconds) is split into *n_buckets*; events are counted in
+    the bucket of their time, so the memory does not depend on the event
+    rate.  Each bucket remembers the absolute bucket number it holds, which
+    makes outdated buckets recognizable without clearing them.  The window
+    moves in steps of one bucket.
+    """
+
+    def __init__(self, window, n_buckets):
+        self.window = window
+        self.n_buckets = n_buckets
+        self.bucket_duration = window / n_buckets
+        self._bucket_ids = array('q', [-1] * n_buckets)
+        self._counts = array('I', [0] * n_buckets)
+
+    def add(self, t, count=1) -> None:
+        """Count *count* events at time *t* (seconds)."""
+        bucket = math.floor(t / self.bucket_duration)
+        pos = bucket % self.n_buckets
+        if self._bucket_ids[pos] != bucket:
+            if self._bucket_ids[pos] > bucket:
+                return  # Too old to be counted
+            self._bucket_ids[pos] = bucket
+            self._counts[pos] = 0
+        self._counts[pos] += count
+
+    def total(self, now) -> int:
+        """Return the number of events in the window ending at *now*."""
+        last = math.floor(now / self.bucket_duration)
+        first = last - self.n_buckets
+        return sum(count for bucket, count in zip(self._bucket_ids, self._counts)
+                   if first < bucket <= last)
+
+    def per_minute(self, now) -> float:
+        """Return the mean rate in the window ending at *now*, in events per minute."""
+        return self.total(now) * 60 / self.window
+
+    def start(self, now) -> float:
+        """Return the start time of the window ending at *now*."""
+        return (math.floor(now / self.bucket_duration) - self.n_buckets + 1) * self.bucket_duration
+
+    def total_before(self, t, now):
+        """Count the events in the window ending at *now*, in the buckets ending at or before *t*.
+
+        :return: Tuple of the event count and the time span of these buckets.
+        """
+        first = math.floor(now / self.bucket_duration) - self.n_buckets
+        last = min(first + self.n_buckets, math.floor(t / self.bucket_duration) - 1)
+        count = sum(count for bucket, count in zip(self._bucket_ids, self._counts)
+                    if first < bucket <= last)
+        return count, max(0, last - first) * self.bucket_duration
+
+
+class SyslogRateStats(object):
+    """Message rates per host and per priority over the last 1 and 15 minutes.
+
+    A host starts *storming* when its rate over the last minute reaches at
+    least *min_rate* messages per minute and *factor* times its baseline,
+    the mean rate over the whole minutes of the long window before the last
+    minute, i.e. 13 to 14 minutes.  It stops storming when the rate drops
+    below that again.
+    """
+
+    SHORT_WINDOW = 60
+    LONG_WINDOW = 15 * 60
+    FACTOR_DEFAULT = 5.0
+    MIN_RATE_DEFAULT = 30.0
+
+    def __init__(self, factor=FACTOR_DEFAULT, min_rate=MIN_RATE_DEFAULT):
+        self.factor = factor
+        self.min_rate = min_rate
+        self._hosts = dict()       # host -> (short, long) counters
+        self._priorities = dict()  # priority -> (short, long) counters
+        self._storming = set()
+        self._last_prune = None
+
+    @staticmethod
+    def _counters():
+        # 5 s buckets for the last minute, 1 min buckets for the last 15 minutes
+        return (RateCounter(SyslogRateStats.SHORT_WINDOW, 12),
+                RateCounter(SyslogRateStats.LONG_WINDOW, 15))
+
+    def add(self, host, priority, t) -> None:
+        """Count a message of *host* with *priority* received at time *t* (seconds)."""
+        for index, key in ((self._hosts, host), (self._priorities, priority)):
+            counters = index.get(key, None)
+            if counters is None:
+                counters = index[key] = SyslogRateStats._counters()
+            for counter in counters:
+                counter.add(t)
+
+        # Forget hosts and priorities without messages in the long window,
+        # end the storms of hosts that went quiet
+        minute = math.floor(t / 60)
+        if minute != self._last_prune:
+            self._last_prune = minute
+            self._prune(t)
+            self._end_storms(t)
+
+    def _prune(self, now):
+        for index in (self._hosts, self._priorities):
+            for key in [key for key, (_, long) in index.items() if not long.total(now)]:
+                del index[key]
+        self._storming &= set(self._hosts)
+
+    def _end_storms(self, now):
+        for host in [host for host in self._storming if not self.is_storming(host, now)]:
+            self._storming.discard(host)
+
+    @staticmethod
+    def _rates(index, now):
+        return {key: (short.per_minute(now), long.per_minute(now))
+                for key, (short, long) in index.items()}
+
+    def host_rates(self, now):
+        """Return the rates per host at *now*.
+
+        :return: Dict mapping host to ``(per_minute_1min, per_minute_15min)``.
+        """
+        return SyslogRateStats._rates(self._hosts, now)
+
+    def priority_rates(self, now):
+        """Return the rates per priority at *now*, like :meth:`host_rates`."""
+        return SyslogRateStats._rates(self._priorities, now)
+
+    def baseline(self, host, now) -> float:
+        """Return the mean rate of *host* in the whole minutes before the last, per minute."""
+        counters = self._hosts.get(host, None)
+        if counters is None:
+            return 0.0
+        short, long = counters
+        before, span = long.total_before(short.start(now), now)
+        return before * 60 / span if span else 0.0
+
+    def is_storming(self, host, now) -> bool:
+        """True if the rate of *host* in the last minute exceeds its baseline."""
+        counters = self._hosts.get(host, None)
+        if counters is None:
+            return False
+        rate = counters[0].per_minute(now)
+        return rate >= self.min_rate and rate >= self.factor * self.baseline(host, now)
+
+    def update_storms(self, hosts, now):
+        """Re-check *hosts* after new messages have been counted.
+
+        The hosts that are storming are re-checked as well, as their storm
+        ends when they stop sending.
+
+        :return: List of the hosts among *hosts* that started storming.
+        """
+        self._end_storms(now)
+        started = []
+        for host in hosts:
+            if host not in self._storming and self.is_storming(host, now):
+                self._storming.add(host)
+                started.append(host)
+        return started
+
+    @property
+    def storming(self):
+        """The hosts that are storming since the last :meth:`update_storms`."""
+        return frozenset(self._storming)
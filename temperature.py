@@ -5,7 +5,11 @@ from kivy.lang import Builder
 from kivy.properties import StringProperty, NumericProperty, ColorProperty, ObjectProperty, ListProperty, DictProperty
 from kivy.uix.relativelayout import RelativeLayout
 
+import heapq
+import itertools
+import math
 import time
+from array import array
 
 
 class Colors:
@@ -18,9 +22,158 @@ class Colors:
     COLOR_RED = [228 / 256, 5 / 256, 41 / 256, 1]
 
 
+class StalenessMonitor(object):
+    """Call back when a source has not been refreshed within its timeout.
+
+    All sources share one heap of deadlines and a single Clock event, which
+    is scheduled for the earliest deadline.  Re-arming a source does not
+    remove its old heap entry; outdated entries are skipped when they reach
+    the top of the heap.
+    """
+
+    def __init__(self):
+        self._deadlines = dict()  # key -> (deadline, callback)
+        self._heap = []  # (deadline, sequence, key)
+        self._seq = itertools.count()
+        self._event = None
+        self._event_deadline = None
+
+    def arm(self, key, timeout, callback) -> None:
+        """(Re-)start the timeout of *key*; *callback(key)* is called when it expires."""
+        deadline = time.monotonic() + timeout
+        self._deadlines[key] = (deadline, callback)
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+        if len(self._heap) > 4 * len(self._deadlines) + 16:
+            self._compact()
+        self._reschedule()
+
+    def disarm(self, key) -> None:
+        """Stop watching *key*."""
+        self._deadlines.pop(key, None)
+
+    def _compact(self):
+        self._heap = [(deadline, next(self._seq), key)
+                      for key, (deadline, _) in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _is_current(self, entry):
+        current = self._deadlines.get(entry[2], None)
+        return current is not None and current[0] == entry[0]
+
+    def _reschedule(self):
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+
+        if not self._heap:
+            if self._event is not None:
+                self._event.cancel()
+                self._event = None
+            return
+
+        deadline = self._heap[0][0]
+        if self._event is not None:
+            if self._event_deadline <= deadline:
+                return
+            self._event.cancel()
+        self._event_deadline = deadline
+        self._event = Clock.schedule_once(self._fire, max(0.0, deadline - time.monotonic()))
+
+    def _fire(self, _dt):
+        self._event = None
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if self._is_current(entry):
+                _, callback = self._deadlines.pop(entry[2])
+                callback(entry[2])
+        self._reschedule()
+
+
+class TemperatureHistory(object):
+    """Fixed-size ring buffer of averaged temperature readings.
+
+    The covered *duration* is split into *n_slots* time slots (one per pixel
+    of the sparkline).  Readings are averaged into their slot on insert, so
+    the memory does not depend on the reading rate.  Each ring position
+    remembers the absolute slot number it holds, which makes outdated
+    positions recognizable without clearing them.
+    """
+
+    def __init__(self, duration=3600, n_slots=35):
+        self.n_slots = n_slots
+        self.slot_duration = duration / n_slots
+        self._slot_ids = array('q', [-1] * n_slots)
+        self._sums = array('f', [0.0] * n_slots)
+        self._counts = array('I', [0] * n_slots)
+        self._newest = -1
+
+    def add(self, t, value) -> None:
+        """Add the reading *value* taken at Unix time *t*."""
+        slot = math.floor(t / self.slot_duration)
+        if slot <= self._newest - self.n_slots:
+            return  # Too old to be shown
+        self._newest = max(self._newest, slot)
+
+        pos = slot % self.n_slots
+        if self._slot_ids[pos] != slot:
+            self._slot_ids[pos] = slot
+            self._sums[pos] = 0.0
+            self._counts[pos] = 0
+        self._sums[pos] += value
+        self._counts[pos] += 1
+
+    def averages(self, now):
+        """Return the slot averages up to *now*, oldest first.
+
+        :return: List of *n_slots* values, ``None`` for slots without readings.
+        """
+        last = math.floor(now / self.slot_duration)
+        result = []
+        for slot in range(last - self.n_slots + 1, last + 1):
+            pos = slot % self.n_slots
+            if self._slot_ids[pos] == slot and self._counts[pos]:
+                result.append(self._sums[pos] / self._counts[pos])
+            else:
+                result.append(None)
+        return result
+
+
+def sparkline_points(averages, width, height, min_span=2.0):
+    """Return the flat ``x, y`` point list of a sparkline.
+
+    Slots without value are left out, so the line bridges gaps.  The value
+    range is fitted to the height, but spans at least *min_span* degrees to
+    keep sensor noise flat.
+
+    :param averages: Values per slot, oldest first, ``None`` for gaps.
+    :param width: Width in pixels; the slots are spread evenly across it.
+    :param height: Height in pixels.
+    :param min_span: Minimum value range shown.
+    """
+    values = [v for v in averages if v is not None]
+    if not values or not averages:
+        return []
+
+    lo, hi = min(values), max(values)
+    if hi - lo < min_span:
+        mid = (hi + lo) / 2
+        lo, hi = mid - min_span / 2, mid + min_span / 2
+    x_step = width / len(averages)
+    y_scale = (height - 1) / (hi - lo)
+
+    points = []
+    for i, v in enumerate(averages):
+        if v is not None:
+            points.extend((i * x_step + x_step / 2, (v - lo) * y_scale + 0.5))
+    if len(points) == 2:
+        # A single value is drawn as a short dash
+        points = [points[0] - x_step / 2, points[1], points[0] + x_step / 2, points[1]]
+    return points
+
+
 Builder.load_string("""
 <TemperaturePanel>:
-    size: 0, 76
+    size: 0, 92
     size_hint: None, None
     
     BoxLayout:
@@ -31,6 +184,13 @@ Builder.load_string("""
 
 
 class TemperaturePanel(RelativeLayout):
+    """Shows the configured temperature sensors side by side.
+
+    Dispatches ``on_update`` whenever a view shows a new value or trend.
+    """
+
+    __events__ = ('on_update',)
+
     mqttc = ObjectProperty(None)
     conf = ListProperty(None)
 
@@ -41,6 +201,8 @@ class TemperaturePanel(RelativeLayout):
 
     def _on_conf(self, _instance, conf: list) -> None:
         layout = self.ids.main_layout
+        for view in layout.children:
+            view.detach()
         layout.clear_widgets()
 
         if not conf:
@@ -49,20 +211,39 @@ class TemperaturePanel(RelativeLayout):
         for t in conf:
             view = TemperatureView()
             view.conf = t
+            view.bind(_temp=self._on_view_update, value_error=self._on_view_update,
+                      _sparkline_points=self._on_view_update)
             self.bind(mqttc=view.setter('mqttc'))
             self.property('mqttc').dispatch(self)
             layout.add_widget(view)
 
-        self.size = [len(conf) * 35, 76]
+        self.size = [len(conf) * 35, 92]
+
+    def _on_view_update(self, *_args):
+        self.dispatch('on_update')
+
+    def on_update(self):
+        """Default handler for the ``on_update`` event (no-op)."""
 
 
 Builder.load_string("""
 #:import Colors temperature.Colors
 
+<TemperatureSparkline>:
+    size_hint: None, None
+    size: 35, 14  # TemperatureView.SPARKLINE_SIZE
+
+    canvas:
+        Color:
+            rgba: Colors.COLOR_GREY
+        Line:
+            points: root.points
+            width: 1
+
 <TemperatureView>:    
     BoxLayout:
         orientation: 'vertical'
-        size: 40, 95
+        size: 40, 111
         size_hint: None, None
 
         Label:
@@ -83,11 +264,26 @@ Builder.load_string("""
             limit_warn: root.conf.get("warn", 0) if root.conf else 0
             limit_alarm: root.conf.get("alarm", 0) if root.conf else 0
             temperature: root._temp
+
+        TemperatureSparkline:
+            id: sparkline
+            points: root._sparkline_points
 """)
 
 
+class TemperatureSparkline(RelativeLayout):
+    """Trend line of the last hour, drawn as one :class:`Line` instruction."""
+
+    points = ListProperty([])
+
+
 class TemperatureView(RelativeLayout):
     MEASUREMENT_TIMEOUT = 20  # [s]
+    HISTORY_DURATION = 3600  # [s]
+    SPARKLINE_SIZE = (35, 14)  # [px], one history slot per pixel
+
+    # Shared by all views, so that only one Clock event is pending
+    _staleness = StalenessMonitor()
 
     mqttc = ObjectProperty(None)
     conf = DictProperty(None)
@@ -96,15 +292,20 @@ class TemperatureView(RelativeLayout):
     _label_color = ColorProperty(Colors.COLOR_GREY)
 
     _temp = NumericProperty(None, allownone=True)
+    _sparkline_points = ListProperty([])
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         # The time of last measurement
         self.measure_instant = None
-        # Schedule the check
-        # (Scheduling does not have to be super precise, so we chose a rather long interval.)
-        Clock.schedule_interval(lambda dt: self._check_measurement_age(), 5)
+        # The trend of the last hour, one slot per sparkline pixel
+        self._history = TemperatureHistory(TemperatureView.HISTORY_DURATION,
+                                           TemperatureView.SPARKLINE_SIZE[0])
+
+    def detach(self) -> None:
+        """Stop the measurement timeout, e.g. when the view is removed."""
+        TemperatureView._staleness.disarm(self)
 
     def on_conf(self, _instance, _conf: list) -> None:
         self._update_mqtt()
@@ -126,6 +327,7 @@ class TemperatureView(RelativeLayout):
     def _update_temperature(self, payload):
         # We received a measurement
         self.measure_instant = time.time()
+        TemperatureView._staleness.arm(self, self._measurement_timeout(), self._on_stale)
 
         try:
             self.value_error = None
@@ -134,14 +336,30 @@ class TemperatureView(RelativeLayout):
             Logger.error(e)
             self.value_error = e
             self._temp = None
-
-    def _check_measurement_age(self):
-        age = time.time() - self.measure_instant \
-            if self.measure_instant is not None \
-            else TemperatureView.MEASUREMENT_TIMEOUT + 1
-
-        if age > TemperatureView.MEASUREMENT_TIMEOUT:
-            self._temp = None
+        else:
+            self._history.add(self.measure_instant, self._temp)
+        self._refresh_sparkline()
+
+    def _refresh_sparkline(self):
+        width, height = TemperatureView.SPARKLINE_SIZE
+        self._sparkline_points = sparkline_points(
+            self._history.averages(time.time()), width, height)
+
+    def _measurement_timeout(self) -> float:
+        timeout = self.conf.get("timeout", None) if self.conf else None
+        if timeout is None:
+            return TemperatureView.MEASUREMENT_TIMEOUT
+        try:
+            return float(timeout)
+        except (TypeError, ValueError):
+            Logger.warning("Temperature: Invalid timeout %r, using %d s",
+                           timeout, TemperatureView.MEASUREMENT_TIMEOUT)
+            return TemperatureView.MEASUREMENT_TIMEOUT
+
+    def _on_stale(self, _key):
+        # Like the value, the trend is cleared until the next measurement
+        self._temp = None
+        self._sparkline_points = []
 
 
 Builder.load_string("""
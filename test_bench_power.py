@@ -0,0 +1,77 @@
+""" Pytest tests for the power benchmark """
+
+import csv
+import io
+import json
+
+from bench_power import (scenarios, synthetic_points, synthetic_csv, run_scenario,
+                         compare, main, STAGES, NOW)
+from power import parse_flux_csv_series
+
+
+class TestScenarios:
+    def test_full_matrix(self):
+        assert len(scenarios()) == 9
+
+    def test_quick_skips_large_series(self):
+        labels = [label for label, _, _ in scenarios(quick=True)]
+        assert "1 s samples, 1 h" in labels
+        assert "1 s samples, 7 d" not in labels
+
+
+class TestSyntheticCsv:
+    def test_parses_back_to_points(self):
+        points = synthetic_points(60, 600)
+        times, values = parse_flux_csv_series(csv.reader(io.StringIO(synthetic_csv(points))))
+        assert list(times) == [t for t, _ in points]
+        assert list(values) == [v for _, v in points]
+        assert times[-1] == NOW
+
+
+class TestRunScenario:
+    def test_reports_all_stages(self):
+        results = run_scenario(60, 3600, repeat=1, number=1)
+        assert list(results) == STAGES
+        for stage in results.values():
+            assert stage["seconds"] > 0
+            assert stage["peak_bytes"] >= 0
+
+
+def _results(seconds, peak_bytes):
+    return {"s": {"bars": {"seconds": seconds, "peak_bytes": peak_bytes}}}
+
+
+class TestCompare:
+    def test_within_threshold(self):
+        assert compare(_results(0.014, 1000), _results(0.010, 1000), threshold=1.5) == []
+
+    def test_slower_stage(self):
+        regressions = compare(_results(0.020, 1000), _results(0.010, 1000), threshold=1.5)
+        assert len(regressions) == 1
+        assert "s / bars" in regressions[0]
+
+    def test_small_absolute_difference_is_noise(self):
+        assert compare(_results(30e-6, 1000), _results(10e-6, 1000), threshold=1.5) == []
+
+    def test_more_memory(self):
+        regressions = compare(_results(0.010, 2000), _results(0.010, 1000), threshold=1.5)
+        assert len(regressions) == 1
+        assert "peak" in regressions[0]
+
+    def test_missing_stage_skipped(self):
+        assert compare(_results(1.0, 1000), {"other": {}}) == []
+
+
+class TestMain:
+    def test_baseline_roundtrip(self, tmp_path, capsys):
+        path = tmp_path / "baseline.json"
+        assert main(["--quick", "--repeat", "1", "--number", "1", "--save-baseline", str(path)]) == 0
+        baseline = json.loads(path.read_text())
+        assert "60 s samples, 1 h" in baseline
+
+        for stages in baseline.values():
+            for stage in stages.values():
+                stage["seconds"] /= 1000
+        path.write_text(json.dumps(baseline))
+        assert main(["--quick", "--repeat", "1", "--number", "1", "--baseline", str(path)]) == 1
+        assert "REGRESSION" in capsys.readouterr().out
@@ -3,8 +3,9 @@
 import time
 
 import pytest
+from kivy.clock import Clock
 
-from globalcontent import PageRouter, NavBackWidget, _parse_nav_ttl
+from globalcontent import PageRouter, NavBackWidget, ContentPage, _parse_nav_ttl
 
 
 class _MockPage:
@@ -674,3 +675,30 @@ class TestPageRouterBlockInput:
         router.switch_to_page(page2, go_back_if_current=True, block_input=True)
         assert block_calls == [True]
 
+
+
+class _MockContentPage:
+    """Borrows the dirty signalling of ContentPage without creating a widget."""
+
+    mark_dirty = ContentPage.mark_dirty
+    _dispatch_dirty = ContentPage._dispatch_dirty
+
+    def __init__(self):
+        self.dispatched = []
+        self._dirty_trigger = Clock.create_trigger(self._dispatch_dirty, 0)
+
+    def dispatch(self, event):
+        self.dispatched.append(event)
+
+
+class TestContentPageDirty:
+    def test_marks_are_coalesced(self):
+        page = _MockContentPage()
+        page.mark_dirty()
+        page.mark_dirty()
+        Clock.tick()
+        assert page.dispatched == ['on_dirty']
+
+        page.mark_dirty()
+        Clock.tick()
+        assert page.dispatched == ['on_dirty', 'on_dirty']
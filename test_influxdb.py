@@ -127,28 +127,37 @@ class _FakeHealth:
 
 
 class _FakeQueryApi:
-    def __init__(self, tables=None, error=None):
+    def __init__(self, tables=None, error=None, csv_rows=None):
         self._tables = tables or []
         self._error = error
+        self._csv_rows = csv_rows or []
 
     def query(self, flux_query, org=None):
         if self._error is not None:
             raise self._error
         return self._tables
 
+    def query_csv(self, flux_query, org=None):
+        if self._error is not None:
+            raise self._error
+        return iter(self._csv_rows)
+
 
 class _FakeInfluxDBClient:
-    def __init__(self, health_status="pass", query_error=None, query_tables=None):
+    def __init__(self, health_status="pass", query_error=None, query_tables=None,
+                 query_csv_rows=None):
         self._health_status = health_status
         self._query_error = query_error
         self._query_tables = query_tables or []
+        self._query_csv_rows = query_csv_rows or []
         self.closed = False
 
     def health(self):
         return _FakeHealth(self._health_status)
 
     def query_api(self):
-        return _FakeQueryApi(tables=self._query_tables, error=self._query_error)
+        return _FakeQueryApi(tables=self._query_tables, error=self._query_error,
+                             csv_rows=self._query_csv_rows)
 
     def close(self):
         self.closed = True
@@ -397,3 +406,95 @@ class TestInfluxDbConnectorQueryIconUpdate:
 
         for t in spawned:
             t.join(timeout=5)
+
+
+class TestInfluxDbConnectorQueryCsv:
+    """Verify the streaming CSV query path."""
+
+    def _run_query_csv(self, connector, parser, callback, error_callback=None):
+        spawned = []
+        orig_start = threading.Thread.start
+
+        def patched_start(self_thread):
+            orig_start(self_thread)
+            spawned.append(self_thread)
+
+        threading.Thread.start = patched_start
+        try:
+            connector.query_csv(
+                "from(bucket:\"b\") |> range(start: -1h)",
+                parser, callback, error_callback)
+        finally:
+            threading.Thread.start = orig_start
+
+        for t in spawned:
+            t.join(timeout=5)
+
+    def _fire_clock_once_calls(self, mock_clock):
+        for cb, _delay, _evt in mock_clock.once_calls:
+            cb(0)
+
+    def test_parser_result_passed_to_callback(self, monkeypatch):
+        import influxdb as influxdb_module
+
+        mock_clock = _MockClock()
+        monkeypatch.setattr(influxdb_module, "Clock", mock_clock)
+
+        cfg = InfluxDbConfiguration(url="http://localhost:8086", token="t", org="o")
+        connector = InfluxDbConnector(cfg)
+        connector._client = _FakeInfluxDBClient(query_csv_rows=[["a"], ["b", "c"]])
+        tray = _FakeTrayIcon()
+        connector._tray_icon = tray
+
+        received = []
+        self._run_query_csv(connector, lambda rows: sum(len(r) for r in rows),
+                            received.append)
+        self._fire_clock_once_calls(mock_clock)
+
+        assert received == [3]
+        assert tray.icon_color == influxdb_module._Colors.COLOR_GREEN
+
+    def test_parser_runs_off_main_thread(self, monkeypatch):
+        import influxdb as influxdb_module
+
+        monkeypatch.setattr(influxdb_module, "Clock", _MockClock())
+
+        cfg = InfluxDbConfiguration(url="http://localhost:8086", token="t", org="o")
+        connector = InfluxDbConnector(cfg)
+        connector._client = _FakeInfluxDBClient()
+
+        threads = []
+        self._run_query_csv(connector,
+                            lambda rows: threads.append(threading.current_thread()),
+                            lambda result: None)
+
+        assert len(threads) == 1
+        assert threads[0] is not threading.main_thread()
+
+    def test_error_callback_receives_exception(self, monkeypatch):
+        import influxdb as influxdb_module
+
+        mock_clock = _MockClock()
+        monkeypatch.setattr(influxdb_module, "Clock", mock_clock)
+
+        cfg = InfluxDbConfiguration(url="http://localhost:8086", token="t", org="o")
+        connector = InfluxDbConnector(cfg)
+        err = RuntimeError("network error")
+        connector._client = _FakeInfluxDBClient(query_error=err)
+        tray = _FakeTrayIcon()
+        connector._tray_icon = tray
+
+        received = []
+        self._run_query_csv(connector, list, lambda result: None, received.append)
+        self._fire_clock_once_calls(mock_clock)
+
+        assert received == [err]
+        assert tray.icon_color == influxdb_module._Colors.COLOR_RED
+
+    def test_not_connected_skips_query(self):
+        cfg = InfluxDbConfiguration(url="http://localhost:8086", token="t", org="o")
+        connector = InfluxDbConnector(cfg)
+
+        called = []
+        connector.query_csv("q", called.append, called.append)
+        assert called == []
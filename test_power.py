@@ -1,10 +1,20 @@
 """ Pytest tests for the power module """
 
+import random
+from array import array
+
 import pytest
 
+import power as power_module
 from power import (compute_energy_segments, compute_bar_values,
                    build_power_flux_query, parse_duration_seconds,
-                   compute_bar_layout)
+                   compute_bar_layout, parse_flux_csv_series,
+                   parse_rfc3339_timestamp, quad_indices, build_bar_vertices,
+                   LivePowerTail, merge_series, save_graph_cache, load_graph_cache,
+                   shift_cached_bars, GraphCacheWriter,
+                   parse_resolution_levels, select_resolution_level,
+                   BarLayout, BarLayoutCache, PowerSmoother, PowerWidget,
+                   PowerHistoryGraph)
 
 
 class TestComputeEnergySegments:
@@ -60,6 +70,99 @@ class TestComputeEnergySegments:
         assert segments[0] == (0, 5, 100)
         assert segments[1] == (5, 30, 300)
 
+    def test_zipped_arrays(self):
+        # Accepts any iterable of pairs, e.g. the arrays from parse_flux_csv_series
+        segments = compute_energy_segments(zip([0.0, 10.0, 20.0], [0.0, 50.0, 150.0]))
+        assert segments == [(0.0, 10.0, 50.0), (10.0, 20.0, 100.0)]
+
+
+# Annotated CSV as returned by InfluxDB for a single table
+_CSV_ROWS = [
+    ['#datatype', 'string', 'long', 'dateTime:RFC3339', 'dateTime:RFC3339',
+     'dateTime:RFC3339', 'double', 'string', 'string'],
+    ['#group', 'false', 'false', 'true', 'true', 'false', 'false', 'true', 'true'],
+    ['#default', '_result', '', '', '', '', '', '', ''],
+    ['', 'result', 'table', '_start', '_stop', '_time', '_value', '_field', '_measurement'],
+    ['', '', '0', '2024-05-01T11:00:00Z', '2024-05-01T12:00:00Z',
+     '2024-05-01T11:00:10Z', '100', 'energy', 'plug'],
+    ['', '', '0', '2024-05-01T11:00:00Z', '2024-05-01T12:00:00Z',
+     '2024-05-01T11:00:20.5Z', '150.5', 'energy', 'plug'],
+]
+
+_T0 = 1714561200.0  # 2024-05-01T11:00:00Z
+
+
+class TestParseRfc3339Timestamp:
+    def test_utc_seconds(self):
+        assert parse_rfc3339_timestamp('2024-05-01T11:00:00Z') == _T0
+
+    def test_utc_nanoseconds(self):
+        t = parse_rfc3339_timestamp('2024-05-01T11:00:00.123456789Z')
+        assert abs(t - (_T0 + 0.123456789)) < 1e-6
+
+    def test_offset_fallback(self):
+        assert parse_rfc3339_timestamp('2024-05-01T13:00:00+02:00') == _T0
+
+    def test_invalid_raises_value_error(self):
+        with pytest.raises(ValueError):
+            parse_rfc3339_timestamp('yesterday')
+
+
+class TestParseFluxCsvSeries:
+    def test_empty(self):
+        times, values = parse_flux_csv_series([])
+        assert len(times) == 0
+        assert len(values) == 0
+
+    def test_single_table(self):
+        times, values = parse_flux_csv_series(_CSV_ROWS)
+        assert list(times) == [_T0 + 10, _T0 + 20.5]
+        assert list(values) == [100.0, 150.5]
+
+    def test_returns_float_arrays(self):
+        times, values = parse_flux_csv_series(_CSV_ROWS)
+        assert times.typecode == 'd'
+        assert values.typecode == 'd'
+
+    def test_column_order_from_header(self):
+        rows = [
+            ['#datatype', 'double', 'dateTime:RFC3339'],
+            ['', '_value', '_time'],
+            ['', '42', '2024-05-01T11:00:00Z'],
+        ]
+        times, values = parse_flux_csv_series(rows)
+        assert list(times) == [_T0]
+        assert list(values) == [42.0]
+
+    def test_multiple_tables_sorted(self):
+        # Second table holds older samples; the result must be sorted by time
+        rows = _CSV_ROWS + [
+            [],
+            _CSV_ROWS[0], _CSV_ROWS[1], _CSV_ROWS[2], _CSV_ROWS[3],
+            ['', '', '1', '2024-05-01T11:00:00Z', '2024-05-01T12:00:00Z',
+             '2024-05-01T11:00:05Z', '90', 'energy', 'plug'],
+        ]
+        times, values = parse_flux_csv_series(rows)
+        assert list(times) == [_T0 + 5, _T0 + 10, _T0 + 20.5]
+        assert list(values) == [90.0, 100.0, 150.5]
+
+    def test_empty_values_skipped(self):
+        rows = _CSV_ROWS[:4] + [
+            ['', '', '0', '', '', '2024-05-01T11:00:10Z', '', 'energy', 'plug'],
+            ['', '', '0', '', '', '', '12', 'energy', 'plug'],
+        ]
+        times, values = parse_flux_csv_series(rows)
+        assert len(times) == 0
+
+    def test_table_without_columns_ignored(self):
+        rows = [
+            ['#datatype', 'string', 'string'],
+            ['', 'error', 'reference'],
+            ['', 'something failed', ''],
+        ]
+        times, values = parse_flux_csv_series(rows)
+        assert len(times) == 0
+
 
 class TestComputeBarValues:
     def test_empty_segments_returns_zeros(self):
@@ -134,6 +237,71 @@ class TestComputeBarValues:
         assert abs(bars[0] - 600.0) < 1e-9
 
 
+def _reference_bar_values(segments, n_bars, bar_duration, now):
+    """Straightforward bar-by-bar evaluation used to cross-check the sweep."""
+    bars = []
+    for i in range(n_bars):
+        bar_end = now - (n_bars - 1 - i) * bar_duration
+        bar_start = bar_end - bar_duration
+
+        energy = 0.0
+        for seg_start, seg_end, seg_energy in segments:
+            overlap_start = max(bar_start, seg_start)
+            overlap_end = min(bar_end, seg_end)
+            if overlap_end > overlap_start:
+                seg_dur = seg_end - seg_start
+                overlap_dur = overlap_end - overlap_start
+                energy += seg_energy * (overlap_dur / seg_dur)
+
+        bars.append(energy * 60 / bar_duration)
+    return bars
+
+
+class TestComputeBarValuesSweep:
+    """The sweep must match the bar-by-bar evaluation bit for bit."""
+
+    @staticmethod
+    def _random_points(n, step, now, seed):
+        rng = random.Random(seed)
+        points = []
+        energy = 0.0
+        t = now - n * step
+        for _ in range(n):
+            t += step * rng.uniform(0.5, 1.5)
+            energy += rng.uniform(0, 50)
+            if rng.random() < 0.01:
+                energy = 0.0  # device reset
+            points.append((t, energy))
+        return points
+
+    @pytest.mark.parametrize("n_bars,bar_duration,step", [
+        (800, 9.0, 10.0),     # 1 px bars, 10 s samples (2 h window on 800 px)
+        (24, 300.0, 10.0),    # wide bars, many segments per bar
+        (120, 60.0, 300.0),   # segments spanning several bars
+        (50, 7.3, 3.1),       # non-integer boundaries
+    ])
+    def test_identical_to_reference(self, n_bars, bar_duration, step):
+        now = 1_714_561_200.5
+        points = self._random_points(int(n_bars * bar_duration / step) + 20, step, now, n_bars)
+        segments = compute_energy_segments(points)
+        assert compute_bar_values(segments, n_bars, bar_duration, now) == \
+            _reference_bar_values(segments, n_bars, bar_duration, now)
+
+    def test_unsorted_segments(self):
+        segments = [(20, 30, 60), (0, 10, 50), (5, 25, 10)]
+        assert compute_bar_values(segments, 3, 10, 30) == \
+            _reference_bar_values(segments, 3, 10, 30)
+
+    def test_segment_boundary_on_bar_boundary(self):
+        segments = [(10, 20, 100)]
+        bars = compute_bar_values(segments, 3, 10, 30)
+        assert bars == [0.0, 600.0, 0.0]
+
+    def test_degenerate_segment_ignored(self):
+        segments = [(15, 15, 100)]
+        assert compute_bar_values(segments, 3, 10, 30) == [0.0, 0.0, 0.0]
+
+
 class TestParseDurationSeconds:
     def test_integer_input(self):
         assert parse_duration_seconds(300) == 300.0
@@ -264,6 +432,23 @@ class TestBuildPowerFluxQuery:
         q = build_power_flux_query("mybucket", "myms", "myfield", 10, "300", 2)
         assert '  |> range(start: -3600s)' in q
 
+    def test_since_limits_range(self):
+        q = build_power_flux_query("b", "myms", "f", 10, 60, 2, since_s=90.2)
+        assert '|> range(start: -91s)' in q
+
+    def test_since_never_exceeds_full_range(self):
+        q = build_power_flux_query("b", "myms", "f", 10, 60, 2, since_s=10000)
+        assert '|> range(start: -720s)' in q
+
+    def test_every_adds_aggregate_window(self):
+        q = build_power_flux_query("b", "myms", "f", 10, 60, 2, every_s=900)
+        assert 'aggregateWindow(every: 900s, fn: last, createEmpty: false)' in q
+        assert q.index('aggregateWindow') < q.index('sort(')
+
+    def test_no_aggregate_window_by_default(self):
+        q = build_power_flux_query("b", "myms", "f", 10, 60, 2)
+        assert 'aggregateWindow' not in q
+
     def test_buffer_adds_to_range(self):
         # n_buffer extra bars are included in the time range query
         q_no_buf = build_power_flux_query("b", "myms", "f", 10, 60, 0)
@@ -271,3 +456,456 @@ class TestBuildPowerFluxQuery:
         assert '|> range(start: -600s)' in q_no_buf   # 10*60
         assert '|> range(start: -720s)' in q_buf      # 12*60
 
+
+class TestQuadIndices:
+    def test_no_quads(self):
+        assert quad_indices(0) == []
+
+    def test_two_quads(self):
+        assert quad_indices(2) == [0, 1, 2, 2, 3, 0, 4, 5, 6, 6, 7, 4]
+
+
+def _quad_rect(vertices, q):
+    """Return (x0, y0, x1, y1) of quad *q* in a flat x, y, u, v vertex list."""
+    xs = vertices[16 * q:16 * q + 16:4]
+    ys = vertices[16 * q + 1:16 * q + 16:4]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class TestBuildBarVertices:
+    def test_empty(self):
+        assert build_bar_vertices([], 10, 9, 100, 1, 2) == ([], [])
+
+    def test_one_quad_per_bar_each(self):
+        body, highlight = build_bar_vertices([0.0, 0.5, 1.0], 10, 9, 101, 1, 2)
+        assert len(body) == 3 * 16
+        assert len(highlight) == 3 * 16
+
+    def test_full_bar_geometry(self):
+        # height 101, border 1 → full bar is 100 px: body 98 px + 2 px highlight on top
+        body, highlight = build_bar_vertices([0.25, 1.0], 10, 9, 101, 1, 2)
+        assert _quad_rect(body, 1) == (11.0, 1.0, 20.0, 99.0)
+        assert _quad_rect(highlight, 1) == (11.0, 99.0, 20.0, 101.0)
+
+    def test_tiny_bar_has_empty_body(self):
+        # A zero value still shows a border-high bar, entirely highlight
+        body, highlight = build_bar_vertices([0.0], 10, 9, 101, 1, 2)
+        x0, y0, x1, y1 = _quad_rect(body, 0)
+        assert y0 == y1
+        assert _quad_rect(highlight, 0) == (1.0, 1.0, 10.0, 2.0)
+
+
+class TestLivePowerTail:
+    def test_samples_before_reset_are_ignored(self):
+        tail = LivePowerTail()
+        assert tail.add_sample(10, 100) == []
+        assert tail.anchor is None
+        assert tail.current_watts(50) == 50
+
+    def test_no_live_data_keeps_newest_bar(self):
+        tail = LivePowerTail()
+        tail.reset(100, 60)
+        assert tail.current_watts(42) == 42
+
+    def test_partial_window_blends_with_newest_bar(self):
+        # Reading of 120 W held from the anchor at t=100 until t=130:
+        # window (70, 130] = 30 s of history at 60 W + 30 s live at 120 W → 90 W
+        tail = LivePowerTail()
+        tail.add_sample(95, 120)
+        tail.reset(100, 60)
+        assert tail.add_sample(130, 120) == []
+        assert abs(tail.current_watts(60) - 90.0) < 1e-9
+
+    def test_zero_order_hold_between_samples(self):
+        # 0 W from 100 to 115, then 240 W from 115 to 160
+        tail = LivePowerTail()
+        tail.reset(100, 60)
+        tail.add_sample(100, 0)
+        tail.add_sample(115, 240)
+        completed = tail.add_sample(160, 240)
+        assert completed == [240 * 45 / 60]
+        assert tail.anchor == 160
+
+    def test_multiple_completed_bars(self):
+        tail = LivePowerTail()
+        tail.reset(0, 10)
+        tail.add_sample(0, 50)
+        completed = tail.add_sample(35, 50)
+        assert completed == [50.0, 50.0, 50.0]
+        assert tail.anchor == 30
+        # 5 s live at 50 W + 5 s of the newest bar at 50 W
+        assert abs(tail.current_watts(50.0) - 50.0) < 1e-9
+
+    def test_unknown_value_contributes_no_energy(self):
+        tail = LivePowerTail()
+        tail.reset(0, 10)
+        tail.add_sample(0, None)
+        assert tail.add_sample(10, 100) == [0.0]
+
+    def test_reset_carries_held_value(self):
+        tail = LivePowerTail()
+        tail.reset(0, 10)
+        tail.add_sample(5, 100)
+        tail.reset(8, 10)
+        # 100 W held from the new anchor at t=8 until t=18
+        assert tail.add_sample(18, 100) == [100.0]
+
+
+def _series(times, values):
+    return array('d', times), array('d', values)
+
+
+class TestMergeSeries:
+    def test_append_newer(self):
+        times, values = merge_series(_series([0, 10], [1, 2]), _series([20, 30], [3, 4]), 0)
+        assert list(times) == [0, 10, 20, 30]
+        assert list(values) == [1, 2, 3, 4]
+
+    def test_overlap_replaced_by_new(self):
+        times, values = merge_series(_series([0, 10, 20], [1, 2, 3]),
+                                     _series([10, 20, 30], [2, 5, 6]), 0)
+        assert list(times) == [0, 10, 20, 30]
+        assert list(values) == [1, 2, 5, 6]
+
+    def test_old_points_dropped(self):
+        times, values = merge_series(_series([0, 10, 20], [1, 2, 3]), _series([30], [4]), 15)
+        assert list(times) == [20, 30]
+        assert list(values) == [3, 4]
+
+    def test_empty_new_keeps_old(self):
+        times, values = merge_series(_series([0, 10], [1, 2]), _series([], []), 5)
+        assert list(times) == [10]
+        assert list(values) == [2]
+
+
+class TestGraphCache:
+    def test_roundtrip(self, tmp_path):
+        path = str(tmp_path / "graph.cache")
+        header = {"bucket": "b", "measurement": "m", "field": "f", "anchor": 123.5}
+        save_graph_cache(path, header, _series([0, 10], [1.5, 2.5]), [100.0, 200.0, 0.0])
+
+        loaded_header, (times, values), bar_watts = load_graph_cache(path)
+        assert loaded_header["bucket"] == "b"
+        assert loaded_header["anchor"] == 123.5
+        assert list(times) == [0, 10]
+        assert list(values) == [1.5, 2.5]
+        assert bar_watts == [100.0, 200.0, 0.0]
+
+    def test_no_temporary_file_left(self, tmp_path):
+        path = str(tmp_path / "graph.cache")
+        save_graph_cache(path, {}, _series([], []), [])
+        assert [p.name for p in tmp_path.iterdir()] == ["graph.cache"]
+
+    def test_missing_file(self, tmp_path):
+        assert load_graph_cache(str(tmp_path / "missing")) is None
+
+    def test_foreign_file(self, tmp_path):
+        path = tmp_path / "graph.cache"
+        path.write_bytes(b"not a cache file at all")
+        assert load_graph_cache(str(path)) is None
+
+    def test_truncated_file(self, tmp_path):
+        path = str(tmp_path / "graph.cache")
+        save_graph_cache(path, {}, _series([0, 10], [1, 2]), [1.0])
+        with open(path, 'rb') as f:
+            raw = f.read()
+        with open(path, 'wb') as f:
+            f.write(raw[:-4])
+        assert load_graph_cache(path) is None
+
+
+class TestShiftCachedBars:
+    def test_within_current_bar(self):
+        assert shift_cached_bars([1.0, 2.0, 3.0], 1000.0, 60, 1059.0) == ([1.0, 2.0, 3.0], 1000.0)
+
+    def test_shifted_by_completed_bars(self):
+        assert shift_cached_bars([1.0, 2.0, 3.0], 1000.0, 60, 1130.0) == ([3.0, 0.0, 0.0], 1120.0)
+
+    def test_outdated(self):
+        assert shift_cached_bars([1.0, 2.0, 3.0], 1000.0, 60, 1180.0) is None
+
+
+class TestGraphCacheWriter:
+    @pytest.fixture
+    def writes(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(power_module, "save_graph_cache",
+                            lambda path, header, series, bar_watts: calls.append((path, bar_watts)))
+        monkeypatch.setattr(GraphCacheWriter, "_start_worker", lambda self: None)
+        return calls
+
+    def test_saves_are_coalesced_per_file(self, writes):
+        writer = GraphCacheWriter()
+        writer.save("a", {}, _series([], []), [1.0])
+        writer.save("b", {}, _series([], []), [2.0])
+        writer.save("a", {}, _series([], []), [3.0])
+        writer._write_pending()
+        assert writes == [("a", [3.0]), ("b", [2.0])]
+
+    def test_write_error_is_logged(self, tmp_path):
+        writer = GraphCacheWriter()
+        writer._pending[str(tmp_path / "missing" / "graph.cache")] = ({}, _series([], []), [])
+        writer._write_pending()
+        assert writer._pending == {}
+
+
+_LEVELS_CONF = [
+    {"bucket": "power_1h", "resolution": "PT1H"},
+    {"bucket": "power_1m", "resolution": 60, "field": "energy"},
+    {"bucket": "power_15m", "resolution": "PT15M"},
+]
+
+
+class TestParseResolutionLevels:
+    def test_sorted_by_resolution(self):
+        levels = parse_resolution_levels(_LEVELS_CONF)
+        assert levels == [(60, "power_1m", None, "energy"),
+                          (900, "power_15m", None, None),
+                          (3600, "power_1h", None, None)]
+
+    def test_none(self):
+        assert parse_resolution_levels(None) == []
+
+    def test_missing_bucket(self):
+        with pytest.raises(ValueError):
+            parse_resolution_levels([{"resolution": "PT1M"}])
+
+    def test_invalid_resolution(self):
+        with pytest.raises(ValueError):
+            parse_resolution_levels([{"bucket": "b", "resolution": "later"}])
+
+    def test_sub_second_resolution(self):
+        with pytest.raises(ValueError):
+            parse_resolution_levels([{"bucket": "b", "resolution": 0.5}])
+
+
+class TestSelectResolutionLevel:
+    def setup_method(self):
+        self.levels = parse_resolution_levels(_LEVELS_CONF)
+
+    def test_bar_finer_than_all_levels(self):
+        assert select_resolution_level(self.levels, 30) is None
+
+    def test_exact_resolution(self):
+        assert select_resolution_level(self.levels, 900)[1] == "power_15m"
+
+    def test_coarsest_fitting_level(self):
+        assert select_resolution_level(self.levels, 1800)[1] == "power_15m"
+        assert select_resolution_level(self.levels, 7 * 86400 / 800)[1] == "power_1m"
+        assert select_resolution_level(self.levels, 86400)[1] == "power_1h"
+
+    def test_no_levels(self):
+        assert select_resolution_level([], 3600) is None
+
+
+class TestBarLayout:
+    def test_compile_parses_durations(self):
+        layout = BarLayout.compile(200, {"display_duration": "PT1H", "bar_duration": "PT5M"})
+        assert (layout.n_bars, layout.bar_duration) == (12, 300.0)
+        assert layout.slot_w == pytest.approx(200 / 12)
+        assert layout.bar_w == pytest.approx(200 / 12 - 1)
+
+    def test_compile_without_conf(self):
+        layout = BarLayout.compile(90, None, fallback_bar_width=8)
+        assert (layout.n_bars, layout.bar_duration) == (10, 300.0)
+
+    def test_compile_invalid_durations(self):
+        layout = BarLayout.compile(90, {"bar_duration": "soon", "display_duration": "long"})
+        assert (layout.n_bars, layout.bar_duration) == (10, 300.0)
+
+
+class TestBarLayoutCache:
+    _CONF = {"display_duration": "PT2H", "bar_duration": "PT1M"}
+
+    def test_hit_for_same_width_and_conf(self):
+        cache = BarLayoutCache()
+        first = cache.get(400, self._CONF)
+        assert cache.get(400, dict(self._CONF)) is first
+        stats = cache.stats()
+        assert (stats["compiles"], stats["hits"]) == (1, 1)
+        assert stats["hit_ratio"] == 0.5
+
+    def test_recompiled_on_width_change(self):
+        cache = BarLayoutCache()
+        assert cache.get(400, self._CONF).n_bars == 120
+        assert cache.get(100, self._CONF).n_bars == 100
+        assert cache.stats()["compiles"] == 2
+
+    def test_recompiled_on_duration_change(self):
+        cache = BarLayoutCache()
+        cache.get(400, self._CONF)
+        layout = cache.get(400, {"display_duration": "PT2H", "bar_duration": "PT2M"})
+        assert layout.n_bars == 60
+        assert cache.stats()["compiles"] == 2
+
+    def test_empty_stats(self):
+        stats = BarLayoutCache().stats()
+        assert stats["compiles"] == 0
+        assert stats["mean_compile_seconds"] == 0.0
+        assert stats["hit_ratio"] == 0.0
+
+
+class TestPowerSmoother:
+    def test_no_smoothing_passes_latest(self):
+        smoother = PowerSmoother()
+        assert smoother.value is None
+        smoother.add(10)
+        assert smoother.add(30) == 30
+
+    def test_ema(self):
+        smoother = PowerSmoother("ema", window=3)  # alpha = 0.5
+        assert smoother.add(100) == 100
+        assert smoother.add(200) == 150
+        assert smoother.add(200) == 175
+
+    def test_median_odd_and_even(self):
+        smoother = PowerSmoother("median", window=3)
+        assert smoother.add(100) == 100
+        assert smoother.add(300) == 200
+        assert smoother.add(2000) == 300
+        # Window keeps the last three readings only
+        assert smoother.add(0) == 300
+
+    def test_reset(self):
+        smoother = PowerSmoother("ema", window=3)
+        smoother.add(100)
+        smoother.reset()
+        assert smoother.value is None
+        assert smoother.add(50) == 50
+
+    def test_from_json_cfg(self):
+        smoother = PowerSmoother.from_json_cfg({"smoothing": "median", "smoothing_window": 2})
+        smoother.add(10)
+        assert smoother.add(20) == 15
+        assert PowerSmoother.from_json_cfg(None).add(5) == 5
+
+    def test_invalid_method(self):
+        with pytest.raises(ValueError):
+            PowerSmoother("mean")
+
+    def test_invalid_window(self):
+        with pytest.raises(ValueError):
+            PowerSmoother("ema", window=0)
+
+
+class _MockClockEvent:
+    def __init__(self, callback, delay):
+        self.callback = callback
+        self.delay = delay
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _MockClock:
+    """Captures scheduled Clock calls without running them."""
+
+    def __init__(self):
+        self.events = []
+
+    def schedule_once(self, callback, delay=0):
+        event = _MockClockEvent(callback, delay)
+        self.events.append(event)
+        return event
+
+
+class _FakePowerWidget:
+    """Borrows the display logic of PowerWidget without creating Kivy labels."""
+
+    _update_power = PowerWidget._update_power
+    _show_power = PowerWidget._show_power
+
+    def __init__(self, rate=None, smoother=None):
+        self._smoother = smoother or PowerSmoother()
+        self._min_display_interval = 1 / rate if rate else 0.0
+        self._last_display = None
+        self._display_event = None
+        self.power = None
+        self.raw_power = None
+        self.value_error = None
+
+
+class TestPowerWidgetDisplayRate:
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        mock_clock = _MockClock()
+        monkeypatch.setattr(power_module, "Clock", mock_clock)
+        self.now = 1000.0
+        monkeypatch.setattr(power_module._time, "monotonic", lambda: self.now)
+        return mock_clock
+
+    def test_unlimited_shows_every_reading(self, clock):
+        widget = _FakePowerWidget()
+        widget._update_power("10")
+        widget._update_power("20")
+        assert widget.power == 20
+        assert clock.events == []
+
+    def test_readings_within_interval_are_deferred(self, clock):
+        widget = _FakePowerWidget(rate=2)
+        widget._update_power("10")
+        assert widget.power == 10
+
+        self.now += 0.1
+        widget._update_power("20")
+        self.now += 0.1
+        widget._update_power("30")
+        assert widget.power == 10
+        assert widget.raw_power == 30
+        assert len(clock.events) == 1
+        assert clock.events[0].delay == pytest.approx(0.4)
+
+        self.now += 0.3
+        clock.events[0].callback(0.3)
+        assert widget.power == 30
+
+    def test_smoothed_value_is_shown(self, clock):
+        widget = _FakePowerWidget(smoother=PowerSmoother("median", window=3))
+        for payload in ("100", "5000", "110"):
+            widget._update_power(payload)
+        assert widget.power == 110
+        assert widget.raw_power == 110
+
+    def test_invalid_payload_cancels_pending_update(self, clock):
+        widget = _FakePowerWidget(rate=1)
+        widget._update_power("10")
+        widget._update_power("20")
+        widget._update_power("garbage")
+        assert clock.events[0].cancelled
+        assert widget.power is None
+        assert widget.raw_power is None
+        assert isinstance(widget.value_error, ValueError)
+
+
+class _FakePowerGraph:
+    """Borrows the live tail handling of PowerHistoryGraph without a canvas."""
+
+    _tick_live = PowerHistoryGraph._tick_live
+    _on_live_power = PowerHistoryGraph._on_live_power
+    _update_bars = PowerHistoryGraph._update_bars
+
+    def __init__(self, bar_watts, anchor, bar_duration):
+        self._bar_watts = list(bar_watts)
+        self._live_tail = LivePowerTail()
+        self._live_tail.reset(anchor, bar_duration)
+        self._bars = []
+        self._max_value = None
+        self.live_power = None
+
+
+class TestPowerHistoryGraphLiveTail:
+    def test_constant_load_advances_bars(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(power_module._time, "time", lambda: now[0])
+        graph = _FakePowerGraph([100.0, 100.0], anchor=1000.0, bar_duration=60)
+
+        graph.live_power = 400.0
+        graph._on_live_power(graph, 400.0)
+        # The reading does not change, so only the tick samples it again
+        for _ in range(13):
+            now[0] += 5
+            graph._tick_live(5)
+
+        assert graph._bar_watts == [100.0, 400.0]
+        assert graph._max_value == pytest.approx(400.0)
@@ -1,11 +1,25 @@
 """ Pytest tests for the screenshot module """
 
+import random
+import struct
+import zlib
+
 import pytest
+import screenshot as screenshot_module
 from screenshot import (
     ScaleStrategy,
     AspectFitStrategy,
     SalientScaleStrategy,
+    GpuSalientScaleStrategy,
+    ThumbnailCache,
+    ScreenshotOptions,
+    ScreenshotWriter,
     capture_widget_texture,
+    _encode_png,
+    _rgba_to_rgb,
+    _fit_size,
+    _max_luminance_pool,
+    _max_luminance_pool_numpy,
 )
 
 
@@ -46,6 +60,174 @@ class TestSalientScaleStrategy:
         assert SalientScaleStrategy().capture(_MockWidget(width=100, height=0), 100, 100) is None
 
 
+class TestGpuSalientScaleStrategy:
+    def test_none_widget_returns_none(self):
+        assert GpuSalientScaleStrategy().capture(None, 100, 100) is None
+
+    def test_zero_width_returns_none(self):
+        assert GpuSalientScaleStrategy().capture(_MockWidget(width=0, height=100), 100, 100) is None
+
+    def test_zero_height_returns_none(self):
+        assert GpuSalientScaleStrategy().capture(_MockWidget(width=100, height=0), 100, 100) is None
+
+
+class _MockShader:
+    def __init__(self, success):
+        self.fs = None
+        self.success = success
+
+
+class _MockFbo:
+    """Stand-in for kivy.graphics.Fbo that records the pooling passes."""
+
+    shader_success = True
+    instances = []
+
+    def __init__(self, size):
+        self.size = size
+        self.shader = _MockShader(_MockFbo.shader_success)
+        self.uniforms = {}
+        self.drawn = False
+        self.texture = _MockTexture(*size)
+        _MockFbo.instances.append(self)
+
+    def __setitem__(self, key, value):
+        self.uniforms[key] = value
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        return False
+
+    def draw(self):
+        self.drawn = True
+
+
+class _MockImage:
+    def __init__(self, texture):
+        self.texture = texture
+
+
+class _MockExportWidget(_MockWidget):
+    """Widget whose export_as_image renders a mock texture at the requested scale."""
+
+    def __init__(self, width, height):
+        super().__init__(width, height)
+        self.scales = []
+
+    def export_as_image(self, scale=1):
+        self.scales.append(scale)
+        return _MockImage(_MockTexture(int(self.width * scale), int(self.height * scale)))
+
+
+class TestGpuSalientPooling:
+    @pytest.fixture(autouse=True)
+    def mock_gl(self, monkeypatch):
+        _MockFbo.instances = []
+        _MockFbo.shader_success = True
+        monkeypatch.setattr(screenshot_module, 'Fbo', _MockFbo)
+        monkeypatch.setattr(screenshot_module, 'Rectangle', lambda **kwargs: None)
+
+    def test_pool_pass_sets_uniforms(self):
+        texture = screenshot_module._pool_pass(_MockTexture(640, 480), (160, 480), (1.0, 0.0))
+        fbo, = _MockFbo.instances
+        assert texture is fbo.texture
+        assert fbo.shader.fs == screenshot_module._POOL_FS
+        assert fbo.uniforms == {'src_size': (640.0, 480.0), 'out_size': (160.0, 480.0),
+                                'axis': (1.0, 0.0)}
+        assert fbo.drawn
+
+    def test_pool_pass_without_shader(self):
+        _MockFbo.shader_success = False
+        assert screenshot_module._pool_pass(_MockTexture(640, 480), (160, 480), (1.0, 0.0)) is None
+
+    def test_rows_then_columns(self):
+        widget = _MockExportWidget(800, 480)
+        texture = GpuSalientScaleStrategy().capture(widget, 160, 96)
+        assert widget.scales == [1.0]
+        rows, columns = _MockFbo.instances
+        assert (rows.size, rows.uniforms['axis']) == ((160, 480), (1.0, 0.0))
+        assert (columns.size, columns.uniforms['axis']) == ((160, 96), (0.0, 1.0))
+        assert (texture.width, texture.height) == (160, 96)
+
+    def test_large_widget_is_prescaled(self):
+        # 8000 / 160 = 50 pixels per block exceed _POOL_MAX_BLOCK
+        widget = _MockExportWidget(8000, 4800)
+        GpuSalientScaleStrategy().capture(widget, 160, 96)
+        scale, = widget.scales
+        assert scale == pytest.approx(screenshot_module._POOL_MAX_BLOCK * 160 / 8000)
+        rows = _MockFbo.instances[0]
+        assert rows.uniforms['src_size'][0] / 160 <= screenshot_module._POOL_MAX_BLOCK
+
+    def test_falls_back_to_cpu_without_shader(self, monkeypatch):
+        _MockFbo.shader_success = False
+        monkeypatch.setattr(SalientScaleStrategy, 'capture',
+                            lambda self, widget, max_w, max_h: "cpu")
+        assert GpuSalientScaleStrategy().capture(_MockExportWidget(800, 480), 160, 96) == "cpu"
+
+
+def _image(pixels):
+    """RGBA bytes of a list of rows of (r, g, b, a) tuples."""
+    return bytes(c for row in pixels for px in row for c in px)
+
+
+def _random_image(width, height, seed):
+    rnd = random.Random(seed)
+    # Few distinct values, so that ties occur
+    return bytes(rnd.choice((0, 64, 128, 255)) for _ in range(width * height * 4))
+
+
+_BLACK = (0, 0, 0, 255)
+_RED = (200, 0, 0, 255)
+_GREEN = (0, 250, 0, 128)
+
+
+class TestFitSize:
+    def test_wide_source(self):
+        assert _fit_size(800, 480, 40, 40) == (40, 24)
+
+    def test_tall_source(self):
+        assert _fit_size(480, 800, 40, 40) == (24, 40)
+
+    def test_at_least_one_pixel(self):
+        assert _fit_size(1000, 1, 10, 10) == (10, 1)
+
+
+class TestMaxLuminancePool:
+    def test_brightest_pixel_per_block(self):
+        data = _image([
+            [_BLACK, _RED, _BLACK, _BLACK],
+            [_BLACK, _BLACK, _BLACK, _GREEN],
+        ])
+        assert _max_luminance_pool(data, 4, 2, 2, 1) == _image([[_RED, _GREEN]])
+
+    def test_first_pixel_wins_tie(self):
+        data = _image([[(9, 0, 0, 1), (0, 9, 0, 2)]])
+        assert _max_luminance_pool(data, 2, 1, 1, 1) == _image([[(9, 0, 0, 1)]])
+
+    def test_fractional_blocks(self):
+        # Blocks of 2.5 pixels: [0, 2) and [2, 5)
+        data = _image([[_BLACK, _RED, _BLACK, _BLACK, _GREEN]])
+        assert _max_luminance_pool(data, 5, 1, 2, 1) == _image([[_RED, _GREEN]])
+
+    def test_identity(self):
+        data = _random_image(3, 2, seed=1)
+        assert _max_luminance_pool(data, 3, 2, 3, 2) == data
+
+
+class TestMaxLuminancePoolNumpy:
+    @pytest.mark.parametrize("src_w, src_h, out_w, out_h", [
+        (4, 2, 2, 1), (5, 1, 2, 1), (8, 8, 8, 8),
+        (64, 48, 8, 6), (83, 47, 9, 5), (100, 60, 40, 24),
+    ])
+    def test_same_as_python(self, src_w, src_h, out_w, out_h):
+        pytest.importorskip("numpy")
+        data = _random_image(src_w, src_h, seed=src_w * src_h)
+        assert _max_luminance_pool_numpy(data, src_w, src_h, out_w, out_h) \
+            == _max_luminance_pool(data, src_w, src_h, out_w, out_h)
+
+
 class TestCaptureWidgetTexture:
     def test_none_widget_returns_none(self):
         assert capture_widget_texture(None, 100, 100) is None
@@ -72,3 +254,245 @@ class TestCaptureWidgetTexture:
         result = capture_widget_texture(_MockWidget(width=100, height=100), 100, 100,
                                         strategy=_NullStrategy())
         assert result == "sentinel"
+
+
+class _MockTexture:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+
+class _MockPage:
+    """Minimal stand-in for a ContentPage."""
+
+    def __init__(self, label, attached=True):
+        self.label = label
+        self.parent = object() if attached else None
+        self.width = 800
+        self.height = 480
+        self.bindings = {}
+
+    def bind(self, **kwargs):
+        self.bindings.update(kwargs)
+
+    def mark_dirty(self):
+        self.bindings['on_dirty'](self)
+
+
+class _CountingStrategy(ScaleStrategy):
+    def __init__(self):
+        self.captured = []
+
+    def capture(self, widget, max_width, max_height):
+        self.captured.append(widget.label)
+        return _MockTexture(max_width, max_height)
+
+
+class TestThumbnailCache:
+    @pytest.fixture(autouse=True)
+    def now(self, monkeypatch):
+        self.now = 1000.0
+        monkeypatch.setattr(screenshot_module.time, "monotonic", lambda: self.now)
+
+    def _cache(self, max_bytes=1 << 20, max_age=None):
+        self.strategy = _CountingStrategy()
+        # 10 x 10 thumbnails of 400 bytes each
+        return ThumbnailCache(10, 10, max_bytes, max_age, self.strategy)
+
+    def test_captured_on_deactivation(self):
+        cache = self._cache()
+        assert cache.get('home') is None
+        cache.page_deactivated(_MockPage('home'))
+        assert cache.get('home').width == 10
+        assert cache.total_bytes == 400
+
+    def test_detached_page_not_captured(self):
+        cache = self._cache()
+        cache.page_deactivated(_MockPage('home', attached=False))
+        assert self.strategy.captured == []
+
+    def test_current_thumbnail_not_recaptured(self):
+        cache, page = self._cache(), _MockPage('home')
+        cache.page_deactivated(page)
+        cache.page_deactivated(page)
+        assert self.strategy.captured == ['home']
+
+    def test_dirty_page_invalidated_not_recaptured(self):
+        cache, page = self._cache(), _MockPage('home')
+        cache.watch(page)
+        cache.page_deactivated(page)
+
+        page.mark_dirty()
+        assert cache.get('home') is None
+        assert cache.total_bytes == 0
+        assert self.strategy.captured == ['home']
+
+        cache.page_deactivated(page)
+        assert self.strategy.captured == ['home', 'home']
+
+    def test_expired_thumbnail(self):
+        cache, page = self._cache(max_age=60), _MockPage('home')
+        cache.page_deactivated(page)
+        self.now += 60
+        assert cache.get('home') is not None
+
+        self.now += 1
+        assert cache.get('home') is None
+        assert len(cache) == 0
+        cache.page_deactivated(page)
+        assert self.strategy.captured == ['home', 'home']
+
+    def test_lru_eviction(self):
+        cache = self._cache(max_bytes=1000)
+        for label in ('a', 'b'):
+            cache.page_deactivated(_MockPage(label))
+        cache.get('a')  # b is now least recently used
+        cache.page_deactivated(_MockPage('c'))
+
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.get('c') is not None
+        assert cache.total_bytes == 800
+        assert cache.stats()['evictions'] == 1
+
+    def test_thumbnail_larger_than_cache_not_stored(self):
+        cache = self._cache(max_bytes=100)
+        cache.page_deactivated(_MockPage('a'))
+        assert len(cache) == 0
+        assert cache.total_bytes == 0
+
+    def test_stats(self):
+        cache = self._cache()
+        cache.page_deactivated(_MockPage('a'))
+        cache.get('a')
+        cache.get('b')
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'captures': 1, 'evictions': 0,
+                                 'entries': 1, 'bytes': 400}
+
+
+class TestScreenshotOptions:
+    def test_defaults(self):
+        options = ScreenshotOptions.from_json_cfg(None)
+        assert options.directory == "."
+        assert options.fmt == 'png'
+        assert options.extension == 'png'
+
+    def test_from_json_cfg(self):
+        options = ScreenshotOptions.from_json_cfg({"directory": "/tmp/shots", "format": "PNG"})
+        assert options.directory == "/tmp/shots"
+        assert options.fmt == 'png'
+
+    def test_invalid_values(self):
+        with pytest.raises(ValueError):
+            ScreenshotOptions(fmt='gif')
+        with pytest.raises(ValueError):
+            ScreenshotOptions(quality=0)
+        with pytest.raises(ValueError):
+            ScreenshotOptions(quality="high")
+
+    def test_jpeg_needs_pillow(self, monkeypatch):
+        monkeypatch.setattr(screenshot_module, 'PILImage', None)
+        with pytest.raises(ValueError):
+            ScreenshotOptions(fmt='jpg')
+
+    def test_replace_keeps_directory(self):
+        options = ScreenshotOptions(directory="/tmp/shots", quality=80).replace(quality="50")
+        assert options.directory == "/tmp/shots"
+        assert options.fmt == 'png'
+        assert options.quality == 50
+
+
+def _png_chunks(data):
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    pos = 8
+    chunks = []
+    while pos < len(data):
+        length, = struct.unpack('>I', data[pos:pos + 4])
+        tag = data[pos + 4:pos + 8]
+        body = data[pos + 8:pos + 8 + length]
+        crc, = struct.unpack('>I', data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(tag + body)
+        chunks.append((tag, body))
+        pos += 12 + length
+    return chunks
+
+
+class TestEncodePng:
+    def test_rgba_to_rgb_flips_rows(self):
+        # 2x2, bottom row first as read back from GL
+        rgba = bytes([1, 2, 3, 255, 4, 5, 6, 255,
+                      7, 8, 9, 255, 10, 11, 12, 255])
+        assert _rgba_to_rgb(rgba, 2, 2) == bytes([7, 8, 9, 10, 11, 12, 1, 2, 3, 4, 5, 6])
+
+    def test_roundtrip(self):
+        rgb = bytes(range(3 * 3 * 2))
+        chunks = _png_chunks(_encode_png(rgb, 3, 2))
+        assert [tag for tag, _ in chunks] == [b'IHDR', b'IDAT', b'IEND']
+        assert struct.unpack('>IIBBBBB', chunks[0][1]) == (3, 2, 8, 2, 0, 0, 0)
+        raw = zlib.decompress(chunks[1][1])
+        assert raw == b'\x00' + rgb[:9] + b'\x00' + rgb[9:]
+
+
+class TestScreenshotWriter:
+    @pytest.fixture
+    def pixels(self, monkeypatch):
+        reads = []
+
+        def read():
+            reads.append(1)
+            return bytes(2 * 2 * 4), 2, 2
+
+        monkeypatch.setattr(screenshot_module, '_read_window_pixels', read)
+        monkeypatch.setattr(ScreenshotWriter, '_start_worker', lambda self: None)
+        return reads
+
+    def test_request_while_pending_is_dropped(self, pixels, tmp_path):
+        writer = ScreenshotWriter(ScreenshotOptions(directory=str(tmp_path)))
+        assert writer.request()
+        assert not writer.request()
+        assert len(pixels) == 1
+
+        writer._handle(writer._queue.get_nowait())
+        assert writer.request()
+
+    def test_handle_writes_png(self, pixels, tmp_path):
+        writer = ScreenshotWriter(ScreenshotOptions(directory=str(tmp_path)))
+        writer.request(name="shot.png")
+        writer._handle(writer._queue.get_nowait())
+
+        assert [p.name for p in tmp_path.iterdir()] == ["shot.png"]
+        chunks = _png_chunks((tmp_path / "shot.png").read_bytes())
+        assert struct.unpack('>II', chunks[0][1][:8]) == (2, 2)
+
+    def test_failed_write_leaves_no_partial_file(self, pixels, tmp_path, monkeypatch):
+        def broken_encoder(*_args):
+            raise RuntimeError("encoder failed")
+
+        monkeypatch.setattr(screenshot_module, '_encode_png', broken_encoder)
+        writer = ScreenshotWriter(ScreenshotOptions(directory=str(tmp_path)))
+        writer.request(name="shot.png")
+        writer._handle(writer._queue.get_nowait())
+
+        assert list(tmp_path.iterdir()) == []
+        # The next screenshot is accepted
+        assert writer.request()
+
+    def test_teardown_finishes_pending_screenshot(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(screenshot_module, '_read_window_pixels',
+                            lambda: (bytes(2 * 2 * 4), 2, 2))
+        writer = ScreenshotWriter(ScreenshotOptions(directory=str(tmp_path)))
+        writer.request(name="shot.png")
+        worker = writer._worker
+        writer.teardown()
+
+        assert not worker.is_alive()
+        assert writer._worker is None
+        assert [p.name for p in tmp_path.iterdir()] == ["shot.png"]
+        # Without a worker there is nothing to stop
+        writer.teardown()
+
+    def test_write_error_is_logged(self, pixels, tmp_path):
+        writer = ScreenshotWriter(ScreenshotOptions(directory=str(tmp_path / "missing")))
+        writer.request(name="shot.png")
+        writer._handle(writer._queue.get_nowait())
+        assert not (tmp_path / "missing").exists()
@@ -0,0 +1,184 @@
+""" Pytest tests for the syslog_journal module """
+
+import datetime
+import os
+import struct
+import time
+
+import pytest
+
+from syslog_journal import SyslogJournal, _HEADER_SIZE
+from syslog_messages import SyslogMessage
+
+
+def _msg(text, host='nas', received_at=None):
+    return SyslogMessage(priority='err', facility='daemon', host=host, program='smartd',
+                         message=text, date_str='Apr 30 19:37:03',
+                         received_at=received_at or datetime.datetime(2024, 4, 30, 19, 37, 3))
+
+
+def _open(path, n_slots=8, slot_size=256):
+    journal = SyslogJournal(str(path), n_slots, slot_size)
+    journal.setup()
+    return journal
+
+
+class TestSyslogJournal:
+    def test_invalid_layout(self, tmp_path):
+        with pytest.raises(ValueError):
+            SyslogJournal(str(tmp_path / "j"), n_slots=0)
+        with pytest.raises(ValueError):
+            SyslogJournal(str(tmp_path / "j"), slot_size=16)
+
+    def test_new_journal_is_empty(self, tmp_path):
+        journal = _open(tmp_path / "j")
+        assert journal.next_seq == 0
+        assert journal.read_last(10) == []
+
+    def test_file_size_is_fixed(self, tmp_path):
+        path = tmp_path / "j"
+        journal = _open(path)
+        journal.append_many([_msg(str(i)) for i in range(50)])
+        journal.teardown()
+        assert os.path.getsize(path) == _HEADER_SIZE + 8 * 256
+
+    def test_roundtrip(self, tmp_path):
+        journal = _open(tmp_path / "j")
+        received = datetime.datetime(2024, 5, 1, 8, 15, 30, 250000)
+        journal.append_many([_msg("disk failing", received_at=received)])
+
+        record, = journal.read_last(10)
+        assert record.priority == 'err'
+        assert record.facility == 'daemon'
+        assert record.host == 'nas'
+        assert record.program == 'smartd'
+        assert record.message == "disk failing"
+        assert record.date_str == 'Apr 30 19:37:03'
+        assert record.received_at == received
+
+    def test_persists_across_reopen(self, tmp_path):
+        path = tmp_path / "j"
+        journal = _open(path)
+        journal.append_many([_msg("a"), _msg("b")])
+        journal.append_many([_msg("c")])
+        journal.teardown()
+
+        journal = _open(path)
+        assert journal.next_seq == 3
+        assert [r.message for r in journal.read_last(10)] == ["a", "b", "c"]
+
+    def test_ring_keeps_newest(self, tmp_path):
+        journal = _open(tmp_path / "j")
+        for i in range(20):
+            journal.append_many([_msg(str(i))])
+        assert [r.message for r in journal.read_last(100)] == [str(i) for i in range(12, 20)]
+
+    def test_batch_larger_than_ring(self, tmp_path):
+        journal = _open(tmp_path / "j")
+        journal.append_many([_msg(str(i)) for i in range(20)])
+        assert [r.message for r in journal.read_last(100)] == [str(i) for i in range(12, 20)]
+
+    def test_read_last_limits_count(self, tmp_path):
+        journal = _open(tmp_path / "j")
+        journal.append_many([_msg(str(i)) for i in range(6)])
+        assert [r.message for r in journal.read_last(2)] == ["4", "5"]
+
+    def test_long_message_truncated(self, tmp_path):
+        journal = _open(tmp_path / "j")
+        journal.append_many([_msg("ä" * 500)])
+        record, = journal.read_last(1)
+        assert 0 < len(record.message) < 500
+        assert set(record.message) == {"ä"}
+
+    def test_oversized_fields_fit_the_slot(self, tmp_path):
+        path = tmp_path / "j"
+        journal = _open(path)
+        long = SyslogMessage(priority='err', facility='daemon', host='h' * 200,
+                             program='p' * 200, message='m' * 1000,
+                             date_str='Apr 30 19:37:03',
+                             received_at=datetime.datetime(2024, 4, 30, 19, 37, 3))
+        journal.append_many([_msg("a"), long, _msg("c")])
+        journal.teardown()
+
+        journal = _open(path)
+        a, record, c = journal.read_last(10)
+        assert (a.message, c.message) == ("a", "c")
+        assert record.message == ""
+        assert 0 < len(record.program) < 200
+        assert record.host == 'h' * 200
+
+    def test_worker_advances_header(self, tmp_path):
+        path = tmp_path / "j"
+        journal = _open(path)
+        journal.append_many([_msg("a")])
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with open(path, "rb") as f:
+                if struct.unpack_from('<Q', f.read(24), 16)[0] == 1:
+                    break
+            time.sleep(0.01)
+        else:
+            pytest.fail("journal header not advanced")
+        journal.teardown()
+
+    def test_damaged_record_ends_restore(self, tmp_path):
+        path = tmp_path / "j"
+        journal = _open(path)
+        journal.append_many([_msg("a"), _msg("b"), _msg("c")])
+        journal.teardown()
+
+        # Flip a byte in the message text of record 1
+        with open(path, "r+b") as f:
+            f.seek(_HEADER_SIZE + 256 + 60)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xff]))
+
+        journal = _open(path)
+        assert [r.message for r in journal.read_last(10)] == ["c"]
+
+    def test_record_without_header_update_is_ignored(self, tmp_path):
+        path = tmp_path / "j"
+        journal = _open(path)
+        journal.append_many([_msg("a")])
+        journal.teardown()
+
+        journal = _open(path)
+        # A crash after writing the record, but before advancing the header
+        journal._write_record(1, _msg("b"))
+        journal._mm.flush()
+        journal._mm.close()
+        journal._mm = None
+
+        journal = _open(path)
+        assert journal.next_seq == 1
+        assert [r.message for r in journal.read_last(10)] == ["a"]
+
+    def test_layout_change_starts_new_journal(self, tmp_path):
+        path = tmp_path / "j"
+        journal = _open(path)
+        journal.append_many([_msg("a")])
+        journal.teardown()
+
+        journal = _open(path, n_slots=16)
+        assert journal.next_seq == 0
+        assert journal.read_last(10) == []
+
+    def test_damaged_header_starts_new_journal(self, tmp_path):
+        path = tmp_path / "j"
+        journal = _open(path)
+        journal.append_many([_msg("a")])
+        journal.teardown()
+
+        with open(path, "r+b") as f:
+            f.seek(20)
+            f.write(b"\xff")
+
+        journal = _open(path)
+        assert journal.read_last(10) == []
+
+    def test_closed_journal_ignores_appends(self, tmp_path):
+        journal = SyslogJournal(str(tmp_path / "j"))
+        journal.append_many([_msg("a")])
+        assert journal.read_last(10) == []
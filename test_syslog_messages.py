@@ -1,14 +1,19 @@
 """ Pytest tests for the syslog_messages module """
 
 import datetime
+from collections import deque
 
 import pytest
 
-from syslog_messages import (SyslogMessage, Colors,
-                             _msg_lines, _entry_height, _passes_filter,
+import syslog_messages as syslog_module
+from syslog_messages import (SyslogMessage, SyslogEntryModel, SyslogMessagePanel, SyslogFilter,
+                             Colors,
+                             _msg_lines, _entry_height, _passes_filter, _measured_lines,
+                             _entry_attrs,
                              _ENTRY_CHARS_PER_LINE, _ENTRY_LINE_HEIGHT,
                              _ENTRY_MIN_HEIGHT,
                              _ENTRY_META_HEIGHT, _ENTRY_SPACING, _ENTRY_PADDING_V)
+from syslog_rates import SyslogRateStats
 
 
 class _FakeMethod:
@@ -86,6 +91,28 @@ class TestSyslogMessageFromAmqp:
         msg = SyslogMessage.from_amqp(None, props)
         assert msg.priority == 'error'
 
+    def test_fields_converted_on_access(self):
+        headers = {'PRIORITY': 'err', 'MESSAGE': 'disk full', 'PROGRAM': 'smartd'}
+        msg = SyslogMessage.from_amqp(None, _FakeProperties(headers=headers))
+        assert msg._message is None
+        assert msg._received_at is None
+        # Headers are referenced, not copied
+        headers['MESSAGE'] = 'changed'
+        assert msg.message == 'changed'
+        assert msg._message == 'changed'
+        assert msg.received_at.date() == datetime.date.today()
+
+    def test_filtered_message_not_converted(self):
+        panel = _FakePanel(min_priority='error')
+        msg = SyslogMessage.from_amqp(_FakeMethod('syslog.nas'),
+                                      _FakeProperties(headers={'PRIORITY': 'info'}))
+        panel.add_messages([msg])
+        assert panel.data == []
+        # Only the host is read, for the rate statistics
+        assert msg._message is None
+        assert msg._program is None
+        assert msg._received_at is None
+
 
 class TestSyslogMessageSeverity:
     def _make(self, priority):
@@ -234,6 +261,12 @@ class TestSyslogMessageAcknowledge:
             program='prog', message='msg', date_str='',
         )
 
+    def test_no_instance_dict(self):
+        msg = self._make()
+        assert not hasattr(msg, '__dict__')
+        with pytest.raises(AttributeError):
+            msg.extra = 1
+
     def test_not_acknowledged_by_default(self):
         msg = self._make()
         assert not msg.is_acknowledged
@@ -272,3 +305,661 @@ class TestSyslogMessageAcknowledge:
         assert msg.display_color() == Colors.COLOR_GREY
 
 
+class _RecordingList(list):
+    """List that records the in-place operations applied to it."""
+
+    def __init__(self):
+        super().__init__()
+        self.ops = []
+
+    def insert(self, index, value):
+        self.ops.append(('insert', index))
+        super().insert(index, value)
+
+    def __setitem__(self, index, value):
+        self.ops.append(('set', index))
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self.ops.append(('del', index))
+        super().__delitem__(index)
+
+    def extend(self, values):
+        self.ops.append(('extend', len(values)))
+        super().extend(values)
+
+
+def _make_message(text='msg', priority='error', age_s=0):
+    msg = SyslogMessage(priority=priority, facility='auth', host='host',
+                        program='prog', message=text, date_str='')
+    msg._received_at = datetime.datetime.now() - datetime.timedelta(seconds=age_s)
+    return msg
+
+
+class TestSyslogEntryModel:
+    def setup_method(self):
+        self.data = _RecordingList()
+        self.tapped = []
+        self.model = SyslogEntryModel(self.data, self.tapped.append)
+
+    def test_add_inserts_newest_row_first(self):
+        self.model.add(_make_message('first'), 10)
+        self.model.add(_make_message('second'), 10)
+        assert [row['msg'].message for row in self.data] == ['second', 'first']
+        assert self.data.ops == [('insert', 0), ('insert', 0)]
+        assert [m.message for m in self.model.messages] == ['second', 'first']
+
+    def test_attach_moves_rows(self):
+        self.model.add(_make_message('first'), 10)
+        data = _RecordingList()
+        self.model.attach(data)
+        self.model.add(_make_message('second'), 10)
+        assert [row['msg'].message for row in data] == ['second', 'first']
+        assert self.model.rows is data
+
+    def test_row_content(self):
+        msg = _make_message('x' * (_ENTRY_CHARS_PER_LINE + 1))
+        self.model.add(msg, 10)
+        row = self.data[0]
+        assert row['height'] == _entry_height(msg.message)
+        assert row['msg_text_height'] == 2 * _ENTRY_LINE_HEIGHT
+        assert _entry_attrs(row['msg'])['entry_color'] == Colors.COLOR_YELLOW
+        row['tap_callback']()
+        assert self.tapped == [msg]
+
+    def test_add_trims_oldest(self):
+        for i in range(3):
+            self.model.add(_make_message(str(i)), 2)
+        assert [row['msg'].message for row in self.data] == ['2', '1']
+        assert len(self.model) == 2
+
+    def test_trim(self):
+        for i in range(3):
+            self.model.add(_make_message(str(i)), 10)
+        self.data.ops.clear()
+        self.model.trim(1)
+        assert [row['msg'].message for row in self.data] == ['2']
+        assert self.data.ops == [('del', slice(1, 3))]
+
+    def test_update_replaces_single_row(self):
+        first, second = _make_message('first'), _make_message('second')
+        self.model.add(first, 10)
+        self.model.add(second, 10)
+        self.data.ops.clear()
+        first.acknowledge()
+        self.model.update(first)
+        assert self.data.ops == [('set', 1)]
+        assert _entry_attrs(self.data[1]['msg'])['entry_color'] == Colors.COLOR_GREY
+
+    def test_acknowledge_before_only_touches_expired_rows(self):
+        old = _make_message('old', age_s=7200)
+        new = _make_message('new', age_s=10)
+        self.model.add(old, 10)
+        self.model.add(new, 10)
+        self.data.ops.clear()
+
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=3600)
+        assert self.model.acknowledge_before(cutoff) == 1
+        assert old.is_acknowledged and not new.is_acknowledged
+        assert self.data.ops == [('set', 1)]
+
+        # Already acknowledged rows are not rebuilt again
+        assert self.model.acknowledge_before(cutoff) == 0
+        assert self.data.ops == [('set', 1)]
+
+    def test_refresh_times_same_day_does_nothing(self):
+        self.model.add(_make_message(), 10)
+        self.data.ops.clear()
+        self.model.refresh_times()
+        assert self.data.ops == []
+
+    def test_refresh_times_after_midnight(self):
+        msg = _make_message()
+        self.model.add(msg, 10)
+        self.data.ops.clear()
+        # Pretend the rows were built yesterday for a message from yesterday
+        self.model._rows_date -= datetime.timedelta(days=1)
+        msg._received_at -= datetime.timedelta(days=1)
+        self.model.refresh_times()
+        assert self.data.ops == [('set', 0)]
+        assert _entry_attrs(self.data[0]['msg'])['msg_time'] == msg.formatted_time()
+
+    def test_index_from_sequence(self):
+        messages = [_make_message(str(i)) for i in range(5)]
+        for msg in messages:
+            self.model.add(msg, 3)
+        assert [self.model.index(m) for m in messages] == [None, None, 2, 1, 0]
+
+    def test_update_of_evicted_message_is_ignored(self):
+        old = _make_message('old')
+        self.model.add(old, 1)
+        self.model.add(_make_message('new'), 1)
+        self.data.ops.clear()
+        old.acknowledge()
+        self.model.update(old)
+        assert self.data.ops == []
+
+    def test_many_entries(self):
+        for i in range(5000):
+            self.model.add(_make_message(str(i)), 2000)
+        assert len(self.model) == 2000
+        assert len(self.data) == 2000
+        assert self.data[0]['msg'].message == '4999'
+        assert self.data[-1]['msg'].message == '3000'
+        assert self.model.index(self.model.messages[-1]) == 1999
+
+    def test_add_many_skips_messages_evicted_within_batch(self):
+        self.model.add(_make_message('old'), 3)
+        batch = [_make_message(str(i)) for i in range(5)]
+        assert self.model.add_many(batch, 3) == (0, 2)
+        assert [row['msg'].message for row in self.data] == ['4', '3', '2']
+        assert [self.model.index(m) for m in batch] == [None, None, 2, 1, 0]
+
+
+class _FakeChannel:
+    def __init__(self):
+        self.acked = []
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+
+class _FakeDeliver:
+    def __init__(self, delivery_tag):
+        self.delivery_tag = delivery_tag
+        self.routing_key = ''
+
+
+class _FakePanel:
+    """Borrows the ingestion logic of SyslogMessagePanel without creating Kivy widgets."""
+
+    add_message = SyslogMessagePanel.add_message
+    add_messages = SyslogMessagePanel.add_messages
+    _flush_ingest = SyslogMessagePanel._flush_ingest
+    _on_amqp_message = SyslogMessagePanel._on_amqp_message
+    ingest_stats = SyslogMessagePanel.ingest_stats
+    _acknowledge_expired = SyslogMessagePanel._acknowledge_expired
+    _schedule_acknowledge = SyslogMessagePanel._schedule_acknowledge
+    _open_journal = SyslogMessagePanel._open_journal
+    teardown = SyslogMessagePanel.teardown
+    set_filter = SyslogMessagePanel.set_filter
+    _count_rates = SyslogMessagePanel._count_rates
+    rate_stats = SyslogMessagePanel.rate_stats
+    display_filter = SyslogMessagePanel.display_filter
+    filter_choices = SyslogMessagePanel.filter_choices
+
+    def __init__(self, max_entries=3, min_priority='error', acknowledge_after=0):
+        self.max_entries = max_entries
+        self.journal_file = ''
+        self.journal_slots = 16
+        self._journal = None
+        self._journal_trigger = _MockClockEvent(None, 0)
+        self._midnight_event = None
+        self.min_priority = min_priority
+        self.acknowledge_after = acknowledge_after
+        self._acknowledge_event = None
+        self.data = []
+        self._model = SyslogEntryModel(self.data, lambda msg: None)
+        self._ingest = deque()
+        self._ingest_stats = SyslogMessagePanel._empty_ingest_stats()
+        self.triggers = 0
+        self.notified = []
+        self.message_callback = self.notified.append
+        self._rate_stats = SyslogRateStats()
+        self.storms = []
+        self.storm_callback = self.storms.append
+
+    def _ingest_trigger(self):
+        self.triggers += 1
+
+    def _indicator_trigger(self):
+        pass
+
+
+class TestSyslogIngestion:
+    def _deliver(self, panel, channel, tag, priority='error', text='msg'):
+        props = _FakeProperties(headers={'PRIORITY': priority, 'MESSAGE': text})
+        panel._on_amqp_message(channel, _FakeDeliver(tag), props, b'')
+
+    def test_messages_buffered_until_frame(self):
+        panel, channel = _FakePanel(), _FakeChannel()
+        for tag in range(3):
+            self._deliver(panel, channel, tag, text=str(tag))
+        assert channel.acked == [0, 1, 2]
+        assert panel.data == []
+        assert panel.triggers == 3
+
+        panel._flush_ingest()
+        assert [row['msg'].message for row in panel.data] == ['2', '1', '0']
+        assert panel.ingest_stats['batches'] == 1
+
+    def test_storm_is_filtered_and_coalesced(self):
+        panel, channel = _FakePanel(max_entries=3), _FakeChannel()
+        for tag in range(10):
+            self._deliver(panel, channel, tag, priority='error' if tag % 2 else 'info',
+                          text=str(tag))
+        panel._flush_ingest()
+
+        assert [row['msg'].message for row in panel.data] == ['9', '7', '5']
+        assert panel.ingest_stats == {
+            'received': 10, 'filtered': 5, 'folded': 0, 'coalesced': 2,
+            'batches': 1, 'largest_batch': 10,
+        }
+        # Coalesced messages are still reported, e.g. for notifications
+        assert [msg.message for msg in panel.notified] == ['1', '3', '5', '7', '9']
+
+    def test_empty_flush(self):
+        panel = _FakePanel()
+        panel._flush_ingest()
+        assert panel.ingest_stats['batches'] == 0
+
+    def test_add_message_single(self):
+        panel = _FakePanel()
+        panel.add_message(_make_message('direct'))
+        assert panel.data[0]['msg'].message == 'direct'
+        assert panel.ingest_stats['received'] == 1
+
+
+class TestSyslogJournalRestore:
+    def _panel(self, path, journal_slots=16, **kwargs):
+        panel = _FakePanel(**kwargs)
+        panel.journal_file = str(path)
+        panel.journal_slots = journal_slots
+        panel._open_journal()
+        return panel
+
+    def test_messages_survive_restart(self, tmp_path):
+        panel = self._panel(tmp_path / "journal")
+        panel.add_messages([_make_message('a'), _make_message('b')])
+        panel._journal.teardown()
+
+        panel = self._panel(tmp_path / "journal")
+        assert [row['msg'].message for row in panel.data] == ['b', 'a']
+        # Restored messages are not reported as new
+        assert panel.notified == []
+
+    def test_restore_applies_limit_and_filter(self, tmp_path):
+        panel = self._panel(tmp_path / "journal", max_entries=10, min_priority='debug')
+        panel.add_messages([_make_message(str(i), priority='info' if i % 2 else 'error')
+                            for i in range(6)])
+        panel._journal.teardown()
+
+        panel = self._panel(tmp_path / "journal", max_entries=2)
+        assert [row['msg'].message for row in panel.data] == ['4']
+
+    def test_repeats_do_not_crowd_out_journal(self, tmp_path):
+        panel = self._panel(tmp_path / "journal", journal_slots=4)
+        panel.add_messages([_make_message('a')])
+        for _ in range(10):
+            panel.add_messages([_make_message('disk full')])
+        panel._journal.teardown()
+
+        panel = self._panel(tmp_path / "journal", journal_slots=4)
+        assert [row['msg'].message for row in panel.data] == ['disk full', 'a']
+
+    def test_teardown_closes_journal(self, tmp_path):
+        panel = self._panel(tmp_path / "journal")
+        panel.add_messages([_make_message('a')])
+        midnight = panel._midnight_event = _MockClockEvent(None, 3600)
+        panel.teardown()
+        assert panel._journal is None
+        assert panel._journal_trigger.cancelled and midnight.cancelled
+        assert panel._midnight_event is None
+
+        panel = self._panel(tmp_path / "journal")
+        assert [row['msg'].message for row in panel.data] == ['a']
+
+    def test_unwritable_journal_is_skipped(self, tmp_path):
+        panel = self._panel(tmp_path / "missing" / "journal")
+        assert panel._journal is None
+        panel.add_messages([_make_message('a')])
+        assert len(panel.data) == 1
+
+
+def _make_repeat(text='disk full', host='host', program='prog', age_s=0):
+    msg = SyslogMessage(priority='error', facility='daemon', host=host,
+                        program=program, message=text, date_str='')
+    msg._received_at = msg._last_seen = \
+        datetime.datetime.now() - datetime.timedelta(seconds=age_s)
+    return msg
+
+
+class TestSyslogMessageFold:
+    def test_fold_key_normalizes_whitespace(self):
+        assert _make_repeat(' disk   full ').fold_key() == _make_repeat('disk full').fold_key()
+
+    def test_fold_key_includes_host_and_program(self):
+        assert _make_repeat(host='a').fold_key() != _make_repeat(host='b').fold_key()
+        assert _make_repeat(program='a').fold_key() != _make_repeat(program='b').fold_key()
+
+    def test_fold_counts_and_updates_last_seen(self):
+        first, repeat = _make_repeat(age_s=60), _make_repeat()
+        assert first.formatted_repeats() == ''
+        first.fold(repeat)
+        assert first.repeat_count == 2
+        assert first.last_seen == repeat.received_at
+        assert first.formatted_repeats() == '2\u00d7 ' + repeat.received_at.strftime('%H:%M')
+
+
+class TestSyslogEntryModelFolding:
+    def setup_method(self):
+        self.data = _RecordingList()
+        self.model = SyslogEntryModel(self.data, lambda msg: None)
+
+    def test_repeat_folded_into_stored_row(self):
+        first = _make_repeat()
+        self.model.add(first, 10)
+        self.model.add(_make_message('other'), 10)
+        self.data.ops.clear()
+
+        assert self.model.add_many([_make_repeat(), _make_repeat()], 10) == (2, 0)
+        assert len(self.data) == 2
+        assert first.repeat_count == 3
+        assert self.data.ops == [('set', 1)]
+        assert _entry_attrs(self.data[1]['msg'])['msg_repeat'].startswith('3\u00d7')
+
+    def test_acknowledged_message_not_folded(self):
+        first = _make_repeat()
+        self.model.add(first, 10)
+        first.acknowledge()
+        self.model.update(first)
+        self.model.add(_make_repeat(), 10)
+        assert len(self.data) == 2
+        assert first.repeat_count == 1
+
+    def test_repeats_within_batch_folded(self):
+        batch = [_make_repeat(), _make_message('other'), _make_repeat()]
+        assert self.model.add_many(batch, 10) == (1, 0)
+        assert [row['msg'].message for row in self.data] == ['other', 'disk full']
+        assert batch[0].repeat_count == 2
+
+    def test_evicted_message_not_folded(self):
+        self.model.add(_make_repeat(), 1)
+        self.model.add(_make_message('other'), 1)
+        self.model.add(_make_repeat(), 1)
+        assert [row['msg'].message for row in self.data] == ['disk full']
+        assert _entry_attrs(self.data[0]['msg'])['msg_repeat'] == ''
+        assert self.model._fold_index.keys() == {_make_repeat().fold_key()}
+
+
+_LONG_TEXT = 'Connection to backup server timed out, retrying in 30 seconds ' * 4
+
+
+class TestMeasuredLines:
+    def test_narrow_width_needs_more_lines(self):
+        assert _msg_lines(_LONG_TEXT, 150) > _msg_lines(_LONG_TEXT, 600) >= 1
+
+    def test_short_text_is_one_line(self):
+        assert _msg_lines('ok', 300) == 1
+
+    def test_line_breaks_counted(self):
+        assert _msg_lines('disk\nfull\nagain', 300) == 3
+
+    def test_unknown_width_uses_estimate(self):
+        assert _msg_lines(_LONG_TEXT, None) == -(-len(_LONG_TEXT) // _ENTRY_CHARS_PER_LINE)
+        assert _msg_lines(_LONG_TEXT, 0) == _msg_lines(_LONG_TEXT)
+
+    def test_measured_once_per_text_and_width(self):
+        _measured_lines.cache_clear()
+        for _ in range(5):
+            _msg_lines(_LONG_TEXT, 321)
+        info = _measured_lines.cache_info()
+        assert (info.misses, info.hits) == (1, 4)
+
+    def test_entry_height_uses_width(self):
+        lines = _msg_lines(_LONG_TEXT, 200)
+        assert _entry_height(_LONG_TEXT, 200) == (_ENTRY_PADDING_V + _ENTRY_META_HEIGHT
+                                                  + _ENTRY_SPACING + lines * _ENTRY_LINE_HEIGHT)
+
+
+class TestSyslogEntryModelTextWidth:
+    def test_rows_relaid_for_width(self):
+        data = _RecordingList()
+        model = SyslogEntryModel(data, lambda msg: None)
+        model.add(_make_message(_LONG_TEXT), 10)
+        model.add(_make_message('short'), 10)
+        data.ops.clear()
+
+        model.set_text_width(150)
+        assert data.ops == [('set', 1)]
+        assert data[1]['height'] == _entry_height(_LONG_TEXT, 150)
+        assert data[1]['msg_text_height'] == _msg_lines(_LONG_TEXT, 150) * _ENTRY_LINE_HEIGHT
+
+        # Same width again changes nothing
+        model.set_text_width(150)
+        assert data.ops == [('set', 1)]
+
+    def test_new_rows_use_width(self):
+        data = []
+        model = SyslogEntryModel(data, lambda msg: None)
+        model.set_text_width(150)
+        model.add(_make_message(_LONG_TEXT), 10)
+        assert data[0]['height'] == _entry_height(_LONG_TEXT, 150)
+
+
+class _MockClockEvent:
+    def __init__(self, callback, delay):
+        self.callback = callback
+        self.delay = delay
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _MockClock:
+    """Captures scheduled Clock calls without running them."""
+
+    def __init__(self):
+        self.events = []
+
+    def schedule_once(self, callback, delay=0):
+        event = _MockClockEvent(callback, delay)
+        self.events.append(event)
+        return event
+
+    def pending(self):
+        return [e for e in self.events if not e.cancelled]
+
+    def fire(self):
+        """Run the single pending event, as the Kivy clock would."""
+        events = self.pending()
+        assert len(events) == 1
+        events[0].cancelled = True
+        events[0].callback(events[0].delay)
+
+
+class TestSyslogEntryModelAcknowledgeQueue:
+    def setup_method(self):
+        self.data = _RecordingList()
+        self.model = SyslogEntryModel(self.data, lambda msg: None)
+
+    def test_oldest_unacknowledged_skips_tapped(self):
+        first, second = _make_message('first', age_s=20), _make_message('second', age_s=10)
+        self.model.add_many([first, second], 10)
+        assert self.model.oldest_unacknowledged() is first
+        first.acknowledge()
+        assert self.model.oldest_unacknowledged() is second
+
+    def test_oldest_unacknowledged_skips_evicted(self):
+        first, second = _make_message('first'), _make_message('second')
+        self.model.add_many([first, second], 1)
+        self.model.add(_make_message('third'), 1)
+        assert self.model.oldest_unacknowledged().message == 'third'
+
+    def test_empty(self):
+        assert self.model.oldest_unacknowledged() is None
+
+
+class TestSyslogAutoAcknowledge:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.clock = _MockClock()
+        monkeypatch.setattr(syslog_module, "Clock", self.clock)
+
+    def test_deadline_of_oldest_message(self):
+        panel = _FakePanel(max_entries=10, acknowledge_after=3600)
+        panel.add_messages([_make_message('old', age_s=600), _make_message('new', age_s=60)])
+        events = self.clock.pending()
+        assert len(events) == 1
+        assert events[0].delay == pytest.approx(3000, abs=5)
+
+        # Further messages do not reschedule
+        panel.add_message(_make_message('newest'))
+        assert len(self.clock.events) == 1
+
+    def test_fire_acknowledges_due_rows_only(self):
+        panel = _FakePanel(max_entries=10, acknowledge_after=3600)
+        old = _make_message('old', age_s=7200)
+        new = _make_message('new', age_s=60)
+        panel.add_messages([old, new])
+        assert self.clock.pending()[0].delay == 0
+
+        self.clock.fire()
+        assert old.is_acknowledged and not new.is_acknowledged
+        assert _entry_attrs(panel.data[1]['msg'])['entry_color'] == Colors.COLOR_GREY
+        assert self.clock.pending()[-1].delay == pytest.approx(3540, abs=5)
+
+    def test_nothing_scheduled_when_all_acknowledged(self):
+        panel = _FakePanel(max_entries=10, acknowledge_after=60)
+        panel.add_message(_make_message('old', age_s=120))
+        self.clock.fire()
+        assert self.clock.pending() == []
+
+    def test_disabled(self):
+        panel = _FakePanel(max_entries=10, acknowledge_after=0)
+        panel.add_message(_make_message('old', age_s=7200))
+        assert self.clock.events == []
+
+
+def _make_from(host, program, text='msg', priority='error'):
+    return SyslogMessage(priority=priority, facility='daemon', host=host,
+                         program=program, message=text, date_str='')
+
+
+class TestSyslogFilter:
+    def test_empty_matches_all(self):
+        assert SyslogFilter().is_empty()
+        assert SyslogFilter().matches(_make_from('nas', 'smartd'))
+
+    def test_criteria(self):
+        msg = _make_from('nas', 'smartd', 'Disk FAILING', priority='crit')
+        assert SyslogFilter(host='nas', program='smartd').matches(msg)
+        assert not SyslogFilter(host='router').matches(msg)
+        assert not SyslogFilter(program='sshd').matches(msg)
+        assert SyslogFilter(priority='Error').matches(msg)
+        assert not SyslogFilter(priority='alert').matches(msg)
+        assert SyslogFilter(text='disk fail').matches(msg)
+        assert not SyslogFilter(text='ok').matches(msg)
+
+
+class TestSyslogEntryModelFilter:
+    def setup_method(self):
+        self.data = _RecordingList()
+        self.model = SyslogEntryModel(self.data, lambda msg: None)
+
+    def _texts(self):
+        return [row['msg'].message for row in self.data]
+
+    def _fill(self, limit=10):
+        msgs = [_make_from('nas', 'smartd', 'a'), _make_from('router', 'sshd', 'b'),
+                _make_from('nas', 'sshd', 'c', priority='crit'),
+                _make_from('router', 'smartd', 'd')]
+        self.model.add_many(msgs, limit)
+        return msgs
+
+    def test_filter_by_host_and_program(self):
+        self._fill()
+        self.model.set_filter(SyslogFilter(host='nas'))
+        assert self._texts() == ['c', 'a']
+        self.model.set_filter(SyslogFilter(host='nas', program='sshd'))
+        assert self._texts() == ['c']
+        self.model.set_filter(SyslogFilter(host='unknown'))
+        assert self._texts() == []
+
+    def test_filter_by_priority_and_text(self):
+        self._fill()
+        self.model.set_filter(SyslogFilter(priority='crit'))
+        assert self._texts() == ['c']
+        self.model.set_filter(SyslogFilter(priority='error'))
+        assert self._texts() == ['d', 'c', 'b', 'a']
+        self.model.set_filter(SyslogFilter(text='B'))
+        assert self._texts() == ['b']
+
+    def test_clear_filter_shows_all(self):
+        self._fill()
+        self.model.set_filter(SyslogFilter(host='nas'))
+        self.data.ops.clear()
+        self.model.set_filter(SyslogFilter())
+        assert self._texts() == ['d', 'c', 'b', 'a']
+        # Replaced with bounded slices, which the RecycleView can follow
+        assert self.data.ops == [('del', slice(0, 2)), ('extend', 4)]
+
+    def test_new_messages_while_filtered(self):
+        self._fill()
+        self.model.set_filter(SyslogFilter(host='nas'))
+        self.data.ops.clear()
+        self.model.add_many([_make_from('router', 'sshd', 'e'), _make_from('nas', 'ntpd', 'f')], 10)
+        assert self._texts() == ['f', 'c', 'a']
+        assert self.data.ops == [('insert', 0)]
+
+    def test_eviction_while_filtered(self):
+        self._fill(limit=4)
+        self.model.set_filter(SyslogFilter(host='nas'))
+        self.model.add_many([_make_from('router', 'sshd', 'e')], 4)
+        assert self._texts() == ['c']
+        self.model.add_many([_make_from('router', 'sshd', 'f')] * 2, 3)
+        assert self._texts() == []
+        assert len(self.model) == 3
+        self.model.set_filter(SyslogFilter())
+        assert self._texts() == ['f', 'e', 'd']
+
+    def test_indexes_follow_eviction(self):
+        self._fill(limit=4)
+        assert self.model.hosts() == ['nas', 'router']
+        self.model.trim(1)
+        assert self.model.hosts() == ['router']
+        assert self.model.programs() == ['smartd']
+
+    def test_update_filtered_row(self):
+        msgs = self._fill()
+        self.model.set_filter(SyslogFilter(host='nas'))
+        self.data.ops.clear()
+        msgs[0].acknowledge()
+        self.model.update(msgs[0])
+        self.model.update(msgs[1])  # not shown
+        assert self.data.ops == [('set', 1)]
+        assert _entry_attrs(self.data[1]['msg'])['entry_color'] == Colors.COLOR_GREY
+        assert self.model.index(msgs[1]) is None
+
+    def test_fold_into_hidden_message(self):
+        self._fill()
+        self.model.set_filter(SyslogFilter(host='nas'))
+        self.data.ops.clear()
+        assert self.model.add_many([_make_from('router', 'sshd', 'b')], 10) == (1, 0)
+        assert self.data.ops == []
+
+
+class TestSyslogPanelFilter:
+    def test_set_filter(self):
+        panel = _FakePanel(max_entries=10)
+        panel.add_messages([_make_from('nas', 'smartd', 'a'), _make_from('router', 'sshd', 'b')])
+        panel.set_filter(program='sshd')
+        assert [row['msg'].message for row in panel.data] == ['b']
+        assert panel.display_filter.program == 'sshd'
+        assert panel.filter_choices() == (['nas', 'router'], ['smartd', 'sshd'])
+        panel.set_filter()
+        assert len(panel.data) == 2
+
+
+class TestSyslogPanelStorm:
+    def test_storm_reported_once(self):
+        panel = _FakePanel(max_entries=10)
+        panel._rate_stats.min_rate = 20
+        # Low priority messages count as well
+        panel.add_messages([_make_from('nas', 'smartd', priority='info')] * 19)
+        assert panel.storms == []
+        panel.add_messages([_make_from('nas', 'smartd', priority='info')])
+        panel.add_messages([_make_from('nas', 'smartd', priority='info')] * 5)
+        assert panel.storms == ['nas']
+        assert panel.rate_stats.storming == {'nas'}
@@ -0,0 +1,128 @@
+""" Pytest tests for the syslog_rates module """
+
+from syslog_rates import RateCounter, SyslogRateStats
+
+
+class TestRateCounter:
+    def test_counts_within_window(self):
+        counter = RateCounter(60, 12)
+        for t in range(0, 60, 10):
+            counter.add(1000 + t)
+        assert counter.total(1059) == 6
+        assert counter.per_minute(1059) == 6
+
+    def test_old_buckets_expire(self):
+        counter = RateCounter(60, 12)
+        counter.add(1000)
+        counter.add(1050, count=3)
+        assert counter.total(1050) == 4
+        assert counter.total(1065) == 3
+        assert counter.total(1200) == 0
+
+    def test_reused_bucket_is_reset(self):
+        counter = RateCounter(60, 12)
+        counter.add(1000, count=5)
+        counter.add(1060)
+        assert counter.total(1060) == 1
+
+    def test_too_old_event_ignored(self):
+        counter = RateCounter(60, 12)
+        counter.add(1060)
+        counter.add(1000)
+        assert counter.total(1060) == 1
+
+    def test_start(self):
+        counter = RateCounter(60, 12)
+        assert counter.start(1059) == 1000
+        assert counter.start(1060) == 1005
+
+    def test_total_before(self):
+        counter = RateCounter(900, 15)
+        for minute in range(15):
+            counter.add(minute * 60, count=minute + 1)
+        # Minute 0 has left the window, minutes 13 and 14 end after t
+        assert counter.total_before(785, 900) == (sum(range(2, 14)), 720)
+        assert counter.total_before(900, 900) == (sum(range(2, 16)), 840)
+
+    def test_long_window_rate(self):
+        counter = RateCounter(900, 15)
+        counter.add(0, count=150)
+        assert counter.per_minute(10) == 10
+
+
+class TestSyslogRateStats:
+    def _steady(self, stats, host, per_minute, start, minutes):
+        for minute in range(minutes):
+            for i in range(per_minute):
+                stats.add(host, 'info', start + minute * 60 + i * 60 / per_minute)
+
+    def test_rates_per_host_and_priority(self):
+        stats = SyslogRateStats()
+        stats.add('nas', 'err', 1000)
+        stats.add('nas', 'info', 1001)
+        stats.add('router', 'err', 1002)
+        assert stats.host_rates(1002) == {'nas': (2.0, 2 / 15), 'router': (1.0, 1 / 15)}
+        assert set(stats.priority_rates(1002)) == {'err', 'info'}
+
+    def test_baseline_excludes_last_minute(self):
+        stats = SyslogRateStats()
+        self._steady(stats, 'nas', 2, 0, 14)
+        self._steady(stats, 'nas', 50, 14 * 60, 1)
+        assert stats.baseline('nas', 15 * 60 - 1) == 2.0
+
+    def test_baseline_at_bucket_boundary(self):
+        stats = SyslogRateStats()
+        self._steady(stats, 'nas', 2, 0, 14)
+        self._steady(stats, 'nas', 60, 14 * 60, 1)
+        # The last minute starts at 845 s: minute 14 is partly in it and
+        # left out, minute 0 has left the long window
+        assert stats.baseline('nas', 15 * 60) == 2.0
+
+    def test_storm_detected_once(self):
+        stats = SyslogRateStats(factor=5, min_rate=30)
+        self._steady(stats, 'nas', 2, 0, 14)
+        assert stats.update_storms(['nas'], 14 * 60) == []
+
+        self._steady(stats, 'nas', 60, 14 * 60, 1)
+        assert stats.update_storms(['nas'], 15 * 60 - 1) == ['nas']
+        assert stats.update_storms(['nas'], 15 * 60 - 1) == []
+        assert stats.storming == {'nas'}
+
+    def test_steady_high_rate_is_no_storm(self):
+        stats = SyslogRateStats(factor=5, min_rate=30)
+        self._steady(stats, 'busy', 40, 0, 15)
+        assert not stats.is_storming('busy', 15 * 60 - 1)
+
+    def test_low_rate_is_no_storm(self):
+        stats = SyslogRateStats(factor=5, min_rate=30)
+        self._steady(stats, 'quiet', 10, 0, 1)
+        assert not stats.is_storming('quiet', 59)
+
+    def test_storm_ends(self):
+        stats = SyslogRateStats(factor=5, min_rate=30)
+        self._steady(stats, 'nas', 60, 0, 1)
+        assert stats.update_storms(['nas'], 59) == ['nas']
+        assert stats.update_storms(['nas'], 200) == []
+        assert stats.storming == set()
+
+    def test_storm_ends_without_messages_from_host(self):
+        stats = SyslogRateStats(factor=5, min_rate=30)
+        self._steady(stats, 'nas', 60, 0, 1)
+        assert stats.update_storms(['nas'], 59) == ['nas']
+        stats.add('router', 'info', 200)
+        assert stats.update_storms(['router'], 200) == []
+        assert stats.storming == set()
+
+    def test_storm_ends_on_minute_tick(self):
+        stats = SyslogRateStats(factor=5, min_rate=30)
+        self._steady(stats, 'nas', 60, 0, 1)
+        assert stats.update_storms(['nas'], 59) == ['nas']
+        stats.add('router', 'info', 200)
+        assert stats.storming == set()
+
+    def test_idle_hosts_are_forgotten(self):
+        stats = SyslogRateStats()
+        stats.add('old', 'info', 0)
+        stats.add('new', 'info', 2000)
+        assert set(stats.host_rates(2000)) == {'new'}
+        assert set(stats.priority_rates(2000)) == {'info'}
@@ -0,0 +1,198 @@
+""" Pytest tests for the temperature module """
+
+import types
+
+import pytest
+
+import temperature as temperature_module
+from temperature import StalenessMonitor, TemperatureHistory, TemperatureView, sparkline_points
+
+
+class _MockClockEvent:
+    def __init__(self, callback, delay):
+        self.callback = callback
+        self.delay = delay
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _MockClock:
+    """Captures scheduled Clock calls without running them."""
+
+    def __init__(self):
+        self.events = []
+
+    def schedule_once(self, callback, delay=0):
+        event = _MockClockEvent(callback, delay)
+        self.events.append(event)
+        return event
+
+    def pending(self):
+        return [e for e in self.events if not e.cancelled]
+
+
+class TestStalenessMonitor:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.now = 100.0
+        self.clock = _MockClock()
+        monkeypatch.setattr(temperature_module, "Clock", self.clock)
+        monkeypatch.setattr(temperature_module, "time",
+                            types.SimpleNamespace(monotonic=lambda: self.now))
+        self.stale = []
+        self.monitor = StalenessMonitor()
+
+    def _fire(self, advance):
+        self.now += advance
+        events = self.clock.pending()
+        assert len(events) == 1
+        events[0].cancelled = True
+        events[0].callback(advance)
+
+    def test_single_event_for_earliest_deadline(self):
+        self.monitor.arm("a", 20, self.stale.append)
+        self.monitor.arm("b", 5, self.stale.append)
+        self.monitor.arm("c", 10, self.stale.append)
+        assert len(self.clock.pending()) == 1
+        assert self.clock.pending()[0].delay == 5
+
+    def test_fires_in_deadline_order(self):
+        self.monitor.arm("a", 20, self.stale.append)
+        self.monitor.arm("b", 5, self.stale.append)
+
+        self._fire(5)
+        assert self.stale == ["b"]
+        assert self.clock.pending()[0].delay == 15
+
+        self._fire(15)
+        assert self.stale == ["b", "a"]
+        assert self.clock.pending() == []
+
+    def test_rearm_postpones_deadline(self):
+        self.monitor.arm("a", 10, self.stale.append)
+        self.now += 8
+        self.monitor.arm("a", 10, self.stale.append)
+
+        # The event for the outdated deadline finds nothing to do
+        self._fire(2)
+        assert self.stale == []
+        assert self.clock.pending()[0].delay == 8
+
+        self._fire(8)
+        assert self.stale == ["a"]
+
+    def test_disarm(self):
+        self.monitor.arm("a", 10, self.stale.append)
+        self.monitor.disarm("a")
+        self._fire(10)
+        assert self.stale == []
+        assert self.clock.pending() == []
+
+    def test_earlier_deadline_replaces_event(self):
+        self.monitor.arm("a", 20, self.stale.append)
+        self.monitor.arm("b", 5, self.stale.append)
+        assert self.clock.events[0].cancelled
+        assert self.clock.events[1].delay == 5
+
+    def test_heap_is_compacted(self):
+        for _ in range(1000):
+            self.monitor.arm("a", 10, self.stale.append)
+        assert len(self.monitor._heap) <= 4 + 16
+
+
+class TestTemperatureHistory:
+    def test_readings_averaged_per_slot(self):
+        history = TemperatureHistory(duration=60, n_slots=6)  # 10 s slots
+        history.add(1000, 20.0)
+        history.add(1005, 22.0)
+        history.add(1010, 30.0)
+        assert history.averages(1010) == [None, None, None, None, 21.0, 30.0]
+
+    def test_old_slots_expire(self):
+        history = TemperatureHistory(duration=60, n_slots=6)
+        history.add(1000, 20.0)
+        assert history.averages(1050) == [20.0, None, None, None, None, None]
+        assert history.averages(1060) == [None] * 6
+
+    def test_ring_position_reused(self):
+        history = TemperatureHistory(duration=60, n_slots=6)
+        history.add(1000, 20.0)
+        history.add(1060, 25.0)
+        assert history.averages(1060) == [None] * 5 + [25.0]
+
+    def test_too_old_reading_dropped(self):
+        history = TemperatureHistory(duration=60, n_slots=6)
+        history.add(1060, 25.0)
+        history.add(1000, 20.0)
+        assert history.averages(1060) == [None] * 5 + [25.0]
+
+    def test_constant_memory(self):
+        history = TemperatureHistory(duration=60, n_slots=6)
+        for t in range(10000):
+            history.add(t, 20.0)
+        assert len(history._sums) == 6
+        assert history.averages(9999)[-1] == 20.0
+
+
+class TestSparklinePoints:
+    def test_empty(self):
+        assert sparkline_points([None, None], 10, 10) == []
+        assert sparkline_points([], 10, 10) == []
+
+    def test_fitted_to_height(self):
+        points = sparkline_points([20.0, None, 30.0], 30, 11)
+        assert points == [5.0, 0.5, 25.0, 10.5]
+
+    def test_minimum_span(self):
+        points = sparkline_points([20.0, 20.5], 20, 11, min_span=2.0)
+        assert points[1] == pytest.approx(4.25)
+        assert points[3] == pytest.approx(6.75)
+
+    def test_single_value_is_dash(self):
+        assert sparkline_points([None, 20.0], 20, 11) == [10.0, 5.5, 20.0, 5.5]
+
+
+class _FakeTemperatureView:
+    """Borrows the measurement handling of TemperatureView without Kivy widgets."""
+
+    _update_temperature = TemperatureView._update_temperature
+    _refresh_sparkline = TemperatureView._refresh_sparkline
+    _measurement_timeout = TemperatureView._measurement_timeout
+    _on_stale = TemperatureView._on_stale
+
+    def __init__(self):
+        self.conf = {"timeout": 10}
+        self.measure_instant = None
+        self.value_error = None
+        self._temp = None
+        self._sparkline_points = []
+        self._history = TemperatureHistory(TemperatureView.HISTORY_DURATION,
+                                           TemperatureView.SPARKLINE_SIZE[0])
+
+
+class TestTemperatureViewStaleness:
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.clock = _MockClock()
+        monkeypatch.setattr(temperature_module, "Clock", self.clock)
+        monkeypatch.setattr(TemperatureView, "_staleness", StalenessMonitor())
+        self.now = 1000.0
+        monkeypatch.setattr(temperature_module, "time",
+                            types.SimpleNamespace(monotonic=lambda: self.now,
+                                                  time=lambda: self.now))
+
+    def test_stale_view_clears_sparkline(self):
+        view = _FakeTemperatureView()
+        view._update_temperature("21.5")
+        view._update_temperature("22.0")
+        assert view._temp == 22.0
+        assert view._sparkline_points
+
+        event, = self.clock.pending()
+        assert event.delay == 10
+        self.now += 10
+        event.callback(10)
+        assert view._temp is None
+        assert view._sparkline_points == []